@@ -12,10 +12,22 @@ import urllib.error
 import requests
 import mimetypes
 
-from src.analyzer import Analyzer
-from src.image_processor import ImageProcessor
+from src.analyzer import AnalyzerPool
+from src.layout_cache import LayoutCache
+from src.concurrency import ConcurrencyLimiter, AdaptiveLimiter
+from src.resilience import ResilientCaller, RetryPolicy, RetryBudget, GeminiError, TransientGeminiError, CircuitOpenError
+from src.hedging import Hedger
+from src.batching import LayoutBatcher
+from src.cascade import LayoutCascade
+from src.tiling import LayoutTiler
+from src.bbox_snapper import BBoxSnapper
+from src.image_upload import PreprocessOptions
+from src.image_handle import ImageHandle
+from src.image_processor import ImageProcessor, InpaintOptions
+from src.bg_encoding import BackgroundEncoder
 from src.code_generator import CodeGenerator
 from src.pptx_generator import PPTXGenerator
+from src.pptx_writer import FastPPTXWriter
 from src.utils import generate_timestamp, ensure_directory, get_logger
 from datetime import datetime
 import json
@@ -44,6 +56,17 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
+# Content-hashed background assets (output/<batch>/assets/<sha256>.<ext>) never change once written
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.middleware("http")
+async def asset_cache_headers(request: Request, call_next):
+    response = await call_next(request)
+    path = request.url.path
+    if path.startswith("/output/") and "/assets/" in path and response.status_code == 200:
+        response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return response
+
 # Default Settings
 # Default Settings (New Structure)
 DEFAULT_SETTINGS = {
@@ -80,6 +103,94 @@ DEFAULT_SETTINGS = {
     },
     "photoroom": {
         "mode": "ai.all"
+    },
+    "layout_cache": {
+        "enabled": True,
+        "max_size_mb": 500
+    },
+    "adaptive_concurrency": {
+        "initial_limit": 4,
+        "min_limit": 1,
+        "max_limit": 15
+    },
+    "gemini_retry": {
+        "max_attempts": 4,
+        "base_delay_sec": 1.0,
+        "max_delay_sec": 20.0,
+        "timeout_sec": 120,
+        "retry_budget_ratio": 0.2,
+        "breaker_failure_threshold": 5,
+        "breaker_reset_sec": 30
+    },
+    "hedging": {
+        "enabled": False,
+        "percentile": 95,
+        "min_samples": 20,
+        "max_extra_ratio": 0.1
+    },
+    "vision_batch": {
+        "batch_size": 1,
+        "max_wait_ms": 300
+    },
+    "image_upload": {
+        "backend": "inline"
+    },
+    "vision_preprocess": {
+        "enabled": False,
+        "max_long_edge": 1536,
+        "format": "jpeg",
+        "quality": 90
+    },
+    "vision_output": {
+        "compact": False
+    },
+    "vision_tiling": {
+        "enabled": False,
+        "tile_size": 1536,
+        "overlap": 0.15,
+        "min_long_edge": 2400,
+        "min_aspect": 1.6,
+        "max_tiles": 8,
+        "iou_threshold": 0.5
+    },
+    "layout_refine": {
+        "mode": "gemini"
+    },
+    "watermark": {
+        "match": "flagged",
+        "threshold": 0.85
+    },
+    "inpainting": {
+        "mode": "roi",
+        "workers": 4,
+        "roi_pad": 12,
+        "small_area": 4096,
+        "batch_area": 65536,
+        "adaptive": False,
+        "uniform_std": 3.0,
+        "smooth_rms": 4.0,
+        "mask_mode": "rect",
+        "pyramid_mp": 0,
+        "seam_width": 4,
+        "algorithm": "telea"
+    },
+    "background_encoding": {
+        "file": {"format": "png", "png_level": 1},
+        "html": {"format": "png", "png_level": 1},
+        "pptx": {"format": "png", "png_level": 1}
+    },
+    "html_output": {
+        "background": "embed"
+    },
+    "pptx_output": {
+        "writer": "python-pptx",
+        "batch_merge": True
+    },
+    "vision_cascade": {
+        "enabled": False,
+        "fast_model": "gemini-2.5-flash-lite",
+        "escalation": "model",
+        "min_score": 0.75
     }
 }
 
@@ -107,11 +218,104 @@ def save_settings_to_file(settings):
 current_settings = load_settings()
 # Use reconstruct settings as default for analyzer if specific context not provided
 default_vision_model = current_settings.get("reconstruct", {}).get("vision_model", "gemini-3-flash-preview")
-analyzer = Analyzer(model_name=default_vision_model)
 
-image_processor = ImageProcessor()
-code_generator = CodeGenerator()
+# Persistent layout cache (skips Gemini calls when the same slide image is re-run)
+cache_settings = current_settings.get("layout_cache", DEFAULT_SETTINGS["layout_cache"])
+layout_cache = LayoutCache(
+    os.path.join(BASE_DIR, "cache", "layout"),
+    max_size_mb=cache_settings.get("max_size_mb", 500),
+    enabled=cache_settings.get("enabled", True)
+)
+# AIMD limiter for in-flight Gemini vision calls (backs off on 429/timeout, grows while latency is flat)
+aimd_settings = current_settings.get("adaptive_concurrency", DEFAULT_SETTINGS["adaptive_concurrency"])
+vision_limiter = AdaptiveLimiter(
+    initial_limit=aimd_settings.get("initial_limit", 4),
+    min_limit=aimd_settings.get("min_limit", 1),
+    max_limit=aimd_settings.get("max_limit", 15)
+)
+
+# Retry / backoff / per-model circuit breaker shared by every Gemini call
+retry_settings = current_settings.get("gemini_retry", DEFAULT_SETTINGS["gemini_retry"])
+gemini_caller = ResilientCaller(
+    policy=RetryPolicy(
+        max_attempts=retry_settings.get("max_attempts", 4),
+        base_delay=retry_settings.get("base_delay_sec", 1.0),
+        max_delay=retry_settings.get("max_delay_sec", 20.0),
+        timeout=retry_settings.get("timeout_sec", 120)
+    ),
+    budget=RetryBudget(ratio=retry_settings.get("retry_budget_ratio", 0.2)),
+    failure_threshold=retry_settings.get("breaker_failure_threshold", 5),
+    reset_timeout=retry_settings.get("breaker_reset_sec", 30)
+)
+
+# Optional hedged (speculative duplicate) requests to cut tail latency
+hedging_settings = current_settings.get("hedging", DEFAULT_SETTINGS["hedging"])
+vision_hedger = Hedger(
+    enabled=hedging_settings.get("enabled", False),
+    percentile=hedging_settings.get("percentile", 95),
+    min_samples=hedging_settings.get("min_samples", 20),
+    max_extra_ratio=hedging_settings.get("max_extra_ratio", 0.1)
+)
+
+# Model-bound analyzers are resolved per task; never mutate a shared analyzer's model_name
+# image_upload.backend: "inline" (pre-encoded bytes), "files_api" (upload once, reference by URI), "local" (offline stand-in)
+upload_settings = current_settings.get("image_upload", DEFAULT_SETTINGS["image_upload"])
+# vision_preprocess: resize/re-encode only what Gemini sees (inpainting still uses the full-resolution file)
+preprocess_options = PreprocessOptions.from_settings(current_settings.get("vision_preprocess", DEFAULT_SETTINGS["vision_preprocess"]))
+# vision_output.compact: schema-constrained positional rows (fewer output tokens), expanded locally
+output_settings = current_settings.get("vision_output", DEFAULT_SETTINGS["vision_output"])
+# vision_tiling: tall/large infographics are detected as overlapping tiles and merged (IoU NMS)
+layout_tiler = LayoutTiler.from_settings(current_settings.get("vision_tiling", DEFAULT_SETTINGS["vision_tiling"]))
+# layout_refine.mode: "gemini" (second vision round-trip) or "local" (OpenCV bbox snapping, no API call)
+refine_settings = current_settings.get("layout_refine", DEFAULT_SETTINGS["layout_refine"])
+local_refine = BBoxSnapper() if refine_settings.get("mode", "gemini") == "local" else None
+analyzer_pool = AnalyzerPool(cache=layout_cache, limiter=vision_limiter, resilience=gemini_caller, hedger=vision_hedger,
+                             image_backend=upload_settings.get("backend", "inline"), preprocess=preprocess_options,
+                             compact_output=output_settings.get("compact", False), tiler=layout_tiler,
+                             local_refine=local_refine)
+
+# Multi-slide batched detection across concurrent tasks (batch_size 1 = off)
+batch_settings = current_settings.get("vision_batch", DEFAULT_SETTINGS["vision_batch"])
+layout_batcher = LayoutBatcher(
+    batch_size=batch_settings.get("batch_size", 1),
+    max_wait_ms=batch_settings.get("max_wait_ms", 300)
+)
+
+# Cheap-model-first cascade: escalate to the task's model (or refine) only for low-scoring layouts
+cascade_settings = current_settings.get("vision_cascade", DEFAULT_SETTINGS["vision_cascade"])
+layout_cascade = LayoutCascade(
+    analyzer_pool,
+    batcher=layout_batcher,
+    enabled=cascade_settings.get("enabled", False),
+    fast_model=cascade_settings.get("fast_model", "gemini-2.5-flash-lite"),
+    escalation=cascade_settings.get("escalation", "model"),
+    min_score=cascade_settings.get("min_score", 0.75)
+)
+analyzer_pool.get(default_vision_model) # Fail fast at startup if the API key is missing
+
+# The watermark template is learned from the first slide where Gemini finds the NotebookLM watermark
+# (size/position/distinctiveness checked before it is saved). watermark.match: "flagged" (slides where Gemini
+# reported the watermark, plus every local-mode slide, which has no vision output), "always" (all input is
+# from NotebookLM) or "off"
+watermark_settings = current_settings.get("watermark", DEFAULT_SETTINGS["watermark"])
+# inpainting.mode: "roi" (per-component crops on a thread pool) or "full" (single full-frame cv2.inpaint)
+# inpainting.algorithm: "telea" (default), "ns", or "request" to honour the form's inpainting_model; adaptive fills are opt-in
+inpaint_settings = current_settings.get("inpainting", DEFAULT_SETTINGS["inpainting"])
+image_processor = ImageProcessor(watermark_template=os.path.join(BASE_DIR, "cache", "watermark", "notebooklm.png"),
+                                 inpaint_options=InpaintOptions.from_settings(inpaint_settings),
+                                 watermark_mode=watermark_settings.get("match", "flagged"),
+                                 watermark_threshold=watermark_settings.get("threshold", 0.85))
+# background_encoding: codec per output target (file/html/pptx), encoded in parallel worker threads
+background_encoder = BackgroundEncoder.from_settings(current_settings.get("background_encoding", DEFAULT_SETTINGS["background_encoding"]))
+# html_output.background: "embed" (base64 data URI, standalone file) or "external" (assets/<hash>.<ext>, cacheable)
+html_settings = current_settings.get("html_output", DEFAULT_SETTINGS["html_output"])
+code_generator = CodeGenerator(asset_mode=html_settings.get("background", "embed"))
 pptx_generator = PPTXGenerator()
+# pptx_output.writer: "python-pptx" (object model, held in memory until save) or "fast" (direct XML streamed
+# to the zip slide by slide; much faster and flat memory for large batch decks)
+# pptx_output.batch_merge: batch export splices the per-slide .pptx files already built by the slide tasks,
+# rebuilding only slides whose deck is missing or older than their layout JSON
+pptx_settings = current_settings.get("pptx_output", DEFAULT_SETTINGS["pptx_output"])
 
 @app.get("/settings")
 async def get_settings():
@@ -143,9 +347,7 @@ async def update_settings(request: Request):
              
     save_settings_to_file(current_data)
     
-    # Update active analyzer if reconstruct vision model changed
-    if "reconstruct" in incoming_data and "vision_model" in incoming_data["reconstruct"]:
-        analyzer.model_name = incoming_data["reconstruct"]["vision_model"]
+    # No analyzer update needed: each task resolves its model-bound analyzer from analyzer_pool
         
     return JSONResponse({"status": "success", "settings": current_data})
 
@@ -202,12 +404,10 @@ async def update_api_key(request: Request):
         os.environ["GOOGLE_API_KEY"] = new_key
         
         # 3. Reload Analyzer Client
-        global analyzer
-        # Analyzer re-init will pick up new os.environ key
-        current_vision_model = analyzer.model_name
+        # Pool reset re-creates the shared client, picking up the new os.environ key
         try:
-            analyzer = Analyzer(model_name=current_vision_model)
-            logger.info("Analyzer re-initialized with new API Key.")
+            analyzer_pool.reset()
+            logger.info("Analyzer pool re-initialized with new API Key.")
         except Exception as e:
             logger.error(f"Failed to re-init analyzer: {e}")
             return JSONResponse(status_code=500, content={"message": "Saved key but failed to reload analyzer. Please restart server."})
@@ -275,6 +475,29 @@ async def test_api_key(request: Request):
         return JSONResponse(status_code=500, content={"message": f"Test Failed: {str(e)}"})
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return JSONResponse({
+        "layout_cache": layout_cache.stats(),
+        "analyzer_models": analyzer_pool.models(),
+        "concurrency": concurrency_snapshot(),
+        "gemini_calls": gemini_caller.stats(),
+        "hedging": vision_hedger.stats(),
+        "vision_batch": layout_batcher.stats(),
+        "vision_cascade": layout_cascade.stats(),
+        "vision_tiling": layout_tiler.stats(),
+        "inpainting": image_processor.inpaint_stats(),
+        "background_encoding": background_encoder.stats(),
+        "image_upload": analyzer_pool.image_backend.stats() if analyzer_pool.image_backend else None
+    })
+
+@app.delete("/cache")
+async def clear_cache():
+    await asyncio.to_thread(layout_cache.clear)
+    logger.info("Layout cache cleared.")
+    return JSONResponse({"status": "cleared"})
+
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -282,13 +505,21 @@ async def read_root(request: Request):
 # Progress tracking storage (Simple in-memory for demo)
 progress_store = {}
 
+def concurrency_snapshot():
+    return {
+        "tasks": task_limiter.stats(),
+        "vision": vision_limiter.stats()
+    }
+
 @app.get("/progress/{task_id}")
 async def progress_stream(task_id: str):
     async def event_generator():
         while True:
             if task_id in progress_store:
                 data = progress_store[task_id]
-                yield f"data: {json.dumps(data)}\n\n"
+                # Attach live limiter state (current AIMD vision limit etc.)
+                payload = {**data, "concurrency": concurrency_snapshot()}
+                yield f"data: {json.dumps(payload)}\n\n"
                 if data['status'] in ['complete', 'error']:
                     break
             await asyncio.sleep(0.5)
@@ -308,14 +539,12 @@ async def upload_file(
     max_concurrent: int = Form(3), # Receive concurrency setting
     exclude_text: str = Form(None),
     font_family: str = Form("Malgun Gothic"), # Default font
-    refine_layout: bool = Form(False)
+    refine_layout: bool = Form(False),
+    use_cache: bool = Form(True) # False = bypass layout cache for this request
 ):
     # Dynamic Concurrency Update (Runtime)
-    global MAX_CONCURRENT_TASKS, semaphore
-    if max_concurrent != MAX_CONCURRENT_TASKS:
-        MAX_CONCURRENT_TASKS = max_concurrent
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
-        logger.info(f"Runtime Concurrency Updated to: {MAX_CONCURRENT_TASKS}")
+    # Resized in place so tasks already holding a slot are not orphaned
+    task_limiter.set_limit(max_concurrent)
 
     timestamp = generate_timestamp()
     task_id = str(uuid.uuid4()) # Use UUID for unique task tracking
@@ -350,18 +579,42 @@ async def upload_file(
         batch_folder,
         exclude_text,
         font_family,
-        refine_layout
+        refine_layout,
+        use_cache
     )
 
     return JSONResponse({"status": "processing", "task_id": task_id})
 
 # Concurrency Limit
 MAX_CONCURRENT_TASKS = int(current_settings.get("max_concurrent", 3))
-semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+task_limiter = ConcurrencyLimiter(MAX_CONCURRENT_TASKS, name="tasks")
 
 # Cancellation Store
 cancelled_tasks = set()
 
+# In-flight Gemini calls per task (cancelled directly by /cancel)
+inflight_calls = {}
+
+class TaskCancelledError(Exception):
+    pass
+
+async def run_cancellable(task_id, coro):
+    """
+    Runs an async Gemini call as its own asyncio task so /cancel/{task_id}
+    can abort the in-flight HTTP request instead of waiting for it to finish.
+    """
+    call = asyncio.ensure_future(coro)
+    inflight_calls[task_id] = call
+    try:
+        return await call
+    except asyncio.CancelledError:
+        # Only translate cancellations requested through /cancel; shutdown cancellation propagates
+        if call.cancelled() and task_id in cancelled_tasks:
+            raise TaskCancelledError(task_id)
+        raise
+    finally:
+        inflight_calls.pop(task_id, None)
+
 # Pause Control
 pause_event = asyncio.Event()
 pause_event.set() # Initially True (Running)
@@ -407,12 +660,27 @@ async def cancel_task(task_id: str):
     if task_id in progress_store:
         progress_store[task_id]["status"] = "cancelled"
         progress_store[task_id]["message"] = "작업이 취소되었습니다."
+    # Abort the in-flight Gemini request, if any
+    call = inflight_calls.get(task_id)
+    if call and not call.done():
+        call.cancel()
+        logger.info(f"Cancelled in-flight Gemini call for task {task_id}")
     return JSONResponse({"status": "cancelled"})
 
     return JSONResponse({"status": "cancelled"})
 
-async def process_combine_task(task_id, source_path, bg_path, original_name, vision_model, codegen_model, batch_folder, font_family="Malgun Gothic", refine_layout=False, exclude_text=None):
-    async with semaphore:
+def gemini_error_progress(e):
+    """Progress payload for structured Gemini failures (frontend can offer a retry when retryable)."""
+    return {
+        "status": "error",
+        "message": str(e),
+        "percent": 0,
+        "error_type": type(e).__name__,
+        "retryable": e.retryable
+    }
+
+async def process_combine_task(task_id, source_path, bg_path, original_name, vision_model, codegen_model, batch_folder, font_family="Malgun Gothic", refine_layout=False, exclude_text=None, use_cache=True):
+    async with task_limiter:
         if task_id in cancelled_tasks:
             cancelled_tasks.discard(task_id)
             return
@@ -420,26 +688,35 @@ async def process_combine_task(task_id, source_path, bg_path, original_name, vis
         logger.info(f"Starting process_combine_task for {task_id} (Refine: {refine_layout})")
         target_dir = os.path.join(OUTPUT_DIR, batch_folder)
         ensure_directory(target_dir)
+        prepared = None
+        # Each image is read/decoded at most once per task and released in `finally`
+        source_handle = ImageHandle(source_path)
+        bg_handle = ImageHandle(bg_path)
 
         try:
              await wait_if_paused(task_id)
              if task_id in cancelled_tasks: return
              
              # 1. Analyze Source
-             # Update model
-             analyzer.model_name = vision_model
+             # Model-bound analyzer for this task (shared pool, no global mutation)
+             analyzer = analyzer_pool.get(vision_model)
+             # Read/encode the source once; detect and refine share it (no second upload)
+             prepared = await analyzer.prepare_image_async(source_handle)
              
              file_id = generate_timestamp()
              
              progress_store[task_id] = {"status": "processing", "message": "[1단계] 원본 텍스트 분석 중...", "percent": 20}
              
-             # 1.1 Initial Detection
-             layout_data, width, height = await asyncio.to_thread(analyzer.detect_initial_layout, source_path)
+             # 1.1 Initial Detection (cascade: refine/heavy model only for low-scoring layouts)
+             if layout_cascade.enabled:
+                 layout_data, width, height = await run_cancellable(task_id, layout_cascade.detect(analyzer, prepared, use_cache, refine_layout))
+             else:
+                 layout_data, width, height = await run_cancellable(task_id, layout_batcher.detect(analyzer, prepared, use_cache))
              
              # 1.2 Refinement (Optional)
-             if refine_layout:
+             if refine_layout and not layout_cascade.enabled:
                  progress_store[task_id] = {"status": "processing", "message": "[1.5단계] 정밀 분석 (Refinement) 수행 중...", "percent": 40}
-                 layout_data = await asyncio.to_thread(analyzer.refine_layout, source_path, layout_data)
+                 layout_data = await run_cancellable(task_id, analyzer.apply_refine_async(prepared, layout_data, use_cache))
              
              # 1.3 Pixel Convert
              layout_data = analyzer.convert_to_pixels(layout_data, width, height)
@@ -481,15 +758,36 @@ async def process_combine_task(task_id, source_path, bg_path, original_name, vis
              final_bg_path = os.path.join(target_dir, final_bg_filename)
              
              # Resize logic using PIL in thread
-             def resize_bg(src_bg, target_w, target_h, dest_path):
+             def resize_bg(handle, target_w, target_h, dest_path):
                  from PIL import Image
-                 with Image.open(src_bg) as img:
-                     msg_log = f"Resizing BG from {img.size} to ({target_w}, {target_h})"
-                     img_resized = img.resize((target_w, target_h), Image.Resampling.LANCZOS)
-                     img_resized.save(dest_path)
-                     return msg_log
-
-             msg = await asyncio.to_thread(resize_bg, bg_path, width, height, final_bg_path)
+                 if handle.size == (target_w, target_h) and handle.format == "PNG":
+                     # Already the right size and format: copy the bytes, no decode/re-encode
+                     with open(dest_path, "wb") as f:
+                         f.write(handle.data)
+                     return f"BG already {handle.size}, copied without resizing"
+                 msg_log = f"Resizing BG from {handle.size} to ({target_w}, {target_h})"
+                 img = handle.pil
+                 if img.size != (target_w, target_h):
+                     img = img.resize((target_w, target_h), Image.Resampling.LANCZOS)
+                 img.save(dest_path)
+                 return msg_log
+
+             if background_encoder.is_default:
+                 msg = await asyncio.to_thread(resize_bg, bg_handle, width, height, final_bg_path)
+                 bg_paths = background_encoder.target_paths(final_bg_path)
+             else:
+                 def resize_bg_array(handle, target_w, target_h):
+                     import cv2
+                     img = handle.bgr
+                     if (img.shape[1], img.shape[0]) != (target_w, target_h):
+                         img = cv2.resize(img, (target_w, target_h), interpolation=cv2.INTER_LANCZOS4)
+                     return img
+                 msg = f"BG {bg_handle.size} -> ({width}, {height}), encoded per target"
+                 resized_bg = await asyncio.to_thread(resize_bg_array, bg_handle, width, height)
+                 bg_paths = await background_encoder.save_async(resized_bg, final_bg_path)
+                 del resized_bg
+             bg_handle.release()
+             final_bg_filename = os.path.basename(bg_paths["file"])
              logger.info(msg)
              
              # Step 3: Generate HTML
@@ -497,7 +795,7 @@ async def process_combine_task(task_id, source_path, bg_path, original_name, vis
              html_filename = f"{original_name}_slide_{file_id}.html"
              html_path = os.path.join(target_dir, html_filename)
              
-             await asyncio.to_thread(code_generator.generate_html, filtered_layout_data, width, height, final_bg_path, html_path, normalize=False, font_family=font_family)
+             await asyncio.to_thread(code_generator.generate_html, filtered_layout_data, width, height, bg_paths["html"], html_path, normalize=False, font_family=font_family)
 
              # Step 4: Generate PPTX
              progress_store[task_id] = {"status": "processing", "message": "[3단계] PPTX 생성 중...", "percent": 80}
@@ -511,7 +809,7 @@ async def process_combine_task(task_id, source_path, bg_path, original_name, vis
                   pptx_filename = f"{original_name}_slide_{file_id}.pptx"
                   pptx_path = os.path.join(target_dir, pptx_filename)
                   pptx_gen_single = PPTXGenerator()
-                  pptx_gen_single.add_slide(filtered_layout_data, final_bg_path, width, height, font_family=font_family)
+                  pptx_gen_single.add_slide(filtered_layout_data, bg_paths["pptx"], width, height, font_family=font_family)
                   pptx_gen_single.save(pptx_path)
                   pptx_url = f"/output/{batch_folder}/{pptx_filename}"
 
@@ -527,22 +825,37 @@ async def process_combine_task(task_id, source_path, bg_path, original_name, vis
                 }
             }
              
+        except TaskCancelledError:
+            logger.info(f"Task {task_id} cancelled during Gemini call.")
+            cancelled_tasks.discard(task_id)
+            progress_store[task_id] = {"status": "cancelled", "message": "사용자에 의해 작업이 취소되었습니다.", "percent": 0}
+        except GeminiError as e:
+            logger.error(f"Combine Task Gemini Error ({type(e).__name__}): {e}")
+            progress_store[task_id] = gemini_error_progress(e)
         except Exception as e:
             logger.error(f"Combine Task Error: {e}")
             progress_store[task_id] = {"status": "error", "message": str(e), "percent": 0}
-
-async def process_slide_task(task_id, input_path, original_name, vision_model, inpainting_model, codegen_model, batch_folder, exclude_text=None, font_family="Malgun Gothic", refine_layout=False):
-    async with semaphore:
+        finally:
+            if prepared is not None:
+                await analyzer.release_image_async(prepared)
+            source_handle.release()
+            bg_handle.release()
+
+async def process_slide_task(task_id, input_path, original_name, vision_model, inpainting_model, codegen_model, batch_folder, exclude_text=None, font_family="Malgun Gothic", refine_layout=False, use_cache=True):
+    async with task_limiter:
         if task_id in cancelled_tasks:
             logger.info(f"Task {task_id} cancelled before starting.")
             cancelled_tasks.discard(task_id)
             return
 
-        logger.info(f"Starting process_slide_task for {task_id} with model {vision_model} (Active Tasks: {MAX_CONCURRENT_TASKS - semaphore._value})")
+        logger.info(f"Starting process_slide_task for {task_id} with model {vision_model} (Active Tasks: {task_limiter.in_flight}, Vision Limit: {vision_limiter.stats()['limit']})")
         
         # Determine Output Directory
         target_dir = os.path.join(OUTPUT_DIR, batch_folder)
         ensure_directory(target_dir)
+        prepared = None
+        # Decoded once, shared by analysis, local refine and inpainting; released in `finally`
+        image_handle = ImageHandle(input_path)
         
         try:
             await wait_if_paused(task_id) # Check pause at start
@@ -552,9 +865,11 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
             if "gemini-2.5-flash-image" in vision_model:
                  pass 
                  
-            # Update model name
-            analyzer.model_name = current_vision_model
-            logger.info(f"Analyzer model set to: {analyzer.model_name}")
+            # Model-bound analyzer for this task (shared pool, no global mutation)
+            analyzer = analyzer_pool.get(current_vision_model)
+            # Read/encode the slide once; detect and refine share it (no second upload)
+            prepared = await analyzer.prepare_image_async(image_handle)
+            logger.info(f"Analyzer model for {task_id}: {analyzer.model_name}")
 
             # Generate timestamp ID for filenames (User preferred)
             file_id = generate_timestamp()
@@ -569,8 +884,11 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
                 progress_store[task_id] = {"status": "cancelled", "message": "사용자에 의해 작업이 취소되었습니다.", "percent": 0}
                 return
 
-            # 1.1 Initial Detection
-            layout_data, width, height = await asyncio.to_thread(analyzer.detect_initial_layout, input_path)
+            # 1.1 Initial Detection (cascade: refine/heavy model only for low-scoring layouts)
+            if layout_cascade.enabled:
+                layout_data, width, height = await run_cancellable(task_id, layout_cascade.detect(analyzer, prepared, use_cache, refine_layout))
+            else:
+                layout_data, width, height = await run_cancellable(task_id, layout_batcher.detect(analyzer, prepared, use_cache))
             logger.info(f"Initial Analysis complete for {task_id}. Width: {width}, Height: {height}")
 
             # --- PAUSE CHECK (User Request: Pause between calls) ---
@@ -582,9 +900,9 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
 
             progress_store[task_id] = {"status": "processing", "message": "[2단계 of 4단계] 디자인 전문가 피드백 루프 수행 중...", "percent": 30}
 
-            # 1.2 Refinement (Feedback Loop)
-            if refine_layout:
-                 layout_data = await asyncio.to_thread(analyzer.refine_layout, input_path, layout_data)
+            # 1.2 Refinement (Feedback Loop) - the cascade already decided whether to refine
+            if refine_layout and not layout_cascade.enabled:
+                 layout_data = await run_cancellable(task_id, analyzer.apply_refine_async(prepared, layout_data, use_cache))
             
             # 1.3 Pixel Conversion
             layout_data = analyzer.convert_to_pixels(layout_data, width, height)
@@ -629,7 +947,13 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
             
             # Run blocking inpainting in thread pool
             # CRITICAL: Use full_layout_data here to ensure Watermarks are ERASED from background
-            await asyncio.to_thread(image_processor.create_clean_background, input_path, full_layout_data, bg_path)
+            clean_bg = await asyncio.to_thread(image_processor.clean_background, image_handle, full_layout_data, inpainting_model)
+            # Pixels are not needed for HTML/PPTX generation
+            image_handle.release()
+            # One encode per distinct target codec (file/html/pptx), in parallel off the event loop
+            bg_paths = await background_encoder.save_async(clean_bg, bg_path)
+            del clean_bg
+            bg_filename = os.path.basename(bg_paths["file"])
             
             # Check Cancellation
             if task_id in cancelled_tasks:
@@ -652,7 +976,7 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
             # normalize=False because we already did it
             # USE FILTERED LAYOUT
             # PASS FONT FAMILY
-            await asyncio.to_thread(code_generator.generate_html, filtered_layout_data, width, height, bg_path, html_path, normalize=False, font_family=font_family, model_name=codegen_model)
+            await asyncio.to_thread(code_generator.generate_html, filtered_layout_data, width, height, bg_paths["html"], html_path, normalize=False, font_family=font_family, model_name=codegen_model)
             
             # Log execution
             log_execution(original_name, current_vision_model, inpainting_model, codegen_model)
@@ -689,7 +1013,7 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
                     
                     # USE FILTERED LAYOUT
                     # PASS FONT FAMILY
-                    pptx_gen_single.add_slide(filtered_layout_data, bg_path, width, height, font_family=font_family)
+                    pptx_gen_single.add_slide(filtered_layout_data, bg_paths["pptx"], width, height, font_family=font_family)
                     pptx_gen_single.save(pptx_path)
                     
                     pptx_url = f"/output/{batch_folder}/{pptx_filename}"
@@ -713,9 +1037,20 @@ async def process_slide_task(task_id, input_path, original_name, vision_model, i
                 }
             }
 
+        except TaskCancelledError:
+            logger.info(f"Task {task_id} cancelled during Gemini call.")
+            cancelled_tasks.discard(task_id)
+            progress_store[task_id] = {"status": "cancelled", "message": "사용자에 의해 작업이 취소되었습니다.", "percent": 0}
+        except GeminiError as e:
+            logger.error(f"Processing Gemini error ({type(e).__name__}): {e}")
+            progress_store[task_id] = gemini_error_progress(e)
         except Exception as e:
             logger.error(f"Processing error: {str(e)}")
             progress_store[task_id] = {"status": "error", "message": str(e), "percent": 0}
+        finally:
+            if prepared is not None:
+                await analyzer.release_image_async(prepared)
+            image_handle.release()
 
 def log_execution(filename, vision, inpaint, codegen):
     try:
@@ -754,7 +1089,10 @@ async def remove_text(
     file: UploadFile = File(...), 
     vision_model: str = Form("gemini-3-flash-preview"),
     inpainting_model: str = Form("opencv-telea"),
-    batch_folder: str = Form("single")
+    batch_folder: str = Form("single"),
+    exclude_text: str = Form(None),
+    use_cache: bool = Form(True),
+    mode: str = Form("gemini") # "gemini" (vision analysis) or "local" (classical CV, no API call)
 ):
     try:
         timestamp = generate_timestamp()
@@ -769,27 +1107,30 @@ async def remove_text(
         
         with open(input_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
-          # 1. Analyze
-        # Pass exclude_text to analyzer
-        # FORCE NEW METHOD CALL
-        import sys
-        if 'src.analyzer' in sys.modules:
-             logger.info(f"DEBUG: Analyzer loaded from {sys.modules['src.analyzer'].__file__}")
-        
-        analyzer.model_name = vision_model # Keep this line as it sets the model for the analyzer instance
-        layout_data, width, height = analyzer.analyze_image_v2(input_path, exclude_text) # Changed to analyze_image_v2 and passed exclude_text
-        
-        # target_dir already defined above
 
         bg_filename = f"{original_name}_bg_only_{timestamp}.png"
         bg_path = os.path.join(target_dir, bg_filename)
-        
-        image_processor.create_clean_background(input_path, layout_data, bg_path)
+
+        with ImageHandle(input_path) as image_handle:
+            if mode != "local":
+                try:
+                    analyzer = analyzer_pool.get(vision_model)
+                    layout_data, width, height = await analyzer.analyze_image_v2_async(image_handle, exclude_text, use_cache=use_cache) # Changed to analyze_image_v2 and passed exclude_text
+                except (TransientGeminiError, CircuitOpenError) as e:
+                    # API down / rate limited: the mask does not need text content, so fall back to local detection
+                    logger.warning(f"Gemini unavailable for /remove-text, using local text detection: {e}")
+                    mode = "local"
+                else:
+                    await asyncio.to_thread(image_processor.create_clean_background, image_handle, layout_data, bg_path, inpainting_model)
+
+            if mode == "local":
+                await asyncio.to_thread(image_processor.create_clean_background_local, image_handle, bg_path, inpainting_model)
         
         return JSONResponse({
             "status": "success",
             "data": {
-                "bg_url": f"/output/{batch_folder}/{bg_filename}"
+                "bg_url": f"/output/{batch_folder}/{bg_filename}",
+                "mode": mode
             }
         })
     except Exception as e:
@@ -821,7 +1162,7 @@ async def remove_text_ai(
         # Original code used `process_remove_text_ai` or similar. Let's check context.
         # Assuming removing text uses analyzer.
         
-        analyzer.model_name = vision_model
+        analyzer = analyzer_pool.get(vision_model)
         # ... (rest of logic) ...
         # logic below depends on input_path.
         
@@ -906,110 +1247,181 @@ async def remove_text_ai(
 
 
 
-@app.post("/generate-pptx-batch/{batch_folder}")
-async def generate_pptx_batch(batch_folder: str):
-    try:
-        target_dir = os.path.join(OUTPUT_DIR, batch_folder)
-        if not os.path.exists(target_dir):
-            return JSONResponse(status_code=404, content={"message": "Batch folder not found"})
+def list_batch_layouts(target_dir):
+    """Layout JSON files of a batch folder in slide order, preferring _filtered.json over the raw file."""
+    # Find all JSON layout files
+    all_json_files = [f for f in os.listdir(target_dir) if f.endswith(".json") and "_layout_" in f]
 
-        # Find all JSON layout files
-        all_json_files = [f for f in os.listdir(target_dir) if f.endswith(".json") and "_layout_" in f]
+    # Intelligent Filtering: Prefer _filtered.json over raw .json
+    filtered_files = {f for f in all_json_files if "_filtered.json" in f}
+    json_files = []
+    
+    # Add all filtered files
+    json_files.extend(list(filtered_files))
+    
+    # Add raw files ONLY if their filtered counterpart is missing
+    # Raw file: "name_layout_id.json" -> Expected filtered: "name_layout_id_filtered.json"
+    for f in all_json_files:
+        if "_filtered.json" in f:
+            continue # Already added
         
-        if not all_json_files:
-            return JSONResponse(status_code=400, content={"message": "No processed slides found in this batch"})
+        # Construct expected filtered name
+        expected_filtered = f.replace(".json", "_filtered.json")
+        if expected_filtered not in filtered_files:
+            json_files.append(f)
 
-        # Intelligent Filtering: Prefer _filtered.json over raw .json
-        filtered_files = {f for f in all_json_files if "_filtered.json" in f}
-        json_files = []
-        
-        # Add all filtered files
-        json_files.extend(list(filtered_files))
-        
-        # Add raw files ONLY if their filtered counterpart is missing
-        # Raw file: "name_layout_id.json" -> Expected filtered: "name_layout_id_filtered.json"
-        for f in all_json_files:
-            if "_filtered.json" in f:
-                continue # Already added
-            
-            # Construct expected filtered name
-            expected_filtered = f.replace(".json", "_filtered.json")
-            if expected_filtered not in filtered_files:
-                json_files.append(f)
+    # Sort files to ensure order (optional, by timestamp usually)
+    json_files.sort()
+    return json_files
 
-        # Sort files to ensure order (optional, by timestamp usually)
-        json_files.sort()
+def find_batch_background(target_dir, json_file, target="pptx"):
+    """
+    Background image matching a layout JSON, for the given background_encoding target
+    (html/pptx), falling back to the plain file. Returns None if missing.
+    """
+    # Infer BG Filename
+    # Naming convention: {original_name}_layout_{file_id}.json (or ..._filtered.json)
+    # BG convention:     {original_name}_bg_{file_id}.png
+    
+    # Fix: If json_file has _filtered.json, strip it first to find the raw BG image name
+    raw_json_name = json_file.replace("_filtered.json", ".json")
+    base_part = raw_json_name.replace("_layout_", "_bg_").replace(".json", ".png")
+    bg_path = os.path.join(target_dir, base_part)
+    # background_encoding may have written a target-specific codec or a jpeg file target
+    bg_candidates = [background_encoder.target_paths(bg_path)[target], bg_path, os.path.splitext(bg_path)[0] + ".jpg"]
+    bg_path = next((c for c in bg_candidates if os.path.exists(c)), bg_path)
+    
+    if not os.path.exists(bg_path):
+        # Try fallback or loose search?
+        # Let's try to match by file_id if strict replacement fails
+        parts = json_file.split('_layout_')
+        if len(parts) == 2:
+            prefix = parts[0]
+            suffix = parts[1].replace('.json', '.png')
+            bg_path_candidate = os.path.join(target_dir, f"{prefix}_bg_{suffix}")
+            if os.path.exists(bg_path_candidate):
+                return bg_path_candidate
+        logger.warning(f"BG image not found for {json_file}")
+        return None
+    return bg_path
+
+def iter_batch_slides(target_dir, json_files, target="pptx"):
+    """
+    Yields (layout_data, width, height, bg_path) one slide at a time.
+    Width/height come from the background's header (the JSON has no image size).
+    """
+    from PIL import Image
+    for json_file in json_files:
+        json_path = os.path.join(target_dir, json_file)
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                layout_data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Skipping bad JSON {json_file}: {e}")
+            continue
 
-        # Create PPTX
-        pptx_gen = PPTXGenerator() 
+        bg_path = find_batch_background(target_dir, json_file, target)
+        if bg_path is None:
+            continue
         
-        slides_added = 0
+        # Get dimensions from BG image
+        with Image.open(bg_path) as img:
+            w, h = img.size
+        yield layout_data, w, h, bg_path
+
+def find_batch_slide_pptx(target_dir, json_file):
+    """
+    Per-slide deck saved by the slide task for a layout JSON ({original_name}_slide_{file_id}.pptx),
+    or None if missing or older than the layout (then it no longer shows the current layout).
+    """
+    raw_json_name = json_file.replace("_filtered.json", ".json")
+    pptx_path = os.path.join(target_dir, raw_json_name.replace("_layout_", "_slide_").replace(".json", ".pptx"))
+    if not os.path.exists(pptx_path):
+        return None
+    if os.path.getmtime(pptx_path) < os.path.getmtime(os.path.join(target_dir, json_file)):
+        return None
+    return pptx_path
+
+def merge_batch_pptx(target_dir, json_files, output_path, font_family="Malgun Gothic"):
+    """
+    Builds the batch deck from the per-slide decks, falling back to rebuilding a slide from its
+    layout JSON and background (in font_family, the font the slides were processed with) when its
+    deck is missing, stale or cannot be merged.
+    Returns (slides_added, slides_merged); nothing is left on disk if no slide was added.
+    """
+    slides_added = slides_merged = 0
+    writer = FastPPTXWriter(output_path)
+    try:
         for json_file in json_files:
-            # Parse IDs to find matching BG
-            # Format: {original}_{timestamp}_layout_{id}.json
-            # We need to load JSON to be sure about the image size or deduce it.
-            # actually app.py saved metadata: layout_data = ...
-            # and logic: bg_filename = f"{original_name}_bg_{file_id}.png"
-            
-            # Helper to find matching bg file
-            json_path = os.path.join(target_dir, json_file)
-            
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    layout_data = json.load(f)
-            except Exception as e:
-                logger.warning(f"Skipping bad JSON {json_file}: {e}")
-                continue
-
-            # Need width/height.
-            # In process_slide_task, we saved the JSON. Currently JSON doesn't strictly have width/height in root.
-            # But convert_to_pixels put 'bbox_px' which is absolute.
-            # Refine_layout returns list of items.
-            # Missing: Original Image Dimensions.
-            # Workaround: Open the BG image to get dimensions.
-            
-            # Infer BG Filename
-            # Naming convention: {original_name}_layout_{file_id}.json (or ..._filtered.json)
-            # BG convention:     {original_name}_bg_{file_id}.png
-            
-            # Fix: If json_file has _filtered.json, strip it first to find the raw BG image name
-            raw_json_name = json_file.replace("_filtered.json", ".json")
-            base_part = raw_json_name.replace("_layout_", "_bg_").replace(".json", ".png")
-            bg_path = os.path.join(target_dir, base_part)
-            
-            if not os.path.exists(bg_path):
-                # Try fallback or loose search?
-                # Let's try to match by file_id if strict replacement fails
-                parts = json_file.split('_layout_')
-                if len(parts) == 2:
-                    prefix = parts[0]
-                    suffix = parts[1].replace('.json', '.png')
-                    bg_path_candidate = os.path.join(target_dir, f"{prefix}_bg_{suffix}")
-                    if os.path.exists(bg_path_candidate):
-                        bg_path = bg_path_candidate
-                    else:
-                        logger.warning(f"BG image not found for {json_file}")
-                        continue
-                else:
+            slide_pptx = find_batch_slide_pptx(target_dir, json_file)
+            if slide_pptx:
+                try:
+                    merged = writer.add_slides_from_pptx(slide_pptx)
+                    slides_added += merged
+                    slides_merged += merged
                     continue
-            
-            # Get dimensions from BG image
-            from PIL import Image
-            with Image.open(bg_path) as img:
-                w, h = img.size
-            
-            pptx_gen.add_slide(layout_data, bg_path, w, h)
+                except Exception as e:
+                    logger.warning(f"Rebuilding slide, could not merge {os.path.basename(slide_pptx)}: {e}")
+            for layout_data, w, h, bg_path in iter_batch_slides(target_dir, [json_file], "pptx"):
+                writer.add_slide(layout_data, bg_path, w, h, font_family=font_family)
+                slides_added += 1
+    except Exception:
+        writer.abort()
+        raise
+    if slides_added == 0:
+        writer.abort()
+    else:
+        writer.save()
+    return slides_added, slides_merged
+
+def rebuild_batch_pptx(target_dir, json_files, output_path, font_family="Malgun Gothic"):
+    """Builds the batch deck from the layout JSONs and backgrounds with the configured writer. Returns slides added."""
+    use_fast_writer = pptx_settings.get("writer", "python-pptx") == "fast"
+    pptx_gen = FastPPTXWriter(output_path) if use_fast_writer else PPTXGenerator()
+
+    slides_added = 0
+    try:
+        for layout_data, w, h, bg_path in iter_batch_slides(target_dir, json_files, "pptx"):
+            pptx_gen.add_slide(layout_data, bg_path, w, h, font_family=font_family)
             slides_added += 1
+    except Exception:
+        if use_fast_writer:
+            pptx_gen.abort()
+        raise
+
+    if slides_added == 0:
+        if use_fast_writer:
+            pptx_gen.abort()
+    else:
+        pptx_gen.save(output_path)
+    return slides_added
 
-        if slides_added == 0:
-             return JSONResponse(status_code=400, content={"message": "Could not create any slides (missing backgrounds?)"})
+@app.post("/generate-pptx-batch/{batch_folder}")
+async def generate_pptx_batch(batch_folder: str, font_family: str = Form("Malgun Gothic")):
+    try:
+        target_dir = os.path.join(OUTPUT_DIR, batch_folder)
+        if not os.path.exists(target_dir):
+            return JSONResponse(status_code=404, content={"message": "Batch folder not found"})
+
+        json_files = list_batch_layouts(target_dir)
+        if not json_files:
+            return JSONResponse(status_code=400, content={"message": "No processed slides found in this batch"})
 
         timestamp = generate_timestamp()
         pptx_filename = f"batch_presentation_{batch_folder}_{timestamp}.pptx"
         output_pptx_path = os.path.join(target_dir, pptx_filename)
-        
-        pptx_gen.save(output_pptx_path)
-        
+
+        # Both paths read every layout/background and write the deck: keep them off the event loop
+        if pptx_settings.get("batch_merge", True):
+            slides_added, slides_merged = await asyncio.to_thread(merge_batch_pptx, target_dir, json_files, output_pptx_path, font_family)
+        else:
+            slides_added = await asyncio.to_thread(rebuild_batch_pptx, target_dir, json_files, output_pptx_path, font_family)
+            slides_merged = 0
+
+        if slides_added == 0:
+             return JSONResponse(status_code=400, content={"message": "Could not create any slides (missing backgrounds?)"})
+        logger.info(f"Batch PPTX: {slides_merged} slides merged, {slides_added - slides_merged} rebuilt -> {output_pptx_path}")
+
         return JSONResponse({
             "status": "success",
             "download_url": f"/output/{batch_folder}/{pptx_filename}",
@@ -1020,6 +1432,44 @@ async def generate_pptx_batch(batch_folder: str):
         logger.error(f"Generate PPTX Batch Error: {e}")
         return JSONResponse(status_code=500, content={"message": str(e)})
 
+@app.post("/generate-html-deck/{batch_folder}")
+async def generate_html_deck(batch_folder: str, font_family: str = Form("Malgun Gothic")):
+    """
+    One HTML file for the whole batch: shared CSS/font link, lazily loaded content-hashed
+    backgrounds, written to disk slide by slide in a worker thread.
+    """
+    try:
+        target_dir = os.path.join(OUTPUT_DIR, batch_folder)
+        if not os.path.exists(target_dir):
+            return JSONResponse(status_code=404, content={"message": "Batch folder not found"})
+
+        json_files = list_batch_layouts(target_dir)
+        if not json_files:
+            return JSONResponse(status_code=400, content={"message": "No processed slides found in this batch"})
+
+        timestamp = generate_timestamp()
+        deck_filename = f"deck_{batch_folder}_{timestamp}.html"
+        deck_path = os.path.join(target_dir, deck_filename)
+        slides_written = await asyncio.to_thread(
+            code_generator.generate_deck_html,
+            iter_batch_slides(target_dir, json_files, "html"), deck_path,
+            font_family=font_family, title=batch_folder
+        )
+        if slides_written == 0:
+            os.remove(deck_path)
+            return JSONResponse(status_code=400, content={"message": "Could not create any slides (missing backgrounds?)"})
+
+        return JSONResponse({
+            "status": "success",
+            "download_url": f"/output/{batch_folder}/{deck_filename}",
+            "filename": deck_filename,
+            "slides": slides_written
+        })
+
+    except Exception as e:
+        logger.error(f"Generate HTML Deck Error: {e}")
+        return JSONResponse(status_code=500, content={"message": str(e)})
+
 
 @app.post("/save-pdf-images")
 async def save_pdf_images(images: list[UploadFile] = File(...)):
@@ -1071,12 +1521,10 @@ async def combine_upload(
     max_concurrent: int = Form(3),
     font_family: str = Form("Malgun Gothic"),
     refine_layout: str = Form("false"), # Receives string 'true'/'false'
-    exclude_text: str = Form(None)
+    exclude_text: str = Form(None),
+    use_cache: str = Form("true")
 ):
-    global MAX_CONCURRENT_TASKS, semaphore
-    if max_concurrent != MAX_CONCURRENT_TASKS:
-        MAX_CONCURRENT_TASKS = max_concurrent
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+    task_limiter.set_limit(max_concurrent)
         
     timestamp = generate_timestamp()
     task_id = str(uuid.uuid4())
@@ -1115,7 +1563,8 @@ async def combine_upload(
         batch_folder,
         font_family,
         refine_layout.lower() == 'true',
-        exclude_text
+        exclude_text,
+        use_cache.lower() == 'true'
     )
     
     return JSONResponse({"status": "processing", "task_id": task_id})
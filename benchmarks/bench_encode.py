@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Background encode benchmark: time and size per codec, plus sequential vs. parallel multi-target saves.
+
+Usage:
+    python benchmarks/bench_encode.py [slide_folder] [--codecs png:1,png:6,jpeg:90,webp:85] [--repeat 3]
+        [--synthetic 5] [--scale 3]
+
+Codec spec: png:<level>[:<strategy>], jpeg:<quality>, webp:<quality> or webp:lossless.
+Without a folder, synthetic inpainted-looking slides (gradients, shapes, noise) are generated.
+Reports median encode ms and KB per slide, PSNR against the source, and the wall time of
+BackgroundEncoder.save (sequential) vs. save_async (parallel) for a file=png/html=webp/pptx=jpeg setup.
+"""
+import os
+import sys
+import time
+import glob
+import asyncio
+import argparse
+import tempfile
+import statistics
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bg_encoding import BackgroundCodec, BackgroundEncoder
+
+def synthetic_slides(count, scale):
+    rng = np.random.default_rng(0)
+    slides = []
+    w, h = int(1280 * scale), int(720 * scale)
+    for n in range(count):
+        top, bottom = rng.integers(100, 255, 3), rng.integers(60, 255, 3)
+        ramp = np.linspace(0, 1, h)[:, None, None]
+        img = (top * (1 - ramp) + bottom * ramp).astype(np.uint8).repeat(w, axis=1)
+        for _ in range(12):
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            x, y = int(rng.integers(0, w - 200)), int(rng.integers(0, h - 200))
+            cv2.rectangle(img, (x, y), (x + int(rng.integers(50, 400)), y + int(rng.integers(50, 300))), color, -1)
+            cv2.circle(img, (int(rng.integers(0, w)), int(rng.integers(0, h))), int(rng.integers(20, 150)), color, -1)
+        # Mild sensor-like noise, as in rendered/upscaled infographics
+        noise = rng.normal(0, 2, img.shape)
+        img = np.clip(img + noise, 0, 255).astype(np.uint8)
+        slides.append((f"synthetic_{n}", img))
+    return slides
+
+def load_slides(folder):
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+    slides = []
+    for path in paths:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            slides.append((os.path.basename(path), img))
+    return slides
+
+def parse_codec(spec):
+    parts = spec.split(":")
+    fmt = parts[0]
+    if fmt == "png":
+        return BackgroundCodec("png", png_level=int(parts[1]) if len(parts) > 1 else 1,
+                               png_strategy=parts[2] if len(parts) > 2 else "default")
+    if fmt == "webp" and len(parts) > 1 and parts[1] == "lossless":
+        return BackgroundCodec("webp", lossless=True)
+    return BackgroundCodec(fmt, quality=int(parts[1]) if len(parts) > 1 else 90)
+
+def psnr(a, b):
+    mse = float(((a.astype(np.float32) - b.astype(np.float32)) ** 2).mean())
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", nargs="?")
+    parser.add_argument("--codecs", default="png:1,png:6,png:9,png:6:rle,jpeg:85,jpeg:95,webp:80,webp:90,webp:lossless")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=3.0, help="synthetic slide scale (1 = 1280x720)")
+    args = parser.parse_args()
+
+    slides = load_slides(args.folder) if args.folder else synthetic_slides(args.synthetic, args.scale)
+    if not slides:
+        print(f"No images found in {args.folder}")
+        return
+    h, w = slides[0][1].shape[:2]
+    print(f"{len(slides)} slides ({w}x{h}), median of {args.repeat} runs")
+
+    specs = args.codecs.split(",")
+    print(f"{'codec':>16} | {'ms/slide':>9} | {'KB/slide':>9} | {'vs png:1':>8} | {'PSNR':>7}")
+    baseline = None
+    for spec in specs:
+        codec = parse_codec(spec)
+        times, sizes, quality = [], [], []
+        for _, img in slides:
+            runs = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                encoded = codec.encode(img)
+                runs.append(time.perf_counter() - started)
+            times.append(statistics.median(runs))
+            sizes.append(encoded.size)
+            quality.append(psnr(img, cv2.imdecode(encoded, cv2.IMREAD_COLOR)))
+        kb = sum(sizes) / len(sizes) / 1024
+        if baseline is None:
+            baseline = kb
+        print(f"{codec.signature():>16} | {sum(times) / len(times) * 1000:>9.1f} | {kb:>9.0f} | "
+              f"{kb / baseline * 100:>7.0f}% | {min(quality):>7.2f}")
+
+    encoder = BackgroundEncoder({
+        "file": BackgroundCodec("png"),
+        "html": BackgroundCodec("webp", quality=85),
+        "pptx": BackgroundCodec("jpeg", quality=90),
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        sequential, parallel = [], []
+        for name, img in slides:
+            path = os.path.join(tmp, f"{name}_bg.png")
+            started = time.perf_counter()
+            encoder.save(img, path)
+            sequential.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            asyncio.run(encoder.save_async(img, path))
+            parallel.append(time.perf_counter() - started)
+    print(f"\nfile=png html=webp:85 pptx=jpeg:90 ({os.cpu_count()} CPUs)")
+    print(f"  sequential save: {sum(sequential) / len(slides) * 1000:.1f} ms/slide")
+    print(f"  parallel save:   {sum(parallel) / len(slides) * 1000:.1f} ms/slide")
+
+if __name__ == "__main__":
+    main()
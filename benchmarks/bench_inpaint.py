@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Inpainting benchmark: full-frame cv2.inpaint vs. the optimized ImageProcessor paths.
+
+Usage:
+    python benchmarks/bench_inpaint.py [slide_folder] [--modes full,roi,adaptive,pyramid] [--mask rect|glyph]
+        [--pyramid-mp 2.0] [--repeat 3] [--synthetic 5] [--scale 3]
+
+Modes: full (single full-frame cv2.inpaint), roi (per-component crops, Telea only),
+adaptive (per-component crops with flat/gradient fills before Telea),
+pyramid (roi Telea at --pyramid-mp megapixels + full-resolution seam band).
+--mask glyph builds glyph-level masks (strokes + halo) instead of padded rectangles.
+
+Text masks come from the local detector (ImageProcessor.detect_text_regions), so no API key is needed.
+Without a folder, synthetic slides (flat/gradient backgrounds with text) are generated.
+Reports median wall time per slide and PSNR against the "full" output: overall, outside the mask
+(must stay untouched) and along the seams (a band of pixels on both sides of the mask border).
+"""
+import os
+import sys
+import time
+import glob
+import argparse
+import statistics
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.image_processor import ImageProcessor, InpaintOptions
+
+def synthetic_slides(count, scale):
+    rng = np.random.default_rng(0)
+    slides = []
+    w, h = int(1280 * scale), int(720 * scale)
+    for n in range(count):
+        top, bottom = rng.integers(150, 255, 3), rng.integers(100, 255, 3)
+        ramp = np.linspace(0, 1, h)[:, None, None]
+        img = (top * (1 - ramp) + bottom * ramp).astype(np.uint8).repeat(w, axis=1)
+        for i in range(40):
+            x, y = int(rng.integers(20, w - 600)), int(rng.integers(40, h - 20))
+            size = float(rng.uniform(0.6, 2.0)) * scale / 2
+            cv2.putText(img, f"Label {n}-{i} text", (x, y), cv2.FONT_HERSHEY_SIMPLEX, size, (20, 20, 20), max(1, int(2 * size)))
+        slides.append((f"synthetic_{n}", img))
+    return slides
+
+def load_slides(folder):
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+    slides = []
+    for path in paths:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            slides.append((os.path.basename(path), img))
+    return slides
+
+def psnr(a, b, region=None):
+    diff = (a.astype(np.float32) - b.astype(np.float32)) ** 2
+    if region is not None:
+        if not region.any():
+            return float("inf")
+        diff = diff[region]
+    mse = float(diff.mean())
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+MODES = {
+    "full": lambda args: InpaintOptions(mode="full"),
+    "roi": lambda args: InpaintOptions(mode="roi", adaptive=False),
+    "adaptive": lambda args: InpaintOptions(mode="roi", adaptive=True),
+    "pyramid": lambda args: InpaintOptions(mode="roi", adaptive=False, pyramid_mp=args.pyramid_mp),
+}
+
+def seam_region(mask, width=4):
+    kernel = np.ones((2 * width + 1, 2 * width + 1), np.uint8)
+    return (cv2.dilate(mask, kernel) > 0) & (cv2.erode(mask, kernel) == 0)
+
+def run_mode(mode, img, mask, repeat, args):
+    processor = ImageProcessor(inpaint_options=MODES[mode](args))
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = processor.inpaint(img, mask)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", nargs="?")
+    parser.add_argument("--modes", default="full,roi,adaptive,pyramid")
+    parser.add_argument("--mask", default="rect", choices=["rect", "glyph"])
+    parser.add_argument("--pyramid-mp", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=3.0, help="synthetic slide scale (1 = 1280x720)")
+    args = parser.parse_args()
+
+    slides = load_slides(args.folder) if args.folder else synthetic_slides(args.synthetic, args.scale)
+    if not slides:
+        print(f"No images found in {args.folder}")
+        return
+
+    modes = args.modes.split(",")
+    detector = ImageProcessor(inpaint_options=InpaintOptions(mask_mode=args.mask))
+    totals = {mode: {"time": 0.0, "psnr": [], "outside": [], "seam": [], "max_diff": 0} for mode in modes}
+    for name, img in slides:
+        mask = detector.build_mask(img, detector.detect_text_regions(img))
+        outside, seam = mask == 0, seam_region(mask)
+        reference = None
+        for mode in modes:
+            elapsed, result = run_mode(mode, img, mask, args.repeat, args)
+            if reference is None:
+                reference = run_mode("full", img, mask, 1, args)[1] if mode != "full" else result
+            t = totals[mode]
+            t["time"] += elapsed
+            t["psnr"].append(psnr(result, reference))
+            t["outside"].append(psnr(result, reference, outside))
+            t["seam"].append(psnr(result, reference, seam))
+            t["max_diff"] = max(t["max_diff"], int(np.abs(result.astype(np.int16) - reference.astype(np.int16)).max()))
+        print(f"{name}: {img.shape[1]}x{img.shape[0]}, masked {mask.astype(bool).mean() * 100:.1f}%")
+
+    n = len(slides)
+    print(f"\n{n} slides, median of {args.repeat} runs")
+    print("PSNR columns are the worst slide, in dB against the full-frame output")
+    print(f"{'mode':>8} | {'ms/slide':>9} | {'speedup':>7} | {'PSNR':>7} | {'outside':>7} | {'seam':>7} | {'max diff':>8}")
+    base = totals[modes[0]]["time"]
+    for mode in modes:
+        t = totals[mode]
+        print(f"{mode:>8} | {t['time'] / n * 1000:>9.1f} | {base / t['time']:>6.2f}x | {min(t['psnr']):>7.2f} | "
+              f"{min(t['outside']):>7.2f} | {min(t['seam']):>7.2f} | {t['max_diff']:>8}")
+
+if __name__ == "__main__":
+    main()
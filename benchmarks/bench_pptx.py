@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+PPTX writer benchmark: PPTXGenerator (python-pptx object model) vs. FastPPTXWriter (direct XML, streamed zip),
+and FastPPTXWriter merging per-slide decks (the batch export path, per-slide decks built beforehand as the slide tasks do).
+
+Usage:
+    python benchmarks/bench_pptx.py [--slides 10,100,500] [--boxes 60] [--backgrounds 20] [--scale 1]
+
+Each (writer, deck size) runs in a fresh subprocess so peak RSS is not shared between runs.
+Synthetic slides: dense infographic-like layouts (--boxes text blocks per slide) over --backgrounds
+distinct PNG backgrounds reused round-robin. Reports wall time, peak RSS growth and output size,
+and checks that all writers produce identical slide XML for the first deck size.
+"""
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import resource
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WRITERS = ("python-pptx", "fast", "merge")
+
+def make_backgrounds(folder, count, scale):
+    rng = np.random.default_rng(0)
+    w, h = int(1280 * scale), int(720 * scale)
+    paths = []
+    for i in range(count):
+        img = np.empty((h, w, 3), np.uint8)
+        img[:] = rng.integers(0, 255, 3)
+        for _ in range(8):
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            x, y = int(rng.integers(0, w - 100)), int(rng.integers(0, h - 100))
+            cv2.rectangle(img, (x, y), (x + int(rng.integers(50, 400)), y + int(rng.integers(50, 300))), color, -1)
+        path = os.path.join(folder, f"bg_{i}.png")
+        cv2.imwrite(path, img)
+        paths.append(path)
+    return paths, w, h
+
+def make_layout(rng, boxes, w, h):
+    layout = []
+    for i in range(boxes):
+        bw, bh = int(rng.integers(60, 400)), int(rng.integers(14, 60))
+        layout.append({
+            "text": f"Label {i}\nsecond line" if i % 5 == 0 else f"Text block {i} with some words",
+            "bbox_px": [int(rng.integers(0, w - bw)), int(rng.integers(0, h - bh)), bw, bh],
+            "normalized_font_size_px": float(rng.uniform(10, 40)),
+            "style": {"color": "#%06x" % int(rng.integers(0, 0xFFFFFF)),
+                      "font_weight": "bold" if i % 3 == 0 else "normal",
+                      "align": ("left", "center", "right")[i % 3]},
+        })
+    return layout
+
+def child(writer, slides, boxes, backgrounds, w, h, output):
+    """Runs inside the subprocess: builds one deck and prints a JSON result line."""
+    from src.pptx_generator import PPTXGenerator
+    from src.pptx_writer import FastPPTXWriter
+    rng = np.random.default_rng(1)
+    layouts = [make_layout(rng, boxes, w, h) for _ in range(min(slides, 20))]
+    singles = []
+    if writer == "merge":
+        for i in range(slides):
+            single = PPTXGenerator()
+            single.add_slide(layouts[i % len(layouts)], backgrounds[i % len(backgrounds)], w, h, font_family="Malgun Gothic")
+            singles.append(f"{output}.{i}.pptx")
+            single.save(singles[-1])
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    gen = PPTXGenerator() if writer == "python-pptx" else FastPPTXWriter(output)
+    if writer == "merge":
+        for path in singles:
+            gen.add_slides_from_pptx(path)
+    else:
+        for i in range(slides):
+            gen.add_slide(layouts[i % len(layouts)], backgrounds[i % len(backgrounds)], w, h, font_family="Malgun Gothic")
+    gen.save(output)
+    elapsed = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    for path in singles:
+        os.remove(path)
+    print(json.dumps({"seconds": elapsed, "peak_mb": (peak_rss - base_rss) * unit / 2 ** 20,
+                      "size_mb": os.path.getsize(output) / 2 ** 20}))
+
+def same_slides(a, b):
+    from lxml import etree
+    with zipfile.ZipFile(a) as za, zipfile.ZipFile(b) as zb:
+        names = [n for n in za.namelist() if n.startswith("ppt/slides/")]
+        if sorted(names) != sorted(n for n in zb.namelist() if n.startswith("ppt/slides/")):
+            return False
+        canon = lambda data: etree.tostring(etree.fromstring(data), method="c14n")
+        return all(canon(za.read(n)) == canon(zb.read(n)) for n in names)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slides", default="10,100,500")
+    parser.add_argument("--boxes", type=int, default=60)
+    parser.add_argument("--backgrounds", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=1.0, help="background scale (1 = 1280x720)")
+    parser.add_argument("--child", nargs=4, metavar=("WRITER", "SLIDES", "FOLDER", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        writer, slides, folder, output = args.child
+        with open(os.path.join(folder, "meta.json")) as f:
+            meta = json.load(f)
+        child(writer, int(slides), args.boxes, meta["backgrounds"], meta["width"], meta["height"], output)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        backgrounds, w, h = make_backgrounds(folder, args.backgrounds, args.scale)
+        with open(os.path.join(folder, "meta.json"), "w") as f:
+            json.dump({"backgrounds": backgrounds, "width": w, "height": h}, f)
+
+        print(f"{args.boxes} text boxes/slide, {args.backgrounds} distinct {w}x{h} backgrounds")
+        print(f"{'slides':>6} | {'writer':>11} | {'seconds':>8} | {'peak MB':>8} | {'file MB':>8} | {'speedup':>7}")
+        checked = False
+        for slides in [int(n) for n in args.slides.split(",")]:
+            results, outputs = {}, {}
+            for writer in WRITERS:
+                outputs[writer] = os.path.join(folder, f"{writer}_{slides}.pptx")
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--boxes", str(args.boxes),
+                                       "--child", writer, str(slides), folder, outputs[writer]],
+                                      capture_output=True, text=True, check=True, cwd=ROOT)
+                results[writer] = json.loads(proc.stdout.strip().splitlines()[-1])
+            base = results["python-pptx"]["seconds"]
+            for writer in WRITERS:
+                r = results[writer]
+                print(f"{slides:>6} | {writer:>11} | {r['seconds']:>8.2f} | {r['peak_mb']:>8.1f} | {r['size_mb']:>8.1f} | {base / r['seconds']:>6.1f}x")
+            if not checked:
+                identical = all(same_slides(outputs["python-pptx"], outputs[writer]) for writer in WRITERS[1:])
+                print(f"       slide XML identical: {identical}")
+                checked = True
+            for path in outputs.values():
+                os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Resolution-aware preprocessing benchmark: upload bytes / latency vs. bbox accuracy.
+
+Usage:
+    python benchmarks/bench_preprocess.py <slide_folder> [--model gemini-3-flash-preview]
+        [--long-edges 2048,1536,1024,768] [--formats jpeg,webp] [--quality 90] [--offline]
+
+For each slide the full-resolution original is analyzed first (baseline), then every
+long-edge/format variant. Bounding boxes are matched greedily to the baseline by IoU.
+--offline only reports bytes and preprocessing time (no API calls).
+"""
+import os
+import sys
+import time
+import glob
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.analyzer import Analyzer
+from src.image_upload import PreprocessOptions, read_prepared_image
+
+def iou(a, b):
+    """IoU of two [x, y, w, h] pixel boxes (convert_to_pixels' bbox_px)."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+def match_boxes(baseline, candidate):
+    """Greedy IoU matching; returns (mean IoU of matched boxes, recall at IoU >= 0.5)."""
+    baseline = [item for item in baseline if item.get("bbox_px")]
+    candidate = [item for item in candidate if item.get("bbox_px")]
+    pairs = sorted(((iou(b["bbox_px"], c["bbox_px"]), i, j) for i, b in enumerate(baseline) for j, c in enumerate(candidate)),
+                   reverse=True)
+    used_b, used_c, scores = set(), set(), []
+    for score, i, j in pairs:
+        if score <= 0 or i in used_b or j in used_c:
+            continue
+        used_b.add(i)
+        used_c.add(j)
+        scores.append(score)
+    if not baseline:
+        return 1.0, 1.0
+    mean_iou = sum(scores) / len(baseline)
+    recall = sum(1 for s in scores if s >= 0.5) / len(baseline)
+    return mean_iou, recall
+
+async def analyze(analyzer, path, options):
+    started = time.perf_counter()
+    prepared = await asyncio.to_thread(read_prepared_image, path, options)
+    prep_time = time.perf_counter() - started
+    size = prepared.size_bytes
+    if analyzer is None:
+        return size, prep_time, None, None
+    started = time.perf_counter()
+    try:
+        layout, w, h = await analyzer.detect_initial_layout_async(prepared, use_cache=False)
+    finally:
+        await analyzer.release_image_async(prepared)
+    latency = time.perf_counter() - started
+    return size, prep_time, latency, analyzer.convert_to_pixels(layout, w, h)
+
+async def run(analyzer, paths, variants):
+    """All variants in one event loop: the Analyzer's aio client and limiters are bound to the loop they first run on."""
+    totals = {name: {"bytes": 0, "prep": 0.0, "latency": 0.0, "iou": 0.0, "recall": 0.0} for name, _ in variants}
+    for path in paths:
+        baseline = None
+        for name, options in variants:
+            size, prep_time, latency, blocks = await analyze(analyzer, path, options)
+            t = totals[name]
+            t["bytes"] += size
+            t["prep"] += prep_time
+            if analyzer is not None:
+                t["latency"] += latency
+                if options is None:
+                    baseline = blocks
+                mean_iou, recall = match_boxes(baseline, blocks)
+                t["iou"] += mean_iou
+                t["recall"] += recall
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder")
+    parser.add_argument("--model", default="gemini-3-flash-preview")
+    parser.add_argument("--long-edges", default="2048,1536,1024,768")
+    parser.add_argument("--formats", default="jpeg,webp")
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--offline", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv()
+    paths = sorted(glob.glob(os.path.join(args.folder, "*.png")) + glob.glob(os.path.join(args.folder, "*.jpg")))
+    if not paths:
+        print(f"No images found in {args.folder}")
+        return
+
+    variants = [("original", None)]
+    for fmt in args.formats.split(","):
+        for edge in [int(e) for e in args.long_edges.split(",")]:
+            variants.append((f"{fmt}@{edge}", PreprocessOptions(True, edge, fmt, args.quality)))
+
+    analyzer = None if args.offline else Analyzer(model_name=args.model)
+    totals = asyncio.run(run(analyzer, paths, variants))
+
+    n = len(paths)
+    print(f"{n} slides, model {args.model if analyzer else '(offline)'}")
+    print(f"{'variant':>12} | {'avg KB':>8} | {'prep(ms)':>8} | {'latency(s)':>10} | {'mean IoU':>8} | {'recall@.5':>9}")
+    for name, _ in variants:
+        t = totals[name]
+        line = f"{name:>12} | {t['bytes'] / n / 1024:>8.1f} | {t['prep'] / n * 1000:>8.1f}"
+        if analyzer is not None:
+            line += f" | {t['latency'] / n:>10.2f} | {t['iou'] / n:>8.3f} | {t['recall'] / n:>9.3f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
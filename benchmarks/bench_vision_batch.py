@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark: single-slide vs. batched Gemini layout detection.
+
+Usage:
+    python benchmarks/bench_vision_batch.py <slide_folder> [--model gemini-3-flash-preview] [--batch-sizes 1,2,4,8] [--hedge]
+
+Every slide in the folder is analyzed once per batch size (layout cache bypassed).
+Reports wall time, slides/sec, number of Gemini requests and median latency per request
+(measured around Analyzer._generate_json_async, so hedged requests are timed end to end).
+"""
+import os
+import sys
+import time
+import glob
+import asyncio
+import argparse
+import statistics
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.analyzer import Analyzer
+from src.batching import LayoutBatcher
+from src.hedging import Hedger
+
+def time_requests(analyzer):
+    """Wraps the analyzer's Gemini call (hedging included, if enabled) to record per-request latency."""
+    latencies = []
+    generate = analyzer._generate_json_async
+
+    async def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await generate(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    analyzer._generate_json_async = timed
+    return latencies
+
+async def run_once(analyzer, latencies, paths, batch_size):
+    batcher = LayoutBatcher(batch_size=batch_size, max_wait_ms=200)
+    latencies.clear()
+    started = time.perf_counter()
+    results = await asyncio.gather(*[batcher.detect(analyzer, p, use_cache=False) for p in paths])
+    elapsed = time.perf_counter() - started
+    blocks = sum(len(layout) for layout, _, _ in results)
+    p50 = statistics.median(latencies) if latencies else None
+    return elapsed, len(latencies), p50, blocks
+
+async def run(analyzer, paths, batch_sizes):
+    """Every batch size in one event loop: the Analyzer's aio client is bound to the loop it first runs on."""
+    latencies = time_requests(analyzer)
+    return [(batch_size, *await run_once(analyzer, latencies, paths, batch_size)) for batch_size in batch_sizes]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder")
+    parser.add_argument("--model", default="gemini-3-flash-preview")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--hedge", action="store_true", help="enable hedged requests (as hedging.enabled in settings)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    paths = sorted(glob.glob(os.path.join(args.folder, "*.png")) + glob.glob(os.path.join(args.folder, "*.jpg")))
+    if not paths:
+        print(f"No images found in {args.folder}")
+        return
+
+    hedger = Hedger(enabled=args.hedge)
+    analyzer = Analyzer(model_name=args.model, hedger=hedger)
+    results = asyncio.run(run(analyzer, paths, [int(b) for b in args.batch_sizes.split(",")]))
+    print(f"{len(paths)} slides, model {args.model}, hedging {'on' if args.hedge else 'off'}")
+    print(f"{'batch':>5} | {'wall(s)':>8} | {'slides/s':>8} | {'requests':>8} | {'p50 req(s)':>10} | {'blocks':>6}")
+    for batch_size, elapsed, requests, p50, blocks in results:
+        print(f"{batch_size:>5} | {elapsed:>8.2f} | {len(paths) / elapsed:>8.2f} | {requests:>8} | {p50 or 0:>10.2f} | {blocks:>6}")
+    stats = hedger.stats()
+    print(f"hedged requests: {stats['hedges']} of {stats['calls']} ({stats['hedge_wins']} won)")
+
+if __name__ == "__main__":
+    main()
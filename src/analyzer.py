@@ -1,29 +1,51 @@
 import os
 import json
+import asyncio
+import threading
+import time
 from PIL import Image
 from google import genai
 from google.genai import types
+from src.concurrency import is_throttle_error
+from src.image_handle import ImageHandle
+from src.image_upload import PreparedImage, InlineImageBackend, read_prepared_image, create_image_backend
+from src.layout_format import COMPACT_LAYOUT_SCHEMA, expand_compact_layout, compact_layout, parse_json_tolerant
+from src.resilience import (
+    classify_error, TransientGeminiError, ResponseParseError, CircuitOpenError
+)
 from src.utils import get_logger
 
 logger = get_logger(__name__)
 
-class Analyzer:
-    def __init__(self, model_name='gemini-3-flash-preview'):
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable is not set")
-        self.client = genai.Client(api_key=api_key)
-        self.model_name = model_name
+# Bump these whenever the corresponding prompt changes so stale cache entries are ignored
+DETECT_PROMPT_VERSION = "detect-v1"
+REFINE_PROMPT_VERSION = "refine-v1"
+BATCH_DETECT_PROMPT_VERSION = "detect-batch-v1"
+COMPACT_DETECT_PROMPT_VERSION = "detect-compact-v1"
+COMPACT_REFINE_PROMPT_VERSION = "refine-compact-v1"
 
-    def refine_layout(self, image_path, initial_layout_data):
-        logger.info(f"Refining layout with visual feedback loop using {self.model_name}...")
-        try:
-            pil_image = Image.open(image_path)
-            
-            # Convert JSON to string for prompt
-            layout_str = json.dumps(initial_layout_data, ensure_ascii=False)
-            
-            prompt_text = f"""
+DETECT_PROMPT = """
+        Analyze this slide layout for pixel-perfect HTML reconstruction.
+        
+        1. **Text Blocks**: Identify every text element.
+        2. **Geometry**: The bounding box must tightly enclose the text.
+        3. **Content**: Preserve line breaks (\\n) exactly as they appear visually.
+        
+        Return JSON list:
+        [
+            {
+                "text": "Content string with \\n",
+                "bbox": [ymin, xmin, ymax, xmax] (Normalized 0-1000),
+                "style": {
+                    "color": "#HEX",
+                    "font_weight": "bold/normal",
+                    "align": "left/center/right"
+                }
+            }
+        ]
+        """
+
+REFINE_PROMPT_TEMPLATE = """
             You are a Design QA Expert. Perform a visual quality check on the provided Layout Data against the Original Image.
             
             **Input Data**:
@@ -38,53 +60,359 @@ class Analyzer:
             4. **Strict Format**: Return ONLY the corrected JSON list. Do not explain.
             """
 
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=[prompt_text, pil_image],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
+# Compact mode: positional rows constrained by COMPACT_LAYOUT_SCHEMA (far fewer output tokens
+# than nested dicts), expanded locally into the regular {text, bbox, style} format.
+COMPACT_DETECT_PROMPT = """
+        Analyze this slide layout for pixel-perfect HTML reconstruction.
+        
+        1. **Text Blocks**: Identify every text element.
+        2. **Geometry**: The bounding box must tightly enclose the text.
+        3. **Content**: Preserve line breaks (\\n) exactly as they appear visually.
+        
+        Return a JSON list with ONE ROW PER TEXT BLOCK, each row exactly:
+        [ymin, xmin, ymax, xmax, "#HEX color", "b" or "n" (bold/normal), "l", "c" or "r" (align), "text with \\n"]
+        Coordinates are integers normalized 0-1000.
+        """
+
+COMPACT_REFINE_PROMPT_TEMPLATE = """
+            You are a Design QA Expert. Perform a visual quality check on the provided Layout Data against the Original Image.
             
-            refined_data = json.loads(response.text.strip())
+            **Input Data** (one row per text block: [ymin, xmin, ymax, xmax, color, weight, align, text], normalized 0-1000):
+            {layout_str}
             
-            # --- Logging Improvements ---
-            changes_count = 0
-            details = []
+            **Goal**: Improve the accuracy of text bounding boxes and visual hierarchy.
             
-            # Simple matching by index assuming order is preserved or similar
-            # Ideally we should match by content overlap, but for now index/text similarity
-            for i, refined_item in enumerate(refined_data):
-                if i < len(initial_layout_data):
-                    init_item = initial_layout_data[i]
-                    
-                    # Check text change
-                    if refined_item.get('text') != init_item.get('text'):
+            **Instructions**:
+            1. **Compare**: Look at the image and the provided bounding boxes.
+            2. **Fix Position**: If a box is slightly off, too large, or cuts off text, adjust the coordinates.
+            3. **Fix Content**: If the text has typos compared to the image, correct them.
+            4. **Strict Format**: Return ONLY the corrected rows in the same 8-item row format. Do not explain.
+            """
+
+def create_client():
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable is not set")
+    return genai.Client(api_key=api_key)
+
+BATCH_DETECT_PROMPT = """
+        Analyze each of the following {count} slide images for pixel-perfect HTML reconstruction.
+        Every image is preceded by its label "Slide <index>:" (indices 0 to {last_index}).
+        
+        For EVERY slide:
+        1. **Text Blocks**: Identify every text element.
+        2. **Geometry**: The bounding box must tightly enclose the text.
+        3. **Content**: Preserve line breaks (\\n) exactly as they appear visually.
+        
+        Return ONE JSON object keyed by slide index (as a string). Each value is that slide's list:
+        {{
+            "0": [
+                {{
+                    "text": "Content string with \\n",
+                    "bbox": [ymin, xmin, ymax, xmax] (Normalized 0-1000, relative to that slide),
+                    "style": {{
+                        "color": "#HEX",
+                        "font_weight": "bold/normal",
+                        "align": "left/center/right"
+                    }}
+                }}
+            ],
+            "1": [ ... ]
+        }}
+        Include every index; use [] for a slide without text.
+        """
+
+class Analyzer:
+    def __init__(self, model_name='gemini-3-flash-preview', cache=None, client=None, limiter=None, resilience=None, hedger=None, image_backend=None, preprocess=None, compact_output=False, tiler=None, local_refine=None):
+        # A shared client can be injected so several model-bound analyzers reuse one HTTP connection pool
+        self.client = client or create_client()
+        self.model_name = model_name
+        self.cache = cache
+        # Optional AdaptiveLimiter gating async Gemini calls (fed with latency/429 feedback)
+        self.limiter = limiter
+        # Optional ResilientCaller (retry/backoff/circuit breaker) shared across analyzers
+        self.resilience = resilience
+        # Optional Hedger firing a duplicate request when a call runs past the recent latency percentile
+        self.hedger = hedger
+        # How prepared images are handed to Gemini (inline bytes / Files API / local stand-in)
+        self.image_backend = image_backend or InlineImageBackend()
+        # Optional PreprocessOptions (downscale + re-encode the analysis input only)
+        self.preprocess = preprocess
+        # Schema-constrained compact rows instead of verbose dicts for detect/refine
+        self.compact_output = compact_output
+        # Optional LayoutTiler: overlapping-tile detection for tall/very large images
+        self.tiler = tiler
+        # Optional BBoxSnapper: local CPU bbox tightening used instead of the Gemini refine pass
+        self.local_refine = local_refine
+
+    def _cache_key(self, image_path, prompt_version, refined, input_layout=None):
+        if not self.cache or not self.cache.enabled:
+            return None
+        try:
+            image_hash = self.cache.hash_file(image_path)
+        except OSError as e:
+            logger.warning(f"Layout cache disabled for {image_path}: {e}")
+            return None
+        return self._cache_key_for_hash(image_hash, prompt_version, refined, input_layout)
+
+    def _cache_key_for_hash(self, image_hash, prompt_version, refined, input_layout=None):
+        """input_layout: the layout a refine starts from (refining a different layout is a different result)."""
+        if not self.cache or not self.cache.enabled:
+            return None
+        input_hash = self.cache.hash_layout(input_layout) if input_layout is not None else None
+        return self.cache.make_key(image_hash, self.model_name, prompt_version, refined, input_hash)
+
+    def _json_config(self, schema=None):
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=schema
+        )
+
+    def _detect_prompt(self):
+        """Returns (prompt, prompt_version, response_schema) for the configured output format."""
+        if self.compact_output:
+            return COMPACT_DETECT_PROMPT, COMPACT_DETECT_PROMPT_VERSION, COMPACT_LAYOUT_SCHEMA
+        return DETECT_PROMPT, DETECT_PROMPT_VERSION, None
+
+    def _refine_prompt(self, initial_layout_data):
+        """Returns (prompt, prompt_version, response_schema) for the configured output format."""
+        if self.compact_output:
+            layout_str = json.dumps(compact_layout(initial_layout_data), ensure_ascii=False)
+            return COMPACT_REFINE_PROMPT_TEMPLATE.format(layout_str=layout_str), COMPACT_REFINE_PROMPT_VERSION, COMPACT_LAYOUT_SCHEMA
+        layout_str = json.dumps(initial_layout_data, ensure_ascii=False)
+        return REFINE_PROMPT_TEMPLATE.format(layout_str=layout_str), REFINE_PROMPT_VERSION, None
+
+    def _expand_layout(self, data):
+        return expand_compact_layout(data) if self.compact_output else data
+
+    async def prepare_image_async(self, image):
+        """
+        Reads the slide once per task. The returned PreparedImage is passed to both detect and refine,
+        so the bytes are hashed, encoded (and, with the Files API backend, uploaded) only once.
+        `image` may be a path or the task's ImageHandle (its bytes are reused, not re-read).
+        Release it with release_image_async when the task ends.
+        """
+        return await asyncio.to_thread(read_prepared_image, image, self.preprocess)
+
+    async def release_image_async(self, prepared):
+        if prepared is not None:
+            await self.image_backend.release(prepared)
+
+    async def _resolve_image(self, image):
+        """Accepts a path or a PreparedImage. Returns (prepared, owned) - owned images are released by the callee."""
+        if isinstance(image, PreparedImage):
+            return image, False
+        return await self.prepare_image_async(image), True
+
+    def _request_timeout(self):
+        return self.resilience.policy.timeout if self.resilience else None
+
+    async def _generate_async(self, contents, config):
+        def request():
+            coro = self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=contents,
+                config=config
+            )
+            timeout = self._request_timeout()
+            return asyncio.wait_for(coro, timeout) if timeout else coro
+
+        if self.limiter is None:
+            return await request()
+
+        async with self.limiter:
+            started = time.monotonic()
+            try:
+                response = await request()
+            except Exception as e:
+                if is_throttle_error(e):
+                    self.limiter.record_throttle(f"{self.model_name}: {str(e)[:80]}")
+                raise
+            self.limiter.record_success(time.monotonic() - started)
+            return response
+
+    def _parse_json_response(self, response, expect=list):
+        try:
+            data, salvaged = parse_json_tolerant(response.text)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ResponseParseError(f"Gemini 응답 JSON 파싱 실패 ({self.model_name}): {e}", self.model_name, e)
+        if salvaged:
+            # Truncated/wrapped output: keep the complete elements instead of failing the slide
+            logger.warning(f"Recovered partial JSON response from {self.model_name} ({len(data)} top-level items kept)")
+            if self.resilience is not None:
+                self.resilience.record_salvage()
+        if not isinstance(data, expect):
+            raise ResponseParseError(f"Gemini 응답 JSON 형식 오류: {expect.__name__} 필요 ({self.model_name})", self.model_name)
+        return data
+
+    async def _generate_json_async(self, contents, expect=list, schema=None, images=1):
+        """
+        One Gemini JSON round-trip (request + parse) with retry/backoff/circuit breaker if configured.
+        images: slides in the request (hedging tracks batch latencies separately from single calls).
+        """
+        config = self._json_config(schema)
+
+        async def attempt():
+            response = await self._generate_async(contents, config)
+            return self._parse_json_response(response, expect)
+
+        run_attempt = attempt
+        if self.hedger is not None:
+            async def run_attempt():
+                return await self.hedger.run(self.hedger.latency_key(self.model_name, images), attempt)
+
+        if self.resilience is not None:
+            return await self.resilience.call_async(self.model_name, run_attempt)
+        try:
+            return await run_attempt()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise classify_error(e, self.model_name) from e
+
+    def _generate_json(self, contents, schema=None):
+        """Blocking counterpart of _generate_json_async."""
+        config = self._json_config(schema)
+
+        def attempt():
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                contents=contents,
+                config=config
+            )
+            return self._parse_json_response(response)
+
+        if self.resilience is not None:
+            return self.resilience.call(self.model_name, attempt)
+        try:
+            return attempt()
+        except Exception as e:
+            raise classify_error(e, self.model_name) from e
+
+    def _refine_fallback(self, e, initial_layout_data):
+        # Transient/parse/circuit failures degrade to the unrefined layout (counted in metrics);
+        # configuration errors (model not found, invalid key) propagate to the task runner.
+        logger.warning(f"Refinement failed ({type(e).__name__}), returning initial data: {e}")
+        if self.resilience is not None:
+            self.resilience.record_fallback("refine")
+        return initial_layout_data
+
+    def _log_refine_changes(self, initial_layout_data, refined_data, label="Refined"):
+        changes_count = 0
+        details = []
+        
+        # Simple matching by index assuming order is preserved or similar
+        # Ideally we should match by content overlap, but for now index/text similarity
+        for i, refined_item in enumerate(refined_data):
+            if i < len(initial_layout_data):
+                init_item = initial_layout_data[i]
+                
+                # Check text change
+                if refined_item.get('text') != init_item.get('text'):
+                    changes_count += 1
+                    details.append(f"Text corrected: '{(init_item.get('text') or '')[:20]}...' -> '{(refined_item.get('text') or '')[:20]}...'")
+                
+                # Check bbox change (simple tolerance)
+                r_bbox = refined_item.get('bbox', [])
+                i_bbox = init_item.get('bbox', [])
+                if r_bbox and i_bbox and r_bbox != i_bbox:
+                     # Calculate shift magnitude
+                     diff = sum([abs(r - i) for r, i in zip(r_bbox, i_bbox)])
+                     if diff > 10: # Ignore negligible changes (normalized 0-1000)
                         changes_count += 1
-                        details.append(f"Text corrected: '{init_item.get('text')[:20]}...' -> '{refined_item.get('text')[:20]}...'")
-                    
-                    # Check bbox change (simple tolerance)
-                    r_bbox = refined_item.get('bbox', [])
-                    i_bbox = init_item.get('bbox', [])
-                    if r_bbox and i_bbox and r_bbox != i_bbox:
-                         # Calculate shift magnitude
-                         diff = sum([abs(r - i) for r, i in zip(r_bbox, i_bbox)])
-                         if diff > 10: # Ignore negligible changes (normalized 0-1000)
-                            changes_count += 1
-                            details.append(f"BBox adjusted: {i_bbox} -> {r_bbox} (Diff: {diff})")
-            
-            logger.info(f"Refined {len(refined_data)} text blocks. Total Corrections: {changes_count}")
-            if changes_count > 0:
-                for d in details[:5]: # Log top 5 changes
-                    logger.info(f"   - {d}")
-            if changes_count > 5:
-                logger.info(f"   - ... and {changes_count - 5} more changes.")
+                        details.append(f"BBox adjusted: {i_bbox} -> {r_bbox} (Diff: {diff})")
+        
+        logger.info(f"{label} {len(refined_data)} text blocks. Total Corrections: {changes_count}")
+        if changes_count > 0:
+            for d in details[:5]: # Log top 5 changes
+                logger.info(f"   - {d}")
+        if changes_count > 5:
+            logger.info(f"   - ... and {changes_count - 5} more changes.")
+
+    def refine_layout(self, image_path, initial_layout_data, use_cache=True):
+        prompt_text, prompt_version, schema = self._refine_prompt(initial_layout_data)
+        cache_key = self._cache_key(image_path, prompt_version, True, initial_layout_data) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Layout cache hit (refined): {image_path}")
+                return cached["layout"]
+
+        logger.info(f"Refining layout with visual feedback loop using {self.model_name}...")
+        try:
+            with Image.open(image_path) as pil_image:
+                # Prompt embeds the current layout (verbose JSON or compact rows)
+                refined_data = self._expand_layout(self._generate_json([prompt_text, pil_image], schema))
+            self._log_refine_changes(initial_layout_data, refined_data)
+
+            if cache_key:
+                self.cache.put(cache_key, {"layout": refined_data})
                 
             return refined_data
             
-        except Exception as e:
-            logger.warning(f"Refinement failed, returning initial data: {e}")
+        except (TransientGeminiError, ResponseParseError, CircuitOpenError) as e:
+            return self._refine_fallback(e, initial_layout_data)
+
+    async def refine_layout_async(self, image, initial_layout_data, use_cache=True):
+        """
+        Native asyncio variant of refine_layout (client.aio). The network wait does not
+        hold an executor thread, and cancelling the awaiting task aborts the request.
+        `image` may be a path or the PreparedImage already used for detection (no re-upload).
+        """
+        prepared, owned = await self._resolve_image(image)
+        try:
+            prompt_text, prompt_version, schema = self._refine_prompt(initial_layout_data)
+            cache_key = self._cache_key_for_hash(prepared.content_hash, prompt_version, True, initial_layout_data) if use_cache else None
+            if cache_key:
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+                if cached is not None:
+                    logger.info(f"Layout cache hit (refined): {prepared.source_path}")
+                    return cached["layout"]
+
+            logger.info(f"Refining layout with visual feedback loop using {self.model_name} (async)...")
+            try:
+                image_part = await self.image_backend.get_part(prepared)
+                refined_data = self._expand_layout(await self._generate_json_async([prompt_text, image_part], schema=schema))
+                self._log_refine_changes(initial_layout_data, refined_data)
+
+                if cache_key:
+                    await asyncio.to_thread(self.cache.put, cache_key, {"layout": refined_data})
+
+                return refined_data
+
+            except (TransientGeminiError, ResponseParseError, CircuitOpenError) as e:
+                return self._refine_fallback(e, initial_layout_data)
+        finally:
+            if owned:
+                await self.release_image_async(prepared)
+
+    async def refine_layout_local_async(self, image, initial_layout_data):
+        """
+        Local replacement for refine_layout_async: snaps every bbox to the ink pixels with OpenCV
+        (BBoxSnapper) in a worker thread, without a second Gemini round-trip. Text is not corrected.
+        Uses the full-resolution source file, not the (possibly downscaled) analysis input.
+        """
+        handle = image.handle if isinstance(image, PreparedImage) else image
+        started = time.monotonic()
+        try:
+            if isinstance(handle, ImageHandle):
+                # Grayscale view of the pixels the task already decoded
+                snapped = await asyncio.to_thread(lambda: self.local_refine.snap(handle.gray, initial_layout_data))
+            else:
+                image_path = image.source_path if isinstance(image, PreparedImage) else image
+                snapped = await asyncio.to_thread(self.local_refine.snap_file, image_path, initial_layout_data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Local bbox snapping failed, returning initial data: {e}")
             return initial_layout_data
+        logger.info(f"Local bbox snapping took {(time.monotonic() - started) * 1000:.0f}ms")
+        self._log_refine_changes(initial_layout_data, snapped, label="Snapped")
+        return snapped
+
+    async def apply_refine_async(self, image, initial_layout_data, use_cache=True):
+        """The configured refine stage: local bbox snapping if enabled, otherwise the Gemini refine pass."""
+        if self.local_refine is not None:
+            return await self.refine_layout_local_async(image, initial_layout_data)
+        return await self.refine_layout_async(image, initial_layout_data, use_cache)
 
     def convert_to_pixels(self, layout_data, width, height):
         for item in layout_data:
@@ -98,62 +426,157 @@ class Analyzer:
                 ]
         return layout_data
 
-    def detect_initial_layout(self, image_path):
+    def detect_initial_layout(self, image_path, use_cache=True):
+        prompt, prompt_version, schema = self._detect_prompt()
+        cache_key = self._cache_key(image_path, prompt_version, False) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Layout cache hit: {image_path} ({len(cached['layout'])} text blocks)")
+                return cached["layout"], cached["width"], cached["height"]
+
         logger.info(f"Detecting initial layout: {image_path}")
-        pil_image = Image.open(image_path)
-        width, height = pil_image.size
-        
-        prompt_text = """
-        Analyze this slide layout for pixel-perfect HTML reconstruction.
-        
-        1. **Text Blocks**: Identify every text element.
-        2. **Geometry**: The bounding box must tightly enclose the text.
-        3. **Content**: Preserve line breaks (\\n) exactly as they appear visually.
-        
-        Return JSON list:
-        [
-            {
-                "text": "Content string with \\n",
-                "bbox": [ymin, xmin, ymax, xmax] (Normalized 0-1000),
-                "style": {
-                    "color": "#HEX",
-                    "font_weight": "bold/normal",
-                    "align": "left/center/right"
-                }
-            }
-        ]
+        with Image.open(image_path) as pil_image:
+            width, height = pil_image.size
+            initial_layout_data = self._expand_layout(self._generate_json([prompt, pil_image], schema))
+        logger.info(f"Initial detection: {len(initial_layout_data)} text blocks.")
+        if cache_key:
+            self.cache.put(cache_key, {"layout": initial_layout_data, "width": width, "height": height})
+        return initial_layout_data, width, height
+
+    async def detect_initial_layout_async(self, image, use_cache=True):
+        """
+        Native asyncio variant of detect_initial_layout (client.aio).
+        Only the short file read/hash runs in a worker thread; the Gemini round-trip
+        is awaited on the event loop and is cancelled together with the awaiting task.
+        `image` may be a path or a PreparedImage shared with the refine pass.
+        Tall/very large images are routed to detect_tiled_layout_async when tiling is enabled.
         """
+        prepared, owned = await self._resolve_image(image)
+        try:
+            if self.should_tile(prepared):
+                return await self.detect_tiled_layout_async(prepared, use_cache=use_cache)
+            return await self._detect_prepared_async(prepared, use_cache)
+        finally:
+            if owned:
+                await self.release_image_async(prepared)
+
+    async def _detect_prepared_async(self, prepared, use_cache):
+        prompt, prompt_version, schema = self._detect_prompt()
+        cache_key = self._cache_key_for_hash(prepared.content_hash, prompt_version, False) if use_cache else None
+        if cache_key:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Layout cache hit: {prepared.source_path} ({len(cached['layout'])} text blocks)")
+                return cached["layout"], cached["width"], cached["height"]
+
+        logger.info(f"Detecting initial layout (async): {prepared.source_path}")
+        width, height = prepared.width, prepared.height
+        image_part = await self.image_backend.get_part(prepared)
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=[prompt_text, pil_image],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
-        except Exception as e:
-            error_msg = str(e)
-            # Model mismatch error capture (Google API error message pattern matching)
-            if "404" in error_msg or "Not Found" in error_msg or "Publisher Model" in error_msg:
-                logger.error(f"Model '{self.model_name}' not found.")
-                raise ValueError(f"오류: 설정된 모델 '{self.model_name}'을 찾을 수 없습니다. settings.json에서 모델명을 최신으로 변경해주세요.")
-            raise e
-        
-        initial_layout_data = json.loads(response.text.strip())
+            initial_layout_data = self._expand_layout(await self._generate_json_async([prompt, image_part], schema=schema))
+        except asyncio.CancelledError:
+            logger.info(f"Layout detection cancelled: {prepared.source_path}")
+            raise
         logger.info(f"Initial detection: {len(initial_layout_data)} text blocks.")
+        if cache_key:
+            await asyncio.to_thread(self.cache.put, cache_key, {"layout": initial_layout_data, "width": width, "height": height})
         return initial_layout_data, width, height
 
-    def analyze_image_v2(self, image_path, exclude_text=None):
+    def should_tile(self, image):
+        return isinstance(image, PreparedImage) and self.tiler is not None and self.tiler.should_tile(image.width, image.height)
+
+    async def detect_tiled_layout_async(self, prepared, use_cache=True):
+        """
+        Splits the full-resolution image into overlapping tiles, detects them concurrently
+        (each tile is a normal, individually cached detect call) and merges the remapped boxes.
+        """
+        tiles = await asyncio.to_thread(self.tiler.crop_tiles, prepared)
+        logger.info(f"Tiled detection: {prepared.source_path} ({prepared.width}x{prepared.height}) -> {len(tiles)} tiles")
+        try:
+            results = await asyncio.gather(*[self._detect_prepared_async(tile, use_cache) for _, tile in tiles])
+        finally:
+            for _, tile in tiles:
+                await self.release_image_async(tile)
+        tile_layouts = [(rect, layout) for (rect, _), (layout, _, _) in zip(tiles, results)]
+        merged = self.tiler.merge(tile_layouts, prepared.width, prepared.height)
+        return merged, prepared.width, prepared.height
+
+    async def detect_batch_layout_async(self, images, use_cache=True):
+        """
+        Multi-slide variant of detect_initial_layout_async: sends all (uncached) slides in ONE request
+        and asks for a JSON object keyed by slide index. Slides missing from the answer, or the whole
+        batch on a parse failure, fall back to single-slide calls.
+        `images` are paths or PreparedImages. Returns a list of (layout, width, height) in input order.
+        """
+        resolved = [await self._resolve_image(image) for image in images]
+        prepared_list = [prepared for prepared, _ in resolved]
+        results = [None] * len(images)
+        cache_keys = [None] * len(images)
+
+        try:
+            pending = []
+            for i, prepared in enumerate(prepared_list):
+                if use_cache:
+                    cache_keys[i] = self._cache_key_for_hash(prepared.content_hash, BATCH_DETECT_PROMPT_VERSION, False)
+                cached = await asyncio.to_thread(self.cache.get, cache_keys[i]) if cache_keys[i] else None
+                if cached is not None:
+                    results[i] = (cached["layout"], cached["width"], cached["height"])
+                else:
+                    pending.append(i)
+
+            if len(pending) == 1:
+                i = pending[0]
+                results[i] = await self.detect_initial_layout_async(prepared_list[i], use_cache=use_cache)
+                return results
+
+            if pending:
+                logger.info(f"Detecting layout for {len(pending)} slides in one batched request ({self.model_name})")
+                contents = [BATCH_DETECT_PROMPT.format(count=len(pending), last_index=len(pending) - 1)]
+                for batch_index, i in enumerate(pending):
+                    image_part = await self.image_backend.get_part(prepared_list[i])
+                    contents.extend([f"Slide {batch_index}:", image_part])
+
+                try:
+                    batch_data = await self._generate_json_async(contents, expect=dict, images=len(pending))
+                except ResponseParseError as e:
+                    logger.warning(f"Batched detection unparsable, falling back to single-slide calls: {e}")
+                    batch_data = {}
+
+                for batch_index, i in enumerate(pending):
+                    layout = batch_data.get(str(batch_index))
+                    if not isinstance(layout, list):
+                        logger.warning(f"Batched detection missing slide {batch_index}; retrying single: {prepared_list[i].source_path}")
+                        continue
+                    width, height = prepared_list[i].width, prepared_list[i].height
+                    results[i] = (layout, width, height)
+                    if cache_keys[i]:
+                        await asyncio.to_thread(self.cache.put, cache_keys[i], {"layout": layout, "width": width, "height": height})
+
+                missing = [i for i in pending if results[i] is None]
+                if missing:
+                    singles = await asyncio.gather(*[self.detect_initial_layout_async(prepared_list[i], use_cache=use_cache) for i in missing])
+                    for i, result in zip(missing, singles):
+                        results[i] = result
+                logger.info(f"Batched detection: {len(pending) - len(missing)}/{len(pending)} slides from one request")
+
+            return results
+        finally:
+            for prepared, owned in resolved:
+                if owned:
+                    await self.release_image_async(prepared)
+
+    def analyze_image_v2(self, image_path, exclude_text=None, use_cache=True):
         """
         Legacy wrapper for full analysis pipeline (Forced Update V2)
         """
         try:
             # 1. Initial Detection
-            initial_data, width, height = self.detect_initial_layout(image_path)
+            initial_data, width, height = self.detect_initial_layout(image_path, use_cache=use_cache)
             
             # 2. Feedback Loop
-            refined_data = self.refine_layout(image_path, initial_data)
+            refined_data = self.refine_layout(image_path, initial_data, use_cache=use_cache)
             
             # 3. Pixel Conversion
             final_data = self.convert_to_pixels(refined_data, width, height)
@@ -213,6 +636,26 @@ class Analyzer:
         except Exception as e:
             logger.error(f"Analysis failed: {e}")
             raise e
+
+    async def analyze_image_v2_async(self, image_path, exclude_text=None, use_cache=True):
+        """
+        Async counterpart of analyze_image_v2 (detect -> refine -> pixels -> exclusion)
+        `image_path` may also be an ImageHandle owned by the caller.
+        """
+        prepared = None
+        try:
+            prepared = await self.prepare_image_async(image_path)
+            initial_data, width, height = await self.detect_initial_layout_async(prepared, use_cache=use_cache)
+            refined_data = await self.apply_refine_async(prepared, initial_data, use_cache=use_cache)
+            final_data = self.convert_to_pixels(refined_data, width, height)
+            final_data = self.apply_text_exclusion(final_data, exclude_text)
+            return final_data, width, height
+        except Exception as e:
+            logger.error(f"Analysis failed: {e}")
+            raise e
+        finally:
+            await self.release_image_async(prepared)
+
     def apply_text_exclusion(self, layout_data, exclude_text=None):
         # Always check for 'notebooklm' watermark by default
         default_exclusions = ['notebooklm']
@@ -258,3 +701,51 @@ class Analyzer:
             return filtered_data
         
         return layout_data
+
+
+class AnalyzerPool:
+    """
+    Model-bound Analyzer instances keyed by model name.
+    Analyzers are created lazily, reused across tasks and share a single genai client,
+    so concurrent tasks with different models never touch each other's model_name.
+    """
+    def __init__(self, cache=None, limiter=None, resilience=None, hedger=None, image_backend="inline", preprocess=None, compact_output=False, tiler=None, local_refine=None):
+        self.cache = cache
+        self.tiler = tiler
+        self.local_refine = local_refine
+        self.preprocess = preprocess
+        self.compact_output = compact_output
+        self.limiter = limiter
+        self.resilience = resilience
+        self.hedger = hedger
+        self.image_backend_name = image_backend
+        self.image_backend = None
+        self._client = None
+        self._analyzers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name):
+        with self._lock:
+            analyzer = self._analyzers.get(model_name)
+            if analyzer is None:
+                if self._client is None:
+                    self._client = create_client()
+                    self.image_backend = create_image_backend(self.image_backend_name, self._client)
+                analyzer = Analyzer(model_name=model_name, cache=self.cache, client=self._client, limiter=self.limiter,
+                                    resilience=self.resilience, hedger=self.hedger, image_backend=self.image_backend,
+                                    preprocess=self.preprocess, compact_output=self.compact_output, tiler=self.tiler,
+                                    local_refine=self.local_refine)
+                self._analyzers[model_name] = analyzer
+                logger.info(f"Analyzer created for model: {model_name} (pool size: {len(self._analyzers)})")
+            return analyzer
+
+    def reset(self):
+        """Drops every analyzer and the shared client (e.g. after the API key changed)."""
+        with self._lock:
+            self._client = create_client()
+            self.image_backend = create_image_backend(self.image_backend_name, self._client)
+            self._analyzers = {}
+
+    def models(self):
+        with self._lock:
+            return list(self._analyzers.keys())
@@ -0,0 +1,96 @@
+import asyncio
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class LayoutBatcher:
+    """
+    Collects concurrent detect requests from independent slide tasks and sends them to Gemini
+    as multi-slide batches (Analyzer.detect_batch_layout_async).
+    A batch is flushed when batch_size requests for the same model are queued or after max_wait_ms.
+    batch_size <= 1 disables batching (every request goes straight to detect_initial_layout_async).
+    """
+    def __init__(self, batch_size=1, max_wait_ms=300):
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queues = {}
+        self._timers = {}
+        self.batches_sent = 0
+        self.slides_batched = 0
+
+    @property
+    def enabled(self):
+        return self.batch_size > 1
+
+    async def detect(self, analyzer, image_path, use_cache=True):
+        # Tiled images need several requests of their own; never mix them into a batch
+        if not self.enabled or analyzer.should_tile(image_path):
+            return await analyzer.detect_initial_layout_async(image_path, use_cache=use_cache)
+
+        key = (analyzer.model_name, use_cache)
+        future = asyncio.get_running_loop().create_future()
+        entry = (image_path, future)
+        queue = self._queues.setdefault(key, [])
+        queue.append(entry)
+
+        if len(queue) >= self.batch_size:
+            self._flush(key, analyzer)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, key, analyzer)
+
+        # Shield: cancelling one task must not cancel the shared request for the other slides
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The caller releases its PreparedImage on the way out (inline bytes dropped, Files API
+            # upload deleted). Still queued: drop the entry so the batch never sends it. Already sent:
+            # hold the caller until the shared request is done with the image.
+            if not self._dequeue(key, entry):
+                await asyncio.wait([future])
+                if not future.cancelled():
+                    future.exception()  # retrieved: the other slides of the batch report it
+            raise
+
+    def _dequeue(self, key, entry):
+        queue = self._queues.get(key)
+        if not queue or entry not in queue:
+            return False
+        queue.remove(entry)
+        entry[1].cancel()
+        if not queue:
+            self._queues.pop(key, None)
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+        return True
+
+    def _flush(self, key, analyzer):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        queue = self._queues.pop(key, [])
+        if queue:
+            asyncio.ensure_future(self._run_batch(analyzer, queue, key[1]))
+
+    async def _run_batch(self, analyzer, queue, use_cache):
+        paths = [path for path, _ in queue]
+        self.batches_sent += 1
+        self.slides_batched += len(paths)
+        try:
+            results = await analyzer.detect_batch_layout_async(paths, use_cache=use_cache)
+        except Exception as e:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(queue, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "batches_sent": self.batches_sent,
+            "slides_batched": self.slides_batched,
+            "avg_batch": round(self.slides_batched / self.batches_sent, 2) if self.batches_sent else 0,
+        }
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class BBoxSnapper:
+    """
+    CPU-only alternative to the Gemini refine pass: tightens each detected bbox to the ink pixels
+    around it. Each box is searched in a padded ROI; ink is found with a morphological gradient and a
+    local Otsu threshold, and the connected components overlapping the original box define the new box.
+    Only geometry is adjusted (text is left as detected). Implausible results keep the original box.
+    """
+    def __init__(self, search_pad=0.25, min_pad_px=4, min_area_ratio=0.3, max_area_ratio=2.0):
+        self.search_pad = search_pad
+        self.min_pad_px = min_pad_px
+        self.min_area_ratio = min_area_ratio
+        self.max_area_ratio = max_area_ratio
+
+    @staticmethod
+    def load_gray(image_path):
+        # cv2 handles korean paths poorly, so we read as byte stream
+        data = np.fromfile(image_path, dtype=np.uint8)
+        img = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"Could not load image: {image_path}")
+        return img
+
+    def _snap_box(self, gray, box):
+        """box: pixel [x0, y0, x1, y1]. Returns the snapped pixel box or None."""
+        height, width = gray.shape
+        x0, y0, x1, y1 = box
+        pad = max(self.min_pad_px, int((y1 - y0) * self.search_pad))
+        rx0, ry0 = max(0, x0 - pad), max(0, y0 - pad)
+        rx1, ry1 = min(width, x1 + pad), min(height, y1 + pad)
+        if rx1 - rx0 < 3 or ry1 - ry0 < 3:
+            return None
+
+        roi = gray[ry0:ry1, rx0:rx1]
+        gradient = cv2.morphologyEx(roi, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        if int(gradient.max()) < 16:
+            return None # flat region, nothing to snap to
+        _, ink = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        # Original box in ROI coordinates
+        bx0, by0, bx1, by1 = x0 - rx0, y0 - ry0, x1 - rx0, y1 - ry0
+        keep = []
+        for i in range(1, count):
+            cx, cy, cw, ch, area = stats[i]
+            if area < 3:
+                continue
+            # Components that span the whole ROI are backgrounds/shapes, not glyphs
+            if cw >= roi.shape[1] - 1 and ch >= roi.shape[0] - 1:
+                continue
+            ix = min(cx + cw, bx1) - max(cx, bx0)
+            iy = min(cy + ch, by1) - max(cy, by0)
+            # Mostly inside the original box
+            if ix > 0 and iy > 0 and ix * iy >= 0.5 * cw * ch:
+                keep.append((cx, cy, cx + cw, cy + ch))
+        if not keep:
+            return None
+
+        nx0 = min(k[0] for k in keep) + rx0
+        ny0 = min(k[1] for k in keep) + ry0
+        nx1 = max(k[2] for k in keep) + rx0
+        ny1 = max(k[3] for k in keep) + ry0
+        old_area = max(1, (x1 - x0) * (y1 - y0))
+        ratio = (nx1 - nx0) * (ny1 - ny0) / old_area
+        if ratio < self.min_area_ratio or ratio > self.max_area_ratio:
+            return None
+        return [nx0, ny0, nx1, ny1]
+
+    def snap(self, gray, layout_data):
+        """Returns a new layout list with snapped normalized bboxes; input items are not modified."""
+        height, width = gray.shape
+        snapped = []
+        for item in layout_data:
+            new_item = dict(item)
+            bbox = item.get("bbox")
+            if isinstance(bbox, (list, tuple)) and len(bbox) == 4:
+                ymin, xmin, ymax, xmax = bbox
+                box = [int(xmin / 1000 * width), int(ymin / 1000 * height),
+                       int(np.ceil(xmax / 1000 * width)), int(np.ceil(ymax / 1000 * height))]
+                result = self._snap_box(gray, box) if box[2] > box[0] and box[3] > box[1] else None
+                if result is not None:
+                    nx0, ny0, nx1, ny1 = result
+                    new_item["bbox"] = [
+                        int(round(ny0 / height * 1000)),
+                        int(round(nx0 / width * 1000)),
+                        int(round(ny1 / height * 1000)),
+                        int(round(nx1 / width * 1000)),
+                    ]
+                    new_item.pop("bbox_px", None)
+            snapped.append(new_item)
+        return snapped
+
+    def snap_file(self, image_path, layout_data):
+        return self.snap(self.load_gray(image_path), layout_data)
@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import threading
+import cv2
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class BackgroundCodec:
+    """
+    One encoding of a cleaned background: png (zlib level + strategy), jpeg (quality) or webp
+    (quality, or lossless). The default (png, level 1) is what cv2.imencode(".png") writes.
+    """
+    EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+    MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+    PNG_STRATEGIES = {
+        "default": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+        "filtered": cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+        "huffman": cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+        "rle": cv2.IMWRITE_PNG_STRATEGY_RLE,
+    }
+
+    def __init__(self, format="png", quality=90, png_level=1, png_strategy="default", lossless=False):
+        self.format = format if format in self.EXTENSIONS else "png"
+        self.quality = quality
+        self.png_level = png_level
+        self.png_strategy = png_strategy if png_strategy in self.PNG_STRATEGIES else "default"
+        self.lossless = lossless
+
+    @classmethod
+    def from_settings(cls, conf):
+        conf = conf or {}
+        return cls(
+            format=conf.get("format", "png"),
+            quality=conf.get("quality", 90),
+            png_level=conf.get("png_level", 1),
+            png_strategy=conf.get("png_strategy", "default"),
+            lossless=conf.get("lossless", False)
+        )
+
+    @property
+    def extension(self):
+        return self.EXTENSIONS[self.format]
+
+    @property
+    def mime_type(self):
+        return self.MIME_TYPES[self.format]
+
+    def signature(self):
+        if self.format == "png":
+            return f"png:{self.png_level}:{self.png_strategy}"
+        if self.format == "webp" and self.lossless:
+            return "webp:lossless"
+        return f"{self.format}:{self.quality}"
+
+    def params(self):
+        if self.format == "png":
+            return [cv2.IMWRITE_PNG_COMPRESSION, int(self.png_level), cv2.IMWRITE_PNG_STRATEGY, self.PNG_STRATEGIES[self.png_strategy]]
+        if self.format == "jpeg":
+            return [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+        # OpenCV's WebP encoder switches to lossless above quality 100
+        return [cv2.IMWRITE_WEBP_QUALITY, 101 if self.lossless else int(self.quality)]
+
+    def encode(self, img):
+        success, encoded = cv2.imencode(self.extension, img, self.params())
+        if not success:
+            raise ValueError(f"Failed to encode background as {self.signature()}")
+        return encoded
+
+    def __repr__(self):
+        return f"BackgroundCodec({self.signature()})"
+
+class BackgroundEncoder:
+    """
+    Writes a cleaned background once per output target, each with its own codec:
+      file - the downloadable background (and what batch export falls back to)
+      html - the image referenced/embedded by the generated HTML
+      pptx - the picture embedded in the PPTX (python-pptx cannot embed WebP, so png is used instead)
+    Targets sharing a codec share one file. Distinct codecs are encoded concurrently in worker
+    threads (cv2.imencode releases the GIL), off the event loop.
+    """
+    TARGETS = ("file", "html", "pptx")
+
+    def __init__(self, codecs=None):
+        codecs = codecs or {}
+        self.codecs = {target: codecs.get(target) or BackgroundCodec() for target in self.TARGETS}
+        if self.codecs["pptx"].format == "webp":
+            logger.warning("PPTX cannot embed WebP backgrounds; using png for the pptx target")
+            self.codecs["pptx"] = BackgroundCodec()
+        self._lock = threading.Lock()
+        self.encode_stats = {}
+
+    @classmethod
+    def from_settings(cls, conf):
+        conf = conf or {}
+        return cls({target: BackgroundCodec.from_settings(conf.get(target)) for target in cls.TARGETS})
+
+    @property
+    def is_default(self):
+        """True when every target is the plain png the pipeline always wrote (one file, no re-encode needed)."""
+        return all(codec.signature() == BackgroundCodec().signature() for codec in self.codecs.values())
+
+    def target_paths(self, output_path):
+        """{target: path}. The file target keeps output_path's stem; each other codec gets a '.<target>' suffix."""
+        stem = os.path.splitext(output_path)[0]
+        by_signature = {}
+        paths = {}
+        for target, codec in self.codecs.items():
+            if codec.signature() not in by_signature:
+                suffix = "" if target == "file" else f".{target}"
+                by_signature[codec.signature()] = f"{stem}{suffix}{codec.extension}"
+            paths[target] = by_signature[codec.signature()]
+        return paths
+
+    def _write(self, codec, img, path):
+        started = time.perf_counter()
+        encoded = codec.encode(img)
+        elapsed = time.perf_counter() - started
+        # tofile: non-ASCII path support
+        encoded.tofile(path)
+        with self._lock:
+            entry = self.encode_stats.setdefault(codec.signature(), [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += encoded.size
+            entry[2] += elapsed
+        logger.info(f"Background encoded as {codec.signature()}: {encoded.size // 1024}KB in {elapsed * 1000:.0f}ms -> {path}")
+        return path
+
+    def _jobs(self, output_path):
+        paths = self.target_paths(output_path)
+        jobs = {}
+        for target, path in paths.items():
+            jobs.setdefault(path, self.codecs[target])
+        return paths, jobs
+
+    def save(self, img, output_path):
+        """Blocking variant of save_async (sequential). Returns {target: path}."""
+        paths, jobs = self._jobs(output_path)
+        for path, codec in jobs.items():
+            self._write(codec, img, path)
+        return paths
+
+    async def save_async(self, img, output_path):
+        """Encodes every distinct codec in parallel worker threads. Returns {target: path}."""
+        paths, jobs = self._jobs(output_path)
+        await asyncio.gather(*(asyncio.to_thread(self._write, codec, img, path) for path, codec in jobs.items()))
+        return paths
+
+    def stats(self):
+        with self._lock:
+            return {
+                "targets": {target: codec.signature() for target, codec in self.codecs.items()},
+                "encodes": {
+                    name: {"count": count, "bytes": size, "avg_ms": round(sec / count * 1000, 1)}
+                    for name, (count, size, sec) in self.encode_stats.items()
+                },
+            }
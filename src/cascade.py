@@ -0,0 +1,234 @@
+import time
+import asyncio
+import threading
+import cv2
+import numpy as np
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class LayoutScorer:
+    """
+    Cheap local sanity checks for a detected layout (normalized 0-1000 bboxes).
+    Combines bbox validity, duplicate/overlap rate and agreement with a pixel-level text estimate
+    (morphological gradient + Otsu, grouped into text-line-like components).
+    score is in [0, 1]; reasons lists the checks that failed.
+    """
+    def __init__(self, analysis_long_edge=800, min_validity=0.9, max_overlap=0.2, min_coverage=0.8, max_empty_boxes=0.3):
+        self.analysis_long_edge = analysis_long_edge
+        self.min_validity = min_validity
+        self.max_overlap = max_overlap
+        self.min_coverage = min_coverage
+        self.max_empty_boxes = max_empty_boxes
+
+    def estimate_text_mask(self, image_bytes):
+        """Binary mask (uint8 0/1) of pixels that look like text, at analysis resolution."""
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return None
+        h, w = img.shape[:2]
+        scale = min(1.0, self.analysis_long_edge / max(h, w))
+        if scale < 1.0:
+            img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        h, w = img.shape[:2]
+
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        gradient = cv2.morphologyEx(img, cv2.MORPH_GRADIENT, kernel)
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Join glyphs into words/lines
+        connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(connected, connectivity=8)
+        mask = np.zeros((h, w), np.uint8)
+        for i in range(1, count):
+            x, y, cw, ch, area = stats[i]
+            # Text lines: short, not tiny specks, not huge photo/graphic regions, reasonably filled
+            if ch < h * 0.004 or ch > h * 0.12 or cw < 3:
+                continue
+            if area < 0.2 * cw * ch:
+                continue
+            mask[labels == i] = 1
+        return mask
+
+    @staticmethod
+    def _valid_bbox(item):
+        bbox = item.get("bbox") if isinstance(item, dict) else None
+        if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+            return False
+        if not all(isinstance(v, (int, float)) for v in bbox):
+            return False
+        ymin, xmin, ymax, xmax = bbox
+        if ymin >= ymax or xmin >= xmax:
+            return False
+        return all(-5 <= v <= 1005 for v in bbox) and bool(str(item.get("text") or "").strip())
+
+    @staticmethod
+    def _overlap_ratio(boxes):
+        """Fraction of boxes mostly (>60% of the smaller one) covered by another box."""
+        overlapping = set()
+        for i in range(len(boxes)):
+            a = boxes[i]
+            area_a = (a[2] - a[0]) * (a[3] - a[1])
+            for j in range(i + 1, len(boxes)):
+                b = boxes[j]
+                ih = min(a[2], b[2]) - max(a[0], b[0])
+                iw = min(a[3], b[3]) - max(a[1], b[1])
+                if ih <= 0 or iw <= 0:
+                    continue
+                smaller = min(area_a, (b[2] - b[0]) * (b[3] - b[1]))
+                if smaller > 0 and ih * iw / smaller > 0.6:
+                    overlapping.update((i, j))
+        return len(overlapping) / len(boxes) if boxes else 0.0
+
+    def score(self, layout, image_bytes=None):
+        result = {"score": 1.0, "blocks": len(layout) if isinstance(layout, list) else 0, "reasons": []}
+        if not isinstance(layout, list):
+            result.update(score=0.0, reasons=["not_a_list"])
+            return result
+
+        valid = [item for item in layout if self._valid_bbox(item)]
+        validity = len(valid) / len(layout) if layout else 1.0
+        boxes = [[max(0, min(1000, v)) for v in item["bbox"]] for item in valid]
+        overlap = self._overlap_ratio(boxes)
+
+        coverage, empty_ratio, text_fraction = 1.0, 0.0, None
+        mask = self.estimate_text_mask(image_bytes) if image_bytes else None
+        if mask is not None:
+            h, w = mask.shape
+            text_pixels = int(mask.sum())
+            text_fraction = text_pixels / float(h * w)
+            covered = np.zeros_like(mask)
+            empty = 0
+            for ymin, xmin, ymax, xmax in boxes:
+                y0, y1 = int(ymin / 1000 * h), int(np.ceil(ymax / 1000 * h))
+                x0, x1 = int(xmin / 1000 * w), int(np.ceil(xmax / 1000 * w))
+                pad = max(1, int((y1 - y0) * 0.15))
+                y0, y1, x0, x1 = max(0, y0 - pad), min(h, y1 + pad), max(0, x0 - pad), min(w, x1 + pad)
+                if y1 <= y0 or x1 <= x0:
+                    continue
+                covered[y0:y1, x0:x1] = 1
+                if mask[y0:y1, x0:x1].mean() < 0.01:
+                    empty += 1
+            empty_ratio = empty / len(boxes) if boxes else 0.0
+            # Ignore coverage on slides with (almost) no text-like pixels
+            if text_fraction > 0.002:
+                coverage = float((mask & covered).sum()) / text_pixels
+
+        if validity < self.min_validity:
+            result["reasons"].append("invalid_bbox")
+        if overlap > self.max_overlap:
+            result["reasons"].append("overlap")
+        if coverage < self.min_coverage:
+            result["reasons"].append("missed_text")
+        if empty_ratio > self.max_empty_boxes:
+            result["reasons"].append("empty_boxes")
+
+        result["score"] = round(0.3 * validity + 0.2 * (1 - overlap) + 0.35 * coverage + 0.15 * (1 - empty_ratio), 3)
+        result.update(validity=round(validity, 3), overlap=round(overlap, 3), coverage=round(coverage, 3),
+                      empty_boxes=round(empty_ratio, 3),
+                      text_fraction=round(text_fraction, 4) if text_fraction is not None else None)
+        return result
+
+class LayoutCascade:
+    """
+    Cheap-model-first layout detection. Every slide is detected with fast_model and scored locally
+    (LayoutScorer); only slides scoring below min_score or failing a check are escalated, either to
+    the task's own (heavier) vision model ("model") or to a refine pass of the fast result ("refine").
+    Every refine goes through Analyzer.apply_refine_async (local snapping or Gemini, as configured).
+    Accepted fast results skip the optional refine pass entirely.
+    """
+    ESCALATIONS = ("model", "refine")
+
+    def __init__(self, pool, batcher=None, enabled=False, fast_model="gemini-2.5-flash-lite", escalation="model",
+                 min_score=0.75, scorer=None):
+        self.pool = pool
+        self.batcher = batcher
+        self.enabled = enabled
+        self.fast_model = fast_model
+        self.escalation = escalation if escalation in self.ESCALATIONS else "model"
+        self.min_score = min_score
+        self.scorer = scorer or LayoutScorer()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "slides": 0,
+            "accepted": 0,
+            "escalated": 0,
+            "escalated_to_model": 0,
+            "escalated_to_refine": 0,
+            "reasons": {},
+            "score_sum": 0.0,
+            "score_buckets": [0] * 10,
+            "scoring_sec": 0.0,
+        }
+
+    async def _detect(self, analyzer, prepared, use_cache):
+        if self.batcher is not None:
+            return await self.batcher.detect(analyzer, prepared, use_cache)
+        return await analyzer.detect_initial_layout_async(prepared, use_cache=use_cache)
+
+    def _record(self, quality, escalated_to, elapsed):
+        with self._lock:
+            m = self.metrics
+            m["slides"] += 1
+            m["scoring_sec"] += elapsed
+            m["score_sum"] += quality["score"]
+            m["score_buckets"][min(9, int(quality["score"] * 10))] += 1
+            if escalated_to is None:
+                m["accepted"] += 1
+                return
+            m["escalated"] += 1
+            m[f"escalated_to_{escalated_to}"] += 1
+            for reason in quality["reasons"] or ["low_score"]:
+                m["reasons"][reason] = m["reasons"].get(reason, 0) + 1
+
+    async def detect(self, analyzer, prepared, use_cache=True, refine=False):
+        """
+        analyzer: the task's model-bound (heavy) analyzer; prepared: the task's PreparedImage.
+        Returns (layout, width, height) in the same normalized format as detect_initial_layout_async.
+        """
+        fast = self.pool.get(self.fast_model)
+        layout, width, height = await self._detect(fast, prepared, use_cache)
+
+        started = time.monotonic()
+        quality = await asyncio.to_thread(self.scorer.score, layout, prepared.data)
+        elapsed = time.monotonic() - started
+
+        # Any hard check failing escalates, regardless of the blended score
+        if quality["score"] >= self.min_score and not quality["reasons"]:
+            self._record(quality, None, elapsed)
+            logger.info(f"Cascade accepted {self.fast_model} layout (score {quality['score']}, {quality['blocks']} blocks): {prepared.source_path}")
+            return layout, width, height
+
+        # Escalating to the same model would just repeat the call; refine instead
+        escalation = self.escalation if analyzer.model_name != fast.model_name else "refine"
+        self._record(quality, escalation, elapsed)
+        logger.info(f"Cascade escalating to {escalation} ({analyzer.model_name}), score {quality['score']} "
+                    f"{quality['reasons']}: {prepared.source_path}")
+
+        if escalation == "refine":
+            layout = await analyzer.apply_refine_async(prepared, layout, use_cache)
+            return layout, width, height
+
+        layout, width, height = await self._detect(analyzer, prepared, use_cache)
+        if refine:
+            layout = await analyzer.apply_refine_async(prepared, layout, use_cache)
+        return layout, width, height
+
+    def stats(self):
+        with self._lock:
+            m = dict(self.metrics)
+            m["reasons"] = dict(self.metrics["reasons"])
+            m["score_buckets"] = list(self.metrics["score_buckets"])
+        slides = m.pop("slides")
+        score_sum = m.pop("score_sum")
+        return {
+            "enabled": self.enabled,
+            "fast_model": self.fast_model,
+            "escalation": self.escalation,
+            "min_score": self.min_score,
+            "slides": slides,
+            **m,
+            "escalation_rate": round(m["escalated"] / slides, 3) if slides else 0.0,
+            "mean_score": round(score_sum / slides, 3) if slides else None,
+            "scoring_sec": round(m["scoring_sec"], 3),
+        }
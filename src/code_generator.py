@@ -1,12 +1,61 @@
 import statistics
 import os
+import shutil
+import hashlib
+import tempfile
 from src.utils import get_logger
 
 logger = get_logger(__name__)
 
+ASSETS_DIRNAME = "assets"
+
 class CodeGenerator:
-    def __init__(self):
-        pass
+    """
+    asset_mode: "embed" inlines the background as a base64 data URI (standalone HTML file);
+    "external" stores it once as assets/<content-hash>.<ext> next to the HTML and links it by URL,
+    so identical backgrounds are written/downloaded once and stay browser-cacheable.
+    """
+    ASSET_MODES = ("embed", "external")
+
+    def __init__(self, asset_mode="embed"):
+        self.asset_mode = asset_mode if asset_mode in self.ASSET_MODES else "embed"
+
+    def publish_asset(self, file_path, html_dir):
+        """Copies file_path to <html_dir>/assets/<sha256>.<ext> (once) and returns its relative URL."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        ext = os.path.splitext(file_path)[1].lower()
+        asset_name = f"{digest.hexdigest()[:32]}{ext}"
+        assets_dir = os.path.join(html_dir, ASSETS_DIRNAME)
+        asset_path = os.path.join(assets_dir, asset_name)
+        if not os.path.exists(asset_path):
+            os.makedirs(assets_dir, exist_ok=True)
+            # Copy under a temp name and rename, so concurrent tasks never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=assets_dir, suffix=".tmp")
+            os.close(fd)
+            try:
+                shutil.copyfile(file_path, tmp_path)
+                os.replace(tmp_path, asset_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            logger.info(f"Published background asset: {asset_path}")
+        return f"{ASSETS_DIRNAME}/{asset_name}"
+
+    def _background_url(self, bg_image_path, output_path, asset_mode):
+        if asset_mode == "external":
+            return self.publish_asset(bg_image_path, os.path.dirname(os.path.abspath(output_path)))
+        # Read and encode background image
+        import base64
+        with open(bg_image_path, "rb") as img_file:
+            b64_string = base64.b64encode(img_file.read()).decode('utf-8')
+        # Guess mime type based on extension
+        ext = os.path.splitext(bg_image_path)[1].lower()
+        mime_type = {".png": "image/png", ".webp": "image/webp"}.get(ext, "image/jpeg")
+        return f"data:{mime_type};base64,{b64_string}"
 
     def normalize_font_sizes(self, layout_data, image_width):
         """
@@ -57,21 +106,66 @@ class CodeGenerator:
 
         return layout_data
 
-    def generate_html(self, layout_data, width, height, bg_image_path, output_path, normalize=True, font_family="Malgun Gothic", model_name="algorithmic"):
-        logger.info(f"Generating HTML (with embedded BG): {output_path}")
+    @staticmethod
+    def _google_font_link(font_family):
+        # Google Font / CDN Injection logic
+        if "Noto Sans" in font_family:
+            return '<link href="https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@400;700&display=swap" rel="stylesheet">'
+        elif "Nanum" in font_family:
+            return '<link href="https://fonts.googleapis.com/css2?family=Nanum+Gothic:wght@400;700&display=swap" rel="stylesheet">'
+        elif "Pretendard" in font_family:
+            return '<link rel="stylesheet" as="style" crossorigin href="https://cdn.jsdelivr.net/gh/orioncactus/pretendard@v1.3.9/dist/web/static/pretendard.min.css" />'
+        return ""
+
+    @staticmethod
+    def _css_font_family(font_family):
+        # CSS Font Family Name Normalization
+        # If user selected "Pretendard Medium", we use "Pretendard" for CSS family, 
+        # but might want to enforce weight if we really wanted to. 
+        # For now, let's just use the family name "Pretendard".
+        if "Pretendard" in font_family:
+            return "Pretendard"
+        return font_family
+
+    @staticmethod
+    def _text_element(item, width, height, font_family):
+        """Absolutely positioned text div for one layout item (shared by single-slide and deck output)."""
+        x, y, w, h = item['bbox_px']
+        style = item.get('style', {})
+        font_size_cqw = item.get('font_size_cqw', 2) # Fallback
+
+        left_pct = (x / width) * 100
+        top_pct = (y / height) * 100
+        width_pct = (w / width) * 100
+
+        # HTML Text Process
+        text_content = item['text'].replace('\n', '<br>')
+
+        element_css = (
+            f"position: absolute; "
+            f"left: {left_pct:.2f}%; "
+            f"top: {top_pct:.2f}%; "
+            f"width: {width_pct:.2f}%; "
+            f"color: {style.get('color', '#000000')}; "
+            f"font-size: {font_size_cqw:.2f}cqw; " # Geometrically calculated size
+            f"font-weight: {style.get('font_weight', 'normal')}; "
+            f"text-align: {style.get('align', 'left')}; "
+            f"font-family: '{font_family}', sans-serif; "
+            f"line-height: 1.3;" # Fixed line height matching calculation
+            f"white-space: normal;" # Allow wrapping
+            f"z-index: 10;"
+        )
+        return f'<div class="slide-text" style="{element_css}">{text_content}</div>'
+
+    def generate_html(self, layout_data, width, height, bg_image_path, output_path, normalize=True, font_family="Malgun Gothic", model_name="algorithmic", asset_mode=None):
+        asset_mode = asset_mode or self.asset_mode
+        logger.info(f"Generating HTML ({'external' if asset_mode == 'external' else 'embedded'} BG): {output_path}")
         
         if normalize:
             layout_data = self.normalize_font_sizes(layout_data, width)
         
-        # Read and encode background image
-        import base64
         try:
-            with open(bg_image_path, "rb") as img_file:
-                b64_string = base64.b64encode(img_file.read()).decode('utf-8')
-                # Guess mime type based on extension
-                ext = os.path.splitext(bg_image_path)[1].lower()
-                mime_type = "image/png" if ext == ".png" else "image/jpeg"
-                bg_data_uri = f"data:{mime_type};base64,{b64_string}"
+            bg_data_uri = self._background_url(bg_image_path, output_path, asset_mode)
         except Exception as e:
             logger.error(f"Failed to embed background image: {e}")
             bg_data_uri = "" # Fallback to empty or placeholder
@@ -79,54 +173,10 @@ class CodeGenerator:
         html_elements = []
         
         for item in layout_data:
-            x, y, w, h = item['bbox_px']
-            style = item['style']
-            raw_text = item['text']
-            font_size_cqw = item.get('font_size_cqw', 2) # Fallback
-            
-            left_pct = (x / width) * 100
-            top_pct = (y / height) * 100
-            width_pct = (w / width) * 100
-            # Add a buffer to width to prevent unexpected wrapping
-            width_pct_buffered = width_pct * 1.05 
-            
-            # HTML Text Process
-            text_content = raw_text.replace('\n', '<br>')
-            
-            element_css = (
-                f"position: absolute; "
-                f"left: {left_pct:.2f}%; "
-                f"top: {top_pct:.2f}%; "
-                f"width: {width_pct:.2f}%; "
-                f"color: {style.get('color', '#000000')}; "
-                f"font-size: {font_size_cqw:.2f}cqw; " # Geometrically calculated size
-                f"font-weight: {style.get('font_weight', 'normal')}; "
-                f"text-align: {style.get('align', 'left')}; "
-                f"font-family: '{font_family}', sans-serif; "
-                f"line-height: 1.3;" # Fixed line height matching calculation
-                f"white-space: normal;" # Allow wrapping
-                f"z-index: 10;"
-            )
-            
-            div = f'<div class="slide-text" style="{element_css}">{text_content}</div>'
-            html_elements.append(div)
-
-        # Google Font / CDN Injection logic
-        google_font_link = ""
-        if "Noto Sans" in font_family:
-            google_font_link = '<link href="https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@400;700&display=swap" rel="stylesheet">'
-        elif "Nanum" in font_family:
-             google_font_link = '<link href="https://fonts.googleapis.com/css2?family=Nanum+Gothic:wght@400;700&display=swap" rel="stylesheet">'
-        elif "Pretendard" in font_family:
-            google_font_link = '<link rel="stylesheet" as="style" crossorigin href="https://cdn.jsdelivr.net/gh/orioncactus/pretendard@v1.3.9/dist/web/static/pretendard.min.css" />'
+            html_elements.append(self._text_element(item, width, height, font_family))
 
-        # CSS Font Family Name Normalization
-        # If user selected "Pretendard Medium", we use "Pretendard" for CSS family, 
-        # but might want to enforce weight if we really wanted to. 
-        # For now, let's just use the family name "Pretendard".
-        css_font_family = font_family
-        if "Pretendard" in font_family:
-            css_font_family = "Pretendard"
+        google_font_link = self._google_font_link(font_family)
+        css_font_family = self._css_font_family(font_family)
 
         full_html = f"""<!DOCTYPE html>
 <html lang="ko">
@@ -185,3 +235,108 @@ class CodeGenerator:
             f.write(full_html)
         
         return output_path
+
+    def generate_deck_html(self, slides, output_path, font_family="Malgun Gothic", title="Slide Deck"):
+        """
+        Writes one HTML deck for many slides. `slides` is an iterable of
+        (layout_data, width, height, bg_image_path) and is consumed lazily: each slide is rendered and
+        written before the next is read, so memory stays flat for large batches.
+        CSS and the font link are emitted once. Backgrounds are always external content-hashed
+        assets (a data URI cannot be lazy-loaded) shown with <img loading="lazy">, and off-screen
+        slides skip rendering via content-visibility. Returns the number of slides written.
+        """
+        logger.info(f"Generating HTML deck: {output_path}")
+        html_dir = os.path.dirname(os.path.abspath(output_path))
+        css_font_family = self._css_font_family(font_family)
+        tmp_path = output_path + ".tmp"
+        try:
+            count = self._write_deck(tmp_path, slides, html_dir, font_family, css_font_family, title)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"HTML deck written: {count} slides -> {output_path}")
+        return count
+
+    def _write_deck(self, path, slides, html_dir, font_family, css_font_family, title):
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"""<!DOCTYPE html>
+<html lang="ko">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    {self._google_font_link(font_family)}
+    <style>
+        body {{
+            margin: 0;
+            padding: 40px 0;
+            background-color: #222;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            gap: 40px;
+            font-family: '{css_font_family}', sans-serif;
+        }}
+        .slide-wrapper {{
+            width: 90vw;
+            max-width: 1200px;
+            container-type: inline-size;
+            background: #000;
+            box-shadow: 0 20px 50px rgba(0,0,0,0.5);
+            border-radius: 8px;
+            content-visibility: auto;
+            contain-intrinsic-size: auto 675px;
+        }}
+        .slide-container {{
+            position: relative;
+            width: 100%;
+            overflow: hidden;
+        }}
+        .slide-bg {{
+            position: absolute;
+            inset: 0;
+            width: 100%;
+            height: 100%;
+        }}
+        .slide-text {{
+            transition: outline 0.2s;
+        }}
+        .slide-text:hover {{
+            outline: 1px dashed rgba(255, 255, 0, 0.7);
+            cursor: default;
+        }}
+        .slide-number {{
+            color: #888;
+            font-size: 12px;
+            margin: 4px 8px;
+        }}
+    </style>
+</head>
+<body>
+""")
+            for layout_data, width, height, bg_image_path in slides:
+                count += 1
+                if layout_data and "font_size_cqw" not in layout_data[0]:
+                    layout_data = self.normalize_font_sizes(layout_data, width)
+                bg_tag = ""
+                if bg_image_path:
+                    try:
+                        bg_url = self.publish_asset(bg_image_path, html_dir)
+                        # The first slide is visible immediately; everything below it loads on scroll
+                        loading = "eager" if count == 1 else "lazy"
+                        bg_tag = f'<img class="slide-bg" src="{bg_url}" loading="{loading}" decoding="async" width="{width}" height="{height}" alt="">'
+                    except Exception as e:
+                        logger.error(f"Failed to publish background for deck slide {count}: {e}")
+                parts = [
+                    f'<section class="slide-wrapper" id="slide-{count}">\n',
+                    f'    <div class="slide-container" style="aspect-ratio: {width} / {height};">\n',
+                    f'        {bg_tag}\n' if bg_tag else "",
+                ]
+                for item in layout_data:
+                    parts.append(f'        {self._text_element(item, width, height, font_family)}\n')
+                parts.append(f'    </div>\n    <div class="slide-number">{count}</div>\n</section>\n')
+                f.write("".join(parts))
+            f.write("</body>\n</html>")
+        return count
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import deque
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+def is_throttle_error(e):
+    """True for Gemini quota (429 / RESOURCE_EXHAUSTED) and timeout failures."""
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    error_msg = str(e)
+    return any(marker in error_msg for marker in ("429", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "timed out", "Timeout"))
+
+class ConcurrencyLimiter:
+    """
+    asyncio semaphore whose limit can be changed in place.
+    Tasks already holding a slot keep it; waiters are woken as soon as the new limit allows.
+    """
+    def __init__(self, limit, name="tasks"):
+        self.name = name
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self._waiters = deque()
+
+    def _capacity(self):
+        return int(self.limit)
+
+    async def acquire(self):
+        while self.in_flight >= self._capacity():
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+                self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = self._capacity() - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def set_limit(self, limit):
+        limit = max(1, int(limit))
+        if limit != self._capacity():
+            logger.info(f"[{self.name}] Concurrency limit changed: {self._capacity()} -> {limit}")
+        self.limit = limit
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self):
+        return {
+            "limit": self._capacity(),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+        }
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """
+    AIMD concurrency limiter for the Gemini vision stage.
+    - Additive increase: +increase_step per window of successful calls while latency stays
+      within latency_tolerance x the baseline (EWMA of observed latency).
+    - Multiplicative decrease: limit x decrease_factor on 429 / RESOURCE_EXHAUSTED / timeout,
+      at most once per cooldown so one burst of rejections only backs off once.
+    """
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=15, increase_step=1.0,
+                 decrease_factor=0.5, latency_tolerance=1.5, cooldown_sec=2.0, name="vision"):
+        super().__init__(initial_limit, name=name)
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown_sec = cooldown_sec
+        self.baseline_latency = None
+        self.throttle_count = 0
+        self.success_count = 0
+        self._last_decrease = 0.0
+
+    def record_success(self, latency):
+        self.success_count += 1
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+            return
+
+        previous = self._capacity()
+        if latency <= self.baseline_latency * self.latency_tolerance:
+            # Latency is flat: grow by ~increase_step per full window of in-flight calls
+            self.limit = min(self.max_limit, self.limit + self.increase_step / max(self.limit, 1.0))
+        # Slow-moving baseline so a single slow call does not reset it
+        self.baseline_latency = 0.9 * self.baseline_latency + 0.1 * latency
+
+        if self._capacity() != previous:
+            logger.info(f"[{self.name}] AIMD increase: {previous} -> {self._capacity()} (latency {latency:.2f}s, baseline {self.baseline_latency:.2f}s)")
+            self._wake()
+
+    def record_throttle(self, reason=""):
+        self.throttle_count += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_sec:
+            return
+        self._last_decrease = now
+        previous = self._capacity()
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        logger.warning(f"[{self.name}] AIMD backoff: {previous} -> {self._capacity()} ({reason})")
+
+    def set_max_limit(self, max_limit):
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = min(self.limit, float(self.max_limit))
+        self._wake()
+
+    def set_limit(self, limit):
+        super().set_limit(max(self.min_limit, min(int(limit), self.max_limit)))
+
+    def stats(self):
+        data = super().stats()
+        data.update({
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_latency": round(self.baseline_latency, 3) if self.baseline_latency else None,
+            "throttles": self.throttle_count,
+            "successes": self.success_count,
+        })
+        return data
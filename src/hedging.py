@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies (seconds)."""
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def percentile(self, pct):
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self.samples)
+
+class Hedger:
+    """
+    Speculative duplicate requests for tail latency.
+    If a call has not finished after the `percentile`-th latency of recent calls for the same key
+    (model, and image-count bucket for multi-slide batches - see latency_key), an identical second
+    request is started; the first to succeed wins and the other is cancelled.
+    Extra requests are capped at max_extra_ratio of all calls.
+    """
+    def __init__(self, enabled=False, percentile=95, min_samples=20, max_extra_ratio=0.1, window=200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_extra_ratio = max_extra_ratio
+        self.window = window
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    @staticmethod
+    def latency_key(model_name, images=1):
+        """
+        Single-image calls are keyed by model name; batched calls by model and power-of-two image
+        bucket ("model:x2", "model:x4", "model:x8", ...), so batches neither inflate the single-call
+        percentile nor get hedged against it.
+        """
+        if images <= 1:
+            return model_name
+        return f"{model_name}:x{1 << (images - 1).bit_length()}"
+
+    def tracker(self, key):
+        with self._lock:
+            if key not in self._trackers:
+                self._trackers[key] = LatencyTracker(self.window)
+            return self._trackers[key]
+
+    def _hedge_delay(self, tracker):
+        if not self.enabled or len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedges + 1 > self.max_extra_ratio * self.calls:
+                self.budget_denied += 1
+                return False
+            self.hedges += 1
+            return True
+
+    async def run(self, key, attempt_fn):
+        """attempt_fn: zero-argument coroutine factory; called once, or twice when hedging."""
+        tracker = self.tracker(key)
+        with self._lock:
+            self.calls += 1
+        started = time.monotonic()
+        delay = self._hedge_delay(tracker)
+
+        if delay is None:
+            result = await attempt_fn()
+            tracker.record(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(attempt_fn())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and self._take_budget():
+                logger.info(f"Hedging {key} request after {delay:.2f}s (p{self.percentile})")
+                pending.add(asyncio.ensure_future(attempt_fn()))
+
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        tracker.record(time.monotonic() - started)
+                        if task is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # Cancel the loser (or both, if we were cancelled ourselves)
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            trackers = dict(self._trackers)
+            data = {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+            }
+        data["latency"] = {
+            key: {
+                "samples": len(t),
+                "p50": round(t.percentile(50), 3) if len(t) else None,
+                "p95": round(t.percentile(95), 3) if len(t) else None,
+                "p99": round(t.percentile(99), 3) if len(t) else None,
+            }
+            for key, t in trackers.items()
+        }
+        return data
@@ -0,0 +1,124 @@
+import io
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+class ImageHandle:
+    """
+    One slide image shared by every stage of a task (analysis upload, local refine, inpainting, resize).
+    The file is read once; cv2 decodes from a zero-copy np.frombuffer view of those bytes, and the
+    decoded pixels are cached as NumPy arrays and a PIL Image is built from them on first use (PIL
+    copies RGB buffers, so the temporary RGB array is not kept). release() drops every buffer when the task ends.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._bgr = None
+        self._rgb = None
+        self._gray = None
+        self._pil = None
+        self._size = None
+        self._format = None
+        self._lock = threading.RLock()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def __repr__(self):
+        return f"ImageHandle({self.path}, {'closed' if self.closed else 'open'})"
+
+    def _check(self):
+        if self.closed:
+            raise ValueError(f"Image handle already released: {self.path}")
+
+    @property
+    def data(self):
+        """Encoded file bytes (read once)."""
+        with self._lock:
+            self._check()
+            if self._data is None:
+                with open(self.path, "rb") as f:
+                    self._data = f.read()
+            return self._data
+
+    def _read_header(self):
+        with Image.open(io.BytesIO(self.data)) as img:
+            self._size = img.size
+            self._format = img.format
+
+    @property
+    def size(self):
+        """(width, height) from the decoded pixels, or from the file header if not decoded yet."""
+        with self._lock:
+            if self._size is None:
+                if self._bgr is not None:
+                    self._size = (self._bgr.shape[1], self._bgr.shape[0])
+                else:
+                    self._read_header()
+            return self._size
+
+    @property
+    def format(self):
+        with self._lock:
+            if self._format is None:
+                self._read_header()
+            return self._format
+
+    @property
+    def bgr(self):
+        """Decoded 3-channel BGR pixels (cv2 convention). Treat as read-only."""
+        with self._lock:
+            self._check()
+            if self._bgr is None:
+                # cv2 handles korean paths poorly, so we decode from the bytes already in memory
+                img = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if img is None:
+                    raise ValueError(f"Could not load image: {self.path}")
+                self._bgr = img
+                self._size = (img.shape[1], img.shape[0])
+            return self._bgr
+
+    @property
+    def rgb(self):
+        with self._lock:
+            if self._rgb is None:
+                self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+            return self._rgb
+
+    @property
+    def gray(self):
+        with self._lock:
+            if self._gray is None:
+                self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+            return self._gray
+
+    @property
+    def pil(self):
+        """PIL image of the decoded pixels (no second file decode). Do not modify in place."""
+        with self._lock:
+            if self._pil is None:
+                rgb = self._rgb if self._rgb is not None else cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+                self._pil = Image.fromarray(rgb, "RGB")
+            return self._pil
+
+    @property
+    def nbytes(self):
+        arrays = (self._bgr, self._rgb, self._gray)
+        total = (len(self._data) if self._data else 0) + sum(a.nbytes for a in arrays if a is not None)
+        if self._pil is not None:
+            total += self._pil.width * self._pil.height * 3
+        return total
+
+    def release(self):
+        with self._lock:
+            if self.closed:
+                return
+            if self._pil is not None:
+                self._pil.close()
+            self._data = self._bgr = self._rgb = self._gray = self._pil = None
+            self.closed = True
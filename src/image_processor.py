@@ -1,46 +1,484 @@
 import cv2
 import numpy as np
 import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.image_handle import ImageHandle
 from src.utils import get_logger
 
 logger = get_logger(__name__)
 
+class WatermarkMatcher:
+    """
+    Multi-scale template matcher for the fixed NotebookLM watermark graphic.
+    The template (grayscale PNG + JSON sidecar with the reference slide size and position) is
+    bootstrapped once from a slide where Gemini found the watermark, or saved explicitly with
+    save_template(). A patch is only accepted if it has the watermark's size and bottom-right
+    position and is distinctive on its own slide (nothing else there matches it closely); a stored
+    template failing the position check is ignored. Resized templates are precomputed per slide
+    width and matched (TM_CCOEFF_NORMED) only around the expected bottom-right position.
+    """
+    SCALE_FACTORS = (0.8, 0.9, 1.0, 1.1, 1.25)
+    # Watermark geometry, as fractions of the slide: top-left corner bounds and size range
+    MIN_REL_X, MIN_REL_Y = 0.7, 0.85
+    REL_WIDTH, REL_HEIGHT = (0.03, 0.3), (0.01, 0.1)
+    # Source-slide check: self-match score, and best score allowed anywhere else on the slide
+    MIN_SELF_SCORE, MAX_OTHER_SCORE = 0.99, 0.6
+
+    def __init__(self, template_path, threshold=0.85):
+        self.template_path = template_path
+        self.meta_path = os.path.splitext(template_path)[0] + ".json"
+        self.threshold = threshold
+        self.template = None
+        self.meta = None
+        self._scaled = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.template_path) or not os.path.exists(self.meta_path):
+            return
+        template = cv2.imdecode(np.fromfile(self.template_path, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            logger.warning(f"Watermark template unreadable: {self.template_path}")
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not self._in_corner(meta.get("rel_x", 0), meta.get("rel_y", 0)):
+            logger.warning(f"Ignoring watermark template outside the bottom-right corner: {self.template_path}")
+            return
+        self.meta = meta
+        self.template = template
+        logger.info(f"Watermark template loaded: {self.template_path} ({template.shape[1]}x{template.shape[0]})")
+
+    @property
+    def ready(self):
+        return self.template is not None
+
+    @classmethod
+    def _in_corner(cls, rel_x, rel_y):
+        return rel_x >= cls.MIN_REL_X and rel_y >= cls.MIN_REL_Y
+
+    def _check_patch(self, gray, bbox_px, crop, x0, y0):
+        """Reason the patch cannot be a watermark template, or None if it passes."""
+        height, width = gray.shape[:2]
+        x, y, w, h = bbox_px
+        if not self._in_corner(x / width, y / height) or x + w > width or y + h > height:
+            return f"bbox {bbox_px} is not in the bottom-right corner"
+        if not (self.REL_WIDTH[0] <= w / width <= self.REL_WIDTH[1] and self.REL_HEIGHT[0] <= h / height <= self.REL_HEIGHT[1]):
+            return f"bbox {bbox_px} does not have the watermark's size"
+        if crop.size == 0 or crop.std() < 5:
+            return "patch is empty or flat"
+        result = cv2.matchTemplate(gray, crop, cv2.TM_CCOEFF_NORMED)
+        score = float(result[y0, x0])
+        if score < self.MIN_SELF_SCORE:
+            return f"patch does not match its own position (score {score:.2f})"
+        # Blank out the neighbourhood of the true position; anything else this similar means a repeating pattern
+        th, tw = crop.shape[:2]
+        result[max(0, y0 - th // 2):y0 + th // 2 + 1, max(0, x0 - tw // 2):x0 + tw // 2 + 1] = -1
+        other = float(result.max()) if result.size else -1
+        if other > self.MAX_OTHER_SCORE:
+            return f"patch is not distinctive (another match scores {other:.2f})"
+        return None
+
+    def save_template(self, img, bbox_px):
+        """
+        Crops the watermark at bbox_px [x, y, w, h] from a slide and stores it as the template,
+        if the patch passes the size, position and distinctiveness checks.
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        height, width = gray.shape[:2]
+        x, y, w, h = bbox_px
+        pad = max(2, int(h * 0.15))
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+        crop = gray[y0:y1, x0:x1]
+        reason = self._check_patch(gray, bbox_px, crop, x0, y0)
+        if reason is not None:
+            logger.warning(f"Not learning watermark template: {reason}")
+            return False
+        with self._lock:
+            os.makedirs(os.path.dirname(self.template_path), exist_ok=True)
+            success, encoded = cv2.imencode(".png", crop)
+            if not success:
+                return False
+            encoded.tofile(self.template_path)
+            meta = {"ref_width": width, "ref_height": height, "rel_x": x0 / width, "rel_y": y0 / height}
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=4)
+            self.template, self.meta, self._scaled = crop, meta, {}
+        logger.info(f"Watermark template saved from {width}x{height} slide at {[x0, y0, x1 - x0, y1 - y0]}")
+        return True
+
+    def _templates_for(self, width):
+        with self._lock:
+            scaled = self._scaled.get(width)
+            if scaled is None:
+                base = width / self.meta["ref_width"]
+                scaled = []
+                for factor in self.SCALE_FACTORS:
+                    s = base * factor
+                    tw, th = int(round(self.template.shape[1] * s)), int(round(self.template.shape[0] * s))
+                    if tw >= 8 and th >= 6:
+                        scaled.append(cv2.resize(self.template, (tw, th), interpolation=cv2.INTER_AREA if s < 1 else cv2.INTER_LINEAR))
+                self._scaled[width] = scaled
+            return scaled
+
+    def find(self, img):
+        """Returns (x, y, w, h, score) of the best match above threshold, or None."""
+        if not self.ready:
+            return None
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        height, width = gray.shape[:2]
+        # Search window: expected position with a generous margin
+        ex = int(self.meta["rel_x"] * width)
+        ey = int(self.meta["rel_y"] * height)
+        x0, y0 = max(0, ex - int(width * 0.08)), max(0, ey - int(height * 0.08))
+        roi = gray[y0:, x0:]
+
+        best = None
+        for template in self._templates_for(width):
+            th, tw = template.shape[:2]
+            if th > roi.shape[0] or tw > roi.shape[1]:
+                continue
+            result = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(result)
+            if best is None or score > best[4]:
+                best = (x0 + loc[0], y0 + loc[1], tw, th, float(score))
+        if best is None or best[4] < self.threshold:
+            return None
+        return best
+
+class InpaintOptions:
+    """
+    mode "roi": inpaint each connected mask component on a padded crop, across a thread pool
+    (cv2 releases the GIL); components below small_area are grouped into batches of ~batch_area
+    pixels per pool task. mode "full": one cv2.inpaint over the whole frame (original behaviour).
+    adaptive (roi mode only, opt-in): classify the border ring of each component first - uniform rings get
+    a median-color fill, smooth rings a least-squares plane fit; only textured ones use Telea/NS.
+    algorithm: "telea" (always, the original output), "ns", or "request" (Navier-Stokes only when the
+    request's inpainting_model is "opencv-ns"; the shipped settings and frontend send that by default).
+    mask_mode "rect": padded rectangle per bbox. "glyph": only pixels that differ from the local
+    background color inside each bbox, plus a small halo (falls back to the rectangle on busy backgrounds).
+    pyramid_mp > 0: images larger than this many megapixels are inpainted at a reduced scale, the fill is
+    upsampled into the mask and a band of seam_width px along the mask border is re-inpainted at full resolution.
+    """
+    def __init__(self, mode="roi", workers=4, roi_pad=12, small_area=4096, batch_area=65536,
+                 adaptive=False, ring_width=3, uniform_std=3.0, smooth_rms=4.0,
+                 mask_mode="rect", glyph_min_distance=30.0, glyph_halo=0.08, pyramid_mp=0, seam_width=4,
+                 algorithm="telea"):
+        self.mode = mode
+        self.workers = workers
+        self.roi_pad = roi_pad
+        self.small_area = small_area
+        self.batch_area = batch_area
+        self.adaptive = adaptive
+        self.ring_width = ring_width
+        self.uniform_std = uniform_std
+        self.smooth_rms = smooth_rms
+        self.mask_mode = mask_mode
+        self.glyph_min_distance = glyph_min_distance
+        self.glyph_halo = glyph_halo
+        self.pyramid_mp = pyramid_mp
+        self.seam_width = seam_width
+        self.algorithm = algorithm
+
+    @classmethod
+    def from_settings(cls, conf):
+        conf = conf or {}
+        return cls(
+            mode=conf.get("mode", "roi"),
+            workers=conf.get("workers", 4),
+            roi_pad=conf.get("roi_pad", 12),
+            small_area=conf.get("small_area", 4096),
+            batch_area=conf.get("batch_area", 65536),
+            adaptive=conf.get("adaptive", False),
+            uniform_std=conf.get("uniform_std", 3.0),
+            smooth_rms=conf.get("smooth_rms", 4.0),
+            mask_mode=conf.get("mask_mode", "rect"),
+            pyramid_mp=conf.get("pyramid_mp", 0),
+            seam_width=conf.get("seam_width", 4),
+            algorithm=conf.get("algorithm", "telea")
+        )
+
 class ImageProcessor:
-    def __init__(self):
-        pass
+    WATERMARK_MODES = ("flagged", "always", "off")
 
-    def create_clean_background(self, image_path, layout_data, output_path):
-        logger.info(f"Processing background for: {image_path}")
-        
-        # Read image
-        # cv2 handles korean paths poorly, so we read as byte stream
-        stream = open(image_path, "rb")
-        bytes = bytearray(stream.read())
-        numpyarray = np.asarray(bytes, dtype=np.uint8)
-        img = cv2.imdecode(numpyarray, cv2.IMREAD_UNCHANGED)
-        
-        if img is None:
-            raise ValueError(f"Could not load image: {image_path}")
-            
-        if img.shape[2] == 4:
-             img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-             
+    def __init__(self, watermark_template=None, inpaint_options=None, watermark_mode="flagged", watermark_threshold=0.85):
+        # Optional local watermark matcher (template path; bootstrapped from the first Gemini detection)
+        # watermark_mode: "flagged" matches slides where Gemini reported the NotebookLM watermark and
+        # every slide cleaned without vision output (local mode), "always" every slide (all input is
+        # known to come from NotebookLM), "off" never
+        self.watermark_mode = watermark_mode if watermark_mode in self.WATERMARK_MODES else "flagged"
+        self.watermark = None
+        if watermark_template and self.watermark_mode != "off":
+            self.watermark = WatermarkMatcher(watermark_template, threshold=watermark_threshold)
+        self.inpaint_options = inpaint_options or InpaintOptions()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Cumulative adaptive-fill counters: strategy -> [components, seconds]
+        self.fill_stats = {}
+        self._stats_lock = threading.Lock()
+
+    def inpaint_flags(self, inpainting_model):
+        algorithm = self.inpaint_options.algorithm
+        if algorithm == "request":
+            algorithm = "ns" if inpainting_model == "opencv-ns" else "telea"
+        return cv2.INPAINT_NS if algorithm == "ns" else cv2.INPAINT_TELEA
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.inpaint_options.workers, thread_name_prefix="inpaint")
+            return self._pool
+
+    def build_mask(self, img, layout_data):
+        """Padded-rectangle text mask (Logic from colab_success.py), slightly dilated; or glyph-level mask."""
         height, width = img.shape[:2]
         mask = np.zeros((height, width), dtype=np.uint8)
-        
-        # Create Mask with Padding (Logic from colab_success.py)
+        glyph_mode = self.inpaint_options.mask_mode == "glyph"
+        fallbacks = 0
         for item in layout_data:
             x, y, w, h = item['bbox_px']
             # Proportional padding based on height (Crucial for correct coverage)
             pad = int(h * 0.05) + 3 
+            if glyph_mode and self._add_glyph_mask(img, mask, x - pad, y - pad, x + w + pad, y + h + pad):
+                continue
+            if glyph_mode:
+                fallbacks += 1
             cv2.rectangle(mask, (x-pad, y-pad), (x+w+pad, y+h+pad), 255, -1)
+        if glyph_mode:
+            logger.info(f"Glyph mask: {len(layout_data) - fallbacks}/{len(layout_data)} boxes, {np.count_nonzero(mask) / mask.size * 100:.1f}% masked")
+            # The halo already covers anti-aliasing; no extra dilation
+            return mask
 
         # Dilate slightly to smooth edges (not too aggressive)
         kernel = np.ones((3, 3), np.uint8)
-        dilated_mask = cv2.dilate(mask, kernel, iterations=2)
+        return cv2.dilate(mask, kernel, iterations=2)
+
+    def _add_glyph_mask(self, img, mask, x0, y0, x1, y1):
+        """
+        Masks only the glyph strokes inside one padded bbox: background color = median of the box
+        border, text = pixels far from it in color (Otsu on the distance, with a floor), then a halo.
+        Returns False (caller uses the rectangle) when the background is not uniform enough.
+        """
+        height, width = img.shape[:2]
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return False
+        roi = img[y0:y1, x0:x1].astype(np.int16)
+        border = np.concatenate([roi[0], roi[-1], roi[:, 0], roi[:, -1]])
+        background = np.median(border, axis=0)
+        if float(np.abs(border - background).mean()) > self.inpaint_options.glyph_min_distance / 2:
+            return False # text on a photo/texture: color distance is not meaningful
+
+        distance = np.sqrt(((roi - background) ** 2).sum(axis=2)).clip(0, 255).astype(np.uint8)
+        threshold, _ = cv2.threshold(distance, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        glyphs = (distance > max(threshold, self.inpaint_options.glyph_min_distance)).astype(np.uint8)
+        coverage = float(glyphs.mean())
+        if coverage == 0 or coverage > 0.6:
+            return False # nothing found, or the "background" is actually the text color
+
+        halo = max(2, int((y1 - y0) * self.inpaint_options.glyph_halo))
+        glyphs = cv2.dilate(glyphs, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * halo + 1, 2 * halo + 1)))
+        mask[y0:y1, x0:x1] |= glyphs * 255
+        return True
+
+    def inpaint(self, img, mask, radius=3, flags=cv2.INPAINT_TELEA):
+        """Fills the masked pixels of img (BGR). Returns a new image."""
+        target_mp = self.inpaint_options.pyramid_mp
+        if target_mp and img.shape[0] * img.shape[1] > target_mp * 1e6:
+            return self._inpaint_pyramid(img, mask, radius, flags, target_mp)
+        return self._inpaint_native(img, mask, radius, flags)
+
+    def _inpaint_native(self, img, mask, radius, flags):
+        if self.inpaint_options.mode == "roi":
+            return self._inpaint_components(img, mask, radius, flags)
+        return cv2.inpaint(img, mask, radius, flags)
+
+    def _inpaint_pyramid(self, img, mask, radius, flags, target_mp):
+        """
+        Fill at ~target_mp megapixels, upsample into the mask, then re-inpaint only a thin band along the
+        mask border at full resolution so the seam against the untouched pixels stays sharp.
+        """
+        started = time.perf_counter()
+        height, width = img.shape[:2]
+        scale = (target_mp * 1e6 / (height * width)) ** 0.5
+        small_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        small = cv2.resize(img, small_size, interpolation=cv2.INTER_AREA)
+        # Any masked pixel in the source area masks the small pixel (no text leaks into the fill)
+        small_mask = (cv2.resize(mask, small_size, interpolation=cv2.INTER_AREA) > 0).astype(np.uint8) * 255
+        small_mask = cv2.dilate(small_mask, np.ones((3, 3), np.uint8))
+        small_filled = self._inpaint_native(small, small_mask, radius, flags)
+        upsampled = cv2.resize(small_filled, (width, height), interpolation=cv2.INTER_LINEAR)
+
+        result = img.copy()
+        inside = mask > 0
+        result[inside] = upsampled[inside]
+
+        seam = self.inpaint_options.seam_width
+        interior = cv2.erode(mask, np.ones((2 * seam + 1, 2 * seam + 1), np.uint8))
+        band = cv2.subtract(mask, interior)
+        result = self._inpaint_native(result, band, radius, flags)
+        logger.info(f"Pyramid inpainting {width}x{height} -> {small_size[0]}x{small_size[1]}, "
+                    f"seam band {np.count_nonzero(band)}px, {(time.perf_counter() - started) * 1000:.0f}ms")
+        return result
+
+    def _component_jobs(self, mask):
+        """Connected components of the mask as padded crop rectangles, small ones grouped into batches."""
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        height, width = mask.shape[:2]
+        pad = self.inpaint_options.roi_pad
+        large, small = [], []
+        for i in range(1, count):
+            x, y, w, h, area = stats[i]
+            rect = (max(0, x - pad), max(0, y - pad), min(width, x + w + pad), min(height, y + h + pad))
+            (small if area < self.inpaint_options.small_area else large).append((i, rect, area))
+
+        jobs = [[component] for component in large]
+        batch, batch_area = [], 0
+        for component in small:
+            batch.append(component)
+            batch_area += component[2]
+            if batch_area >= self.inpaint_options.batch_area:
+                jobs.append(batch)
+                batch, batch_area = [], 0
+        if batch:
+            jobs.append(batch)
+        return labels, jobs
+
+    def _inpaint_components(self, img, mask, radius, flags):
+        labels, jobs = self._component_jobs(mask)
+        if not jobs:
+            return img.copy()
+        result = img.copy()
+
+        strategy_name = "ns" if flags == cv2.INPAINT_NS else "telea"
+        per_image = {}
+        image_lock = threading.Lock()
+
+        def run(job):
+            for label, (x0, y0, x1, y1), _ in job:
+                # The crop keeps every masked pixel inside it (neighbouring components too), so
+                # no text pixel is used as fill source; only this component's pixels are pasted back.
+                started = time.perf_counter()
+                crop, crop_mask = img[y0:y1, x0:x1], mask[y0:y1, x0:x1]
+                own = labels[y0:y1, x0:x1] == label
+                strategy, values = None, None
+                if self.inpaint_options.adaptive:
+                    strategy, values = self._simple_fill(crop, crop_mask, own)
+                if strategy is None:
+                    strategy = strategy_name
+                    values = cv2.inpaint(crop, crop_mask, radius, flags)[own]
+                result[y0:y1, x0:x1][own] = values
+                with image_lock:
+                    entry = per_image.setdefault(strategy, [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        if len(jobs) == 1:
+            run(jobs[0])
+        else:
+            # Components write disjoint pixels of `result`, so the crops can run concurrently
+            list(self._executor().map(run, jobs))
+        breakdown = ", ".join(f"{name} {count} ({sec * 1000:.0f}ms)" for name, (count, sec) in sorted(per_image.items()))
+        logger.info(f"ROI inpainting: {int(labels.max())} components in {len(jobs)} jobs, {(time.perf_counter() - started) * 1000:.0f}ms [{breakdown}]")
+        with self._stats_lock:
+            for name, (count, sec) in per_image.items():
+                entry = self.fill_stats.setdefault(name, [0, 0.0])
+                entry[0] += count
+                entry[1] += sec
+        return result
+
+    def _simple_fill(self, crop, crop_mask, own):
+        """
+        Classifies the ring of known pixels around one component.
+        Returns ("flat" | "gradient", fill values for `own`) or (None, None) for textured borders.
+        """
+        width = self.inpaint_options.ring_width
+        grown = cv2.dilate(own.astype(np.uint8), np.ones((3, 3), np.uint8), iterations=width)
+        ring = (grown > 0) & (crop_mask == 0)
+        ys, xs = np.nonzero(ring)
+        if len(ys) < 8:
+            return None, None
+        colors = crop[ys, xs].astype(np.float32)
+
+        if float(colors.std(axis=0).max()) <= self.inpaint_options.uniform_std:
+            fill = np.median(colors, axis=0)
+            return "flat", np.broadcast_to(fill.round().astype(np.uint8), (int(own.sum()), crop.shape[2]))
+
+        # Plane per channel: c = a*x + b*y + d
+        design = np.column_stack([xs, ys, np.ones_like(xs)]).astype(np.float32)
+        coef, _, _, _ = np.linalg.lstsq(design, colors, rcond=None)
+        rms = float(np.sqrt(((design @ coef - colors) ** 2).mean()))
+        if rms > self.inpaint_options.smooth_rms:
+            return None, None
+        oy, ox = np.nonzero(own)
+        target = np.column_stack([ox, oy, np.ones_like(ox)]).astype(np.float32)
+        return "gradient", np.clip(target @ coef, 0, 255).round().astype(np.uint8)
+
+    def inpaint_stats(self):
+        with self._stats_lock:
+            return {name: {"components": count, "sec": round(sec, 3)} for name, (count, sec) in self.fill_stats.items()}
+
+    @staticmethod
+    def _is_watermark_item(item, width, height):
+        """Same rule as Analyzer.apply_text_exclusion: 'notebooklm' text in the bottom-right corner."""
+        text = str(item.get("text") or "").replace(" ", "").lower()
+        if "notebooklm" not in text or "bbox_px" not in item:
+            return False
+        x, y = item["bbox_px"][:2]
+        return y > height * 0.9 and x > width * 0.8
+
+    def find_watermark(self, img, layout_data=None, from_vision=True):
+        """
+        Locates the watermark locally. With no template yet, learns one from a Gemini-detected
+        watermark in layout_data. In "flagged" mode a slide with vision output is only searched if
+        Gemini reported the watermark; from_vision=False (local detection, no Gemini) is always searched.
+        Returns a layout-like item with 'bbox_px', or None.
+        """
+        if self.watermark is None:
+            return None
+        height, width = img.shape[:2]
+        flagged = None
+        if from_vision:
+            flagged = next((item for item in layout_data or [] if self._is_watermark_item(item, width, height)), None)
+            if flagged is None and self.watermark_mode != "always":
+                return None
+        if not self.watermark.ready and flagged is not None:
+            self.watermark.save_template(img, flagged["bbox_px"])
+        match = self.watermark.find(img)
+        if match is None:
+            return None
+        x, y, w, h, score = match
+        logger.info(f"Watermark matched locally at {[x, y, w, h]} (score {score:.2f})")
+        return {"text": "NotebookLM", "bbox_px": [x, y, w, h], "watermark": True}
+
+    def clean_background(self, image, layout_data, inpainting_model=None, from_vision=True):
+        """
+        Inpaints the text (and watermark) away. `image` is a path or ImageHandle; returns the BGR array.
+        from_vision=False: layout_data came from local detection (no Gemini watermark flag to rely on).
+        """
+        image_path = image.path if isinstance(image, ImageHandle) else image
+        logger.info(f"Processing background for: {image_path}")
+        img = self._read_image(image)
+             
+        # Watermark is erased even when the vision pass missed it (or was skipped)
+        watermark = self.find_watermark(img, layout_data, from_vision)
+        if watermark is not None:
+            layout_data = list(layout_data) + [watermark]
         
-        # Inpaint with Telea, Radius 3 (Standard)
-        clean_bg = cv2.inpaint(img, dilated_mask, 3, cv2.INPAINT_TELEA)
+        dilated_mask = self.build_mask(img, layout_data)
+        
+        # Inpaint with Telea (or NS, per inpaint_options.algorithm), Radius 3 (Standard)
+        return self.inpaint(img, dilated_mask, 3, self.inpaint_flags(inpainting_model))
+
+    def create_clean_background(self, image, layout_data, output_path, inpainting_model=None, from_vision=True):
+        """`image` is a path or the task's ImageHandle (already decoded pixels are reused)."""
+        clean_bg = self.clean_background(image, layout_data, inpainting_model, from_vision)
         
         # Save result
         # Save result using imencode for non-ASCII path support
@@ -53,3 +491,77 @@ class ImageProcessor:
         logger.info(f"Clean background saved to: {output_path}")
         
         return output_path
+
+    def _read_image(self, image):
+        if isinstance(image, ImageHandle):
+            return image.bgr
+        # cv2 handles korean paths poorly, so we read as byte stream
+        img = cv2.imdecode(np.fromfile(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"Could not load image: {image}")
+        return img
+
+    def detect_text_regions(self, img, analysis_long_edge=1600):
+        """
+        Classical-CV text detector (no vision API). Returns layout-like items with 'bbox_px'
+        so the result can be fed straight into create_clean_background.
+
+        1. Background estimate: large median blur; text = small high-contrast detail on top of it
+        2. Otsu on |gray - background| -> ink mask, closed horizontally into words/lines
+        3. Keep line-like components: plausible height, moderate ink density and thin strokes
+           (stroke width from the distance transform is small relative to the line height)
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        height, width = gray.shape[:2]
+        scale = min(1.0, analysis_long_edge / max(height, width))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        h, w = gray.shape[:2]
+
+        ksize = max(15, (int(h * 0.04) // 2) * 2 + 1)
+        background = cv2.medianBlur(gray, ksize)
+        diff = cv2.absdiff(gray, background)
+        _, ink = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Otsu on an almost flat diff picks up noise; require a minimum contrast
+        ink[diff < 24] = 0
+
+        close_w = max(3, int(h * 0.012))
+        lines = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (close_w, 1)))
+        dist = cv2.distanceTransform((ink > 0).astype(np.uint8), cv2.DIST_L2, 3)
+
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+        regions = []
+        for i in range(1, count):
+            x, y, cw, ch, _ = stats[i]
+            if ch < max(4, h * 0.006) or ch > h * 0.12 or cw < 4:
+                continue
+            component = labels[y:y + ch, x:x + cw] == i
+            stroke_pixels = component & (ink[y:y + ch, x:x + cw] > 0)
+            ink_count = int(stroke_pixels.sum())
+            density = ink_count / float(cw * ch)
+            if ink_count == 0 or density < 0.06 or density > 0.75:
+                continue
+            stroke_width = 2.0 * float(dist[y:y + ch, x:x + cw][stroke_pixels].mean())
+            if stroke_width > 0.35 * ch:
+                continue
+            regions.append({
+                "bbox_px": [int(x / scale), int(y / scale), int(np.ceil(cw / scale)), int(np.ceil(ch / scale))]
+            })
+        logger.info(f"Local text detection: {len(regions)} regions")
+        return regions
+
+    def create_clean_background_local(self, image, output_path, inpainting_model=None):
+        """
+        Fully offline background cleaning: classical-CV text detection + inpainting, no Gemini calls.
+        Drop-in for create_clean_background without a layout; returns output_path the same way
+        (detect_text_regions gives the detected regions if they are needed).
+        """
+        # Decode once and share the pixels between detection and inpainting
+        handle = image if isinstance(image, ImageHandle) else ImageHandle(image)
+        try:
+            logger.info(f"Detecting text locally for: {handle.path}")
+            layout_data = self.detect_text_regions(handle.bgr)
+            return self.create_clean_background(handle, layout_data, output_path, inpainting_model, from_vision=False)
+        finally:
+            if handle is not image:
+                handle.release()
@@ -0,0 +1,240 @@
+import io
+import asyncio
+import hashlib
+import mimetypes
+import threading
+from PIL import Image
+from google.genai import types
+from src.image_handle import ImageHandle
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class PreprocessOptions:
+    """
+    Analysis-only downscale + re-encode applied before the image is sent to Gemini.
+    Layout coordinates are normalized 0-1000, so a smaller input does not change the
+    coordinate space; inpainting keeps using the full-resolution file on disk.
+    """
+    FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp"), "png": ("PNG", "image/png")}
+
+    def __init__(self, enabled=False, max_long_edge=1536, format="jpeg", quality=90):
+        self.enabled = enabled
+        self.max_long_edge = max_long_edge
+        self.format = format if format in self.FORMATS else "jpeg"
+        self.quality = quality
+
+    @classmethod
+    def from_settings(cls, conf):
+        conf = conf or {}
+        return cls(
+            enabled=conf.get("enabled", False),
+            max_long_edge=conf.get("max_long_edge", 1536),
+            format=conf.get("format", "jpeg"),
+            quality=conf.get("quality", 90)
+        )
+
+    def signature(self):
+        return f"{self.max_long_edge}:{self.format}:{self.quality}"
+
+    def apply(self, data, img):
+        """Returns (data, mime_type, sent_width, sent_height) for the analysis input."""
+        width, height = img.size
+        scale = min(1.0, self.max_long_edge / max(width, height))
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+        pil_format, mime_type = self.FORMATS[self.format]
+
+        out = img
+        if scale < 1.0:
+            out = img.resize(target, Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and out.mode != "RGB":
+            out = out.convert("RGB")
+        elif out.mode not in ("RGB", "RGBA", "L"):
+            out = out.convert("RGBA")
+
+        buffer = io.BytesIO()
+        if pil_format == "PNG":
+            out.save(buffer, format=pil_format, optimize=True)
+        else:
+            out.save(buffer, format=pil_format, quality=self.quality)
+        encoded = buffer.getvalue()
+        if scale == 1.0 and len(encoded) >= len(data):
+            # Re-encoding a small image did not help; send the original
+            return data, None, width, height
+        return encoded, mime_type, target[0], target[1]
+
+class PreparedImage:
+    """
+    One slide image read/encoded once per task and shared by the detect and refine passes.
+    The Gemini Part is created lazily by the backend on first use and then reused.
+    width/height are always the ORIGINAL image size (used for pixel conversion);
+    sent_width/sent_height describe what was actually sent to the model.
+    `handle` is the task's ImageHandle when the image was prepared from one (decoded pixels for local passes).
+    """
+    def __init__(self, data, mime_type, width, height, source_path=None, sent_size=None, content_hash=None, handle=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.sent_width, self.sent_height = sent_size or (width, height)
+        self.source_path = source_path
+        self.handle = handle
+        self.content_hash = content_hash or hashlib.sha256(data).hexdigest()
+        self.part = None
+        self.remote_name = None
+        self.lock = None
+
+    @property
+    def size_bytes(self):
+        return len(self.data) if self.data is not None else 0
+
+    def __repr__(self):
+        return f"PreparedImage({self.source_path}, {self.width}x{self.height}, {self.size_bytes} bytes)"
+
+def read_prepared_image(image, preprocess=None):
+    """
+    `image` is a path or an ImageHandle. With a handle the file bytes it already holds are used and
+    preprocessing resizes its shared PIL view, so the slide is not read or decoded a second time.
+    """
+    handle = image if isinstance(image, ImageHandle) else None
+    if handle is not None:
+        image_path, data = handle.path, handle.data
+    else:
+        image_path = image
+        with open(image_path, "rb") as f:
+            data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        mime_type = Image.MIME.get(img.format) or mimetypes.guess_type(image_path)[0] or "image/png"
+        if preprocess is None or not preprocess.enabled:
+            return PreparedImage(data, mime_type, width, height, source_path=image_path, content_hash=content_hash, handle=handle)
+        sent_data, sent_mime, sent_w, sent_h = preprocess.apply(data, handle.pil if handle is not None else img)
+
+    if sent_mime is None:
+        return PreparedImage(data, mime_type, width, height, source_path=image_path, content_hash=content_hash, handle=handle)
+    logger.info(f"Preprocessed for analysis: {width}x{height} {len(data) // 1024}KB -> {sent_w}x{sent_h} {len(sent_data) // 1024}KB ({preprocess.format})")
+    # Cache key must change with the preprocessing config, since the model sees different pixels
+    analysis_hash = hashlib.sha256(f"{content_hash}|{preprocess.signature()}".encode("utf-8")).hexdigest()
+    return PreparedImage(sent_data, sent_mime, width, height, source_path=image_path,
+                         sent_size=(sent_w, sent_h), content_hash=analysis_hash, handle=handle)
+
+class InlineImageBackend:
+    """Sends the pre-encoded bytes inline; the same Part object is reused by detect and refine."""
+    name = "inline"
+
+    def __init__(self):
+        self.parts_created = 0
+        self.reuses = 0
+        self.bytes_encoded = 0
+        self._lock = threading.Lock()
+
+    async def get_part(self, prepared):
+        with self._lock:
+            if prepared.part is not None:
+                self.reuses += 1
+                return prepared.part
+            prepared.part = types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+            self.parts_created += 1
+            self.bytes_encoded += prepared.size_bytes
+            return prepared.part
+
+    async def release(self, prepared):
+        prepared.part = None
+        prepared.data = None
+        prepared.handle = None
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "parts_created": self.parts_created,
+            "reuses": self.reuses,
+            "bytes_encoded": self.bytes_encoded,
+        }
+
+class FilesApiImageBackend(InlineImageBackend):
+    """
+    Uploads each prepared image once through the Gemini Files API and references it by URI,
+    so detect + refine transfer the image bytes only once. The remote file is deleted on release.
+    """
+    name = "files_api"
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self.uploads = 0
+
+    async def _upload(self, prepared):
+        uploaded = await self.client.aio.files.upload(
+            file=io.BytesIO(prepared.data),
+            config=types.UploadFileConfig(mime_type=prepared.mime_type)
+        )
+        return uploaded.name, uploaded.uri, uploaded.mime_type or prepared.mime_type
+
+    async def get_part(self, prepared):
+        # Per-image lock: concurrent detect/refine of the same slide upload once, other slides are not blocked
+        if prepared.lock is None:
+            prepared.lock = asyncio.Lock()
+        async with prepared.lock:
+            if prepared.part is not None:
+                self.reuses += 1
+                return prepared.part
+            name, uri, mime_type = await self._upload(prepared)
+            prepared.remote_name = name
+            prepared.part = types.Part.from_uri(file_uri=uri, mime_type=mime_type)
+            self.uploads += 1
+            self.parts_created += 1
+            self.bytes_encoded += prepared.size_bytes
+            return prepared.part
+
+    async def _delete(self, name):
+        await self.client.aio.files.delete(name=name)
+
+    async def release(self, prepared):
+        if prepared.remote_name:
+            try:
+                await self._delete(prepared.remote_name)
+            except Exception as e:
+                logger.warning(f"Failed to delete uploaded image {prepared.remote_name}: {e}")
+            prepared.remote_name = None
+        await super().release(prepared)
+
+    def stats(self):
+        data = super().stats()
+        data["uploads"] = self.uploads
+        return data
+
+class LocalFilesBackend(FilesApiImageBackend):
+    """
+    Offline stand-in for FilesApiImageBackend: same upload-once / reference / delete lifecycle,
+    but "uploads" go to an in-memory store and the Part carries the bytes inline.
+    Used for testing the reuse path without network access.
+    """
+    name = "local"
+
+    def __init__(self, client=None):
+        super().__init__(client)
+        self.store = {}
+
+    async def _upload(self, prepared):
+        name = f"files/local-{prepared.content_hash[:16]}"
+        self.store[name] = (prepared.data, prepared.mime_type)
+        return name, f"local://{name}", prepared.mime_type
+
+    async def get_part(self, prepared):
+        part = await super().get_part(prepared)
+        if part.file_data is not None:
+            # Resolve the local "URI" back to inline bytes so the request works offline
+            data, mime_type = self.store[prepared.remote_name]
+            prepared.part = types.Part.from_bytes(data=data, mime_type=mime_type)
+        return prepared.part
+
+    async def _delete(self, name):
+        self.store.pop(name, None)
+
+def create_image_backend(name, client=None):
+    if name == "files_api":
+        return FilesApiImageBackend(client)
+    if name == "local":
+        return LocalFilesBackend(client)
+    return InlineImageBackend()
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+from src.utils import get_logger, ensure_directory
+
+logger = get_logger(__name__)
+
+class LayoutCache:
+    """
+    Content-addressed on-disk cache for Gemini layout results.
+    Entries are keyed by (image content hash, model name, prompt version, refine flag and, for refine,
+    the hash of the layout being refined)
+    and evicted least-recently-used first once the cache exceeds max_size_mb.
+    """
+    def __init__(self, cache_dir, max_size_mb=500, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        ensure_directory(self.cache_dir)
+        self._total_size = sum(size for _, size, _ in self._scan_entries())
+
+    @staticmethod
+    def hash_file(path):
+        """SHA-256 of the raw file bytes (identical PNGs share one entry regardless of filename)."""
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def hash_layout(layout):
+        """SHA-256 of a layout's canonical JSON (key order and whitespace do not matter)."""
+        canonical = json.dumps(layout, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_key(image_hash, model_name, prompt_version, refined, input_hash=None):
+        raw = f"{image_hash}|{model_name}|{prompt_version}|{'refined' if refined else 'initial'}"
+        if input_hash:
+            raw += f"|{input_hash}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _scan_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            # Touch mtime so LRU eviction keeps recently used entries
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        path = self._entry_path(key)
+        payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            ensure_directory(os.path.dirname(path))
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Layout cache write failed: {e}")
+                return
+            self._total_size += len(payload) - old_size
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Called with lock held. Drop oldest entries until we are under 90% of the limit.
+        target = int(self.max_size_bytes * 0.9)
+        entries = sorted(self._scan_entries(), key=lambda e: e[2])
+        self._total_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._total_size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_size -= size
+            self.evictions += 1
+        logger.info(f"Layout cache evicted entries. Size now {self._total_size / (1024 * 1024):.1f} MB")
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._scan_entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_mb": round(self._total_size / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_size_bytes / (1024 * 1024), 2),
+        }
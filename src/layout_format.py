@@ -0,0 +1,143 @@
+import json
+from google.genai import types
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+# Compact positional row: [ymin, xmin, ymax, xmax, color, weight, align, text]
+COMPACT_FIELDS = ("ymin", "xmin", "ymax", "xmax", "color", "weight", "align", "text")
+
+# response_schema for compact rows. Gemini schemas have no per-position item types,
+# so each row is an 8-item array of numbers/strings and positions are validated on expansion.
+COMPACT_LAYOUT_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.ARRAY,
+        min_items=len(COMPACT_FIELDS),
+        max_items=len(COMPACT_FIELDS),
+        items=types.Schema(any_of=[
+            types.Schema(type=types.Type.INTEGER),
+            types.Schema(type=types.Type.STRING),
+        ]),
+    ),
+)
+
+_WEIGHTS = {"b": "bold", "bold": "bold", "n": "normal", "normal": "normal"}
+_ALIGNS = {"l": "left", "left": "left", "c": "center", "center": "center", "r": "right", "right": "right"}
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("bool is not a coordinate")
+    return int(round(float(value)))
+
+def expand_compact_layout(rows):
+    """Expands compact rows into the regular layout format ({text, bbox, style}). Malformed rows are skipped."""
+    layout = []
+    skipped = 0
+    for row in rows:
+        if isinstance(row, dict):
+            # Model ignored the compact format for this row; keep it if it already looks right
+            if "bbox" in row:
+                layout.append(row)
+            else:
+                skipped += 1
+            continue
+        if not isinstance(row, (list, tuple)) or len(row) < len(COMPACT_FIELDS):
+            skipped += 1
+            continue
+        try:
+            bbox = [_to_int(v) for v in row[:4]]
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        color, weight, align = (str(v).strip() for v in row[4:7])
+        # Extra trailing items mean the text itself contained the separator; rejoin it
+        text = row[7] if len(row) == len(COMPACT_FIELDS) else ", ".join(str(v) for v in row[7:])
+        layout.append({
+            "text": str(text),
+            "bbox": bbox,
+            "style": {
+                "color": color if color.startswith("#") else f"#{color}",
+                "font_weight": _WEIGHTS.get(weight.lower(), "normal"),
+                "align": _ALIGNS.get(align.lower(), "left"),
+            }
+        })
+    if skipped:
+        logger.warning(f"Compact layout: skipped {skipped} malformed rows")
+    return layout
+
+def compact_layout(layout):
+    """Inverse of expand_compact_layout, used to send an existing layout back (refine) in compact form."""
+    rows = []
+    for item in layout:
+        style = item.get("style") or {}
+        rows.append(list(item.get("bbox", [0, 0, 0, 0])) + [
+            style.get("color", "#000000"),
+            style.get("font_weight", "normal"),
+            style.get("align", "left"),
+            item.get("text", ""),
+        ])
+    return rows
+
+def _strip_fences(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+def _salvage_truncated(text):
+    """
+    Cuts a truncated JSON array/object back to its last complete top-level element and closes it.
+    Returns the repaired string, or None if nothing complete was found.
+    """
+    start = min([i for i in (text.find("["), text.find("{")) if i >= 0], default=-1)
+    if start < 0:
+        return None
+    stack = []
+    in_string = False
+    escaped = False
+    checkpoint = None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append(ch)
+        elif ch in "]}":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                # Top-level container closed normally; nothing to salvage beyond this
+                return text[start:i + 1]
+            if len(stack) == 1:
+                checkpoint = i + 1
+    if checkpoint is None:
+        return None
+    return text[start:checkpoint] + ("]" if stack[0] == "[" else "}")
+
+def parse_json_tolerant(text):
+    """
+    json.loads with recovery for the usual failure modes: markdown fences, leading/trailing chatter
+    and output truncated mid-element (max tokens). Returns (data, salvaged). Raises ValueError if unrecoverable.
+    """
+    if text is None:
+        raise ValueError("empty response")
+    cleaned = _strip_fences(text)
+    try:
+        return json.loads(cleaned), False
+    except ValueError as e:
+        repaired = _salvage_truncated(cleaned)
+        if repaired is None:
+            raise e
+        return json.loads(repaired), True
@@ -15,7 +15,8 @@ class PPTXGenerator:
         self.width_inches = width_inches
         self.height_inches = height_inches
 
-    def _hex_to_rgb(self, hex_color):
+    @staticmethod
+    def _hex_to_rgb(hex_color):
         """Converts hex string (e.g., '#FF0000' or '#F00') to RGBColor object."""
         try:
             hex_color = hex_color.lstrip('#')
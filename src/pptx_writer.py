@@ -0,0 +1,316 @@
+import os
+import re
+import hashlib
+import zipfile
+import posixpath
+from xml.sax.saxutils import escape, quoteattr
+import pptx
+from lxml import etree
+from pptx.util import Inches, Pt
+from src.pptx_generator import PPTXGenerator
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(pptx.__file__), "templates", "default.pptx")
+
+NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "ct": "http://schemas.openxmlformats.org/package/2006/content-types",
+}
+RT_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+RT_SLIDE_LAYOUT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slideLayout"
+RT_SLIDE_MASTER = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slideMaster"
+RT_IMAGE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+RT_NOTES_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+IMAGE_TYPES = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif", "bmp": "image/bmp", "tiff": "image/tiff"}
+
+XML_HEADER = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+SLIDE_OPEN = (
+    XML_HEADER +
+    '<p:sld xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>'
+)
+SLIDE_CLOSE = '</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>'
+PICTURE = (
+    '<p:pic><p:nvPicPr><p:cNvPr id="{id}" name="Picture {n}" descr={descr}/><p:cNvPicPr><a:picLocks noChangeAspect="1"/>'
+    '</p:cNvPicPr><p:nvPr/></p:nvPicPr><p:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></p:blipFill>'
+    '<p:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm><a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr></p:pic>'
+)
+TEXTBOX = (
+    '<p:sp><p:nvSpPr><p:cNvPr id="{id}" name="TextBox {n}"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+    '<p:spPr><a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm><a:prstGeom prst="rect"><a:avLst/></a:prstGeom><a:noFill/></p:spPr>'
+    '<p:txBody><a:bodyPr wrap="square"><a:spAutoFit/></a:bodyPr><a:lstStyle/><a:p>{ppr}{runs}</a:p></p:txBody></p:sp>'
+)
+SLIDE_RELS = (
+    XML_HEADER +
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="' + RT_SLIDE_LAYOUT + '" Target="../slideLayouts/{layout}"/>{image}</Relationships>'
+)
+IMAGE_REL = '<Relationship Id="rId2" Type="' + RT_IMAGE + '" Target="../media/{name}"/>'
+ALIGNMENTS = {"center": "ctr", "right": "r"}
+_CTRL_CHARS = re.compile(r"([\x00-\x08\x0B-\x1F])")
+
+def _image_ext(head):
+    if head.startswith(b"\x89PNG"):
+        return "png"
+    if head.startswith(b"\xff\xd8"):
+        return "jpg"
+    if head[:3] == b"GIF":
+        return "gif"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+class FastPPTXWriter:
+    """
+    Drop-in alternative to PPTXGenerator for large decks. Slide XML is rendered from string templates
+    (the same markup python-pptx produces for a full-slide picture plus styled textboxes) and each slide,
+    its rels and its background are streamed into the zip as soon as add_slide is called, so memory does
+    not grow with the deck. Master, layouts and theme are copied from python-pptx's default template;
+    presentation.xml, its rels and [Content_Types].xml are written last. Identical backgrounds are stored once.
+    add_slides_from_pptx splices slides of existing decks built on the same template (per-slide exports).
+    """
+    def __init__(self, output_path, width_inches=13.333, height_inches=7.5, template_path=DEFAULT_TEMPLATE):
+        self.output_path = output_path
+        self.width_inches = width_inches
+        self.height_inches = height_inches
+        self.slide_width = Inches(width_inches)
+        self.slide_height = Inches(height_inches)
+        self.template_path = template_path
+        self.slide_count = 0
+        self._media = {}  # sha1 -> media file name
+        self._image_exts = set()
+        self._tmp_path = output_path + ".tmp"
+        self._zip = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_DEFLATED)
+        self._copy_template()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        elif self._zip is not None:
+            self.save()
+
+    def _copy_template(self):
+        finalized = {"[Content_Types].xml", "ppt/presentation.xml", "ppt/_rels/presentation.xml.rels"}
+        with zipfile.ZipFile(self.template_path) as template:
+            self._content_types = etree.fromstring(template.read("[Content_Types].xml"))
+            self._presentation = etree.fromstring(template.read("ppt/presentation.xml"))
+            self._presentation_rels = etree.fromstring(template.read("ppt/_rels/presentation.xml.rels"))
+            for info in template.infolist():
+                if info.filename not in finalized:
+                    self._zip.writestr(info.filename, template.read(info.filename))
+            self._layouts = {posixpath.basename(name) for name in template.namelist()
+                             if name.startswith("ppt/slideLayouts/") and name.endswith(".xml")}
+            self._blank_layout = self._find_blank_layout(template)
+
+    def _find_blank_layout(self, template, index=6):
+        """Same layout PPTXGenerator uses (prs.slide_layouts[6]): 7th entry of the master's sldLayoutIdLst."""
+        master_rel = self._presentation_rels.find(f"rel:Relationship[@Type='{RT_SLIDE_MASTER}']", NS)
+        master_path = posixpath.normpath(posixpath.join("ppt", master_rel.get("Target")))
+        master = etree.fromstring(template.read(master_path))
+        master_dir, master_name = posixpath.split(master_path)
+        master_rels = etree.fromstring(template.read(f"{master_dir}/_rels/{master_name}.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in master_rels.findall("rel:Relationship", NS)}
+        layout_ids = master.findall("p:sldLayoutIdLst/p:sldLayoutId", NS)
+        rid = layout_ids[min(index, len(layout_ids) - 1)].get(f"{{{NS['r']}}}id")
+        return posixpath.basename(targets[rid])
+
+    def _add_media(self, bg_image_path):
+        """Returns the media file name for the image, writing it only the first time it is seen."""
+        with open(bg_image_path, "rb") as f:
+            data = f.read()
+        return self._add_media_data(data, bg_image_path)
+
+    def _add_media_data(self, data, source):
+        ext = _image_ext(data[:8])
+        if ext is None:
+            raise ValueError(f"Unsupported background image format: {source}")
+        digest = hashlib.sha1(data).hexdigest()
+        name = self._media.get(digest)
+        if name is None:
+            name = f"image{len(self._media) + 1}.{ext}"
+            # Already-compressed image data: store, do not deflate again
+            self._zip.writestr(f"ppt/media/{name}", data, compress_type=zipfile.ZIP_STORED)
+            self._media[digest] = name
+            self._image_exts.add(ext)
+        return name
+
+    @staticmethod
+    def _runs(text):
+        # Same rules as python-pptx's paragraph.text: \n and \v become a:br, empty runs are dropped
+        parts = []
+        for idx, segment in enumerate(re.split("\n|\v", text)):
+            if idx > 0:
+                parts.append("<a:br/>")
+            if segment:
+                segment = _CTRL_CHARS.sub(lambda m: "_x%04X_" % ord(m.group(1)), segment)
+                parts.append(f"<a:r><a:t>{escape(segment)}</a:t></a:r>")
+        return "".join(parts)
+
+    def _paragraph_properties(self, item, bbox, scale_x, font_family):
+        x_px, y_px, w_px, h_px = bbox
+        style = item.get('style', {})
+        if 'normalized_font_size_px' in item:
+            font_size_px = item['normalized_font_size_px']
+        else:
+            font_size_px = h_px * 0.75
+        sz = Pt(font_size_px * scale_x * 72).centipoints
+        if not 100 <= sz <= 400000:
+            # python-pptx rejects the size and leaves the paragraph unstyled
+            return "<a:pPr><a:defRPr/></a:pPr>"
+        color = str(PPTXGenerator._hex_to_rgb(style.get('color', '#000000')))
+        bold = ' b="1"' if style.get('font_weight') == 'bold' else ""
+        algn = ALIGNMENTS.get(style.get('align', 'left'), "l")
+        return (f'<a:pPr algn="{algn}"><a:defRPr sz="{sz}"{bold}><a:solidFill><a:srgbClr val="{color}"/></a:solidFill>'
+                f'<a:latin typeface={quoteattr(font_family)}/></a:defRPr></a:pPr>')
+
+    def add_slide(self, layout_data, bg_image_path, original_width_px, original_height_px, font_family="Malgun Gothic"):
+        """Same arguments and output as PPTXGenerator.add_slide; the slide is written immediately."""
+        self.slide_count += 1
+        shapes = []
+        shape_id = 2
+        image_rel = ""
+        if bg_image_path and os.path.exists(bg_image_path):
+            try:
+                name = self._add_media(bg_image_path)
+                shapes.append(PICTURE.format(id=shape_id, n=shape_id - 1, descr=quoteattr(os.path.basename(bg_image_path)),
+                                             rid="rId2", cx=self.slide_width, cy=self.slide_height))
+                image_rel = IMAGE_REL.format(name=name)
+                shape_id += 1
+            except Exception as e:
+                logger.error(f"Failed to add background image to PPTX: {e}")
+
+        scale_x = self.width_inches / original_width_px
+        scale_y = self.height_inches / original_height_px
+        for item in layout_data:
+            try:
+                bbox = item.get('bbox_px')
+                if not bbox: continue
+                x_px, y_px, w_px, h_px = bbox
+                shapes.append(TEXTBOX.format(
+                    id=shape_id, n=shape_id - 1,
+                    x=Inches(x_px * scale_x), y=Inches(y_px * scale_y),
+                    cx=Inches(w_px * scale_x), cy=Inches(h_px * scale_y),
+                    ppr=self._paragraph_properties(item, bbox, scale_x, font_family),
+                    runs=self._runs(item.get('text', ''))
+                ))
+                shape_id += 1
+            except Exception as e:
+                logger.error(f"Error adding text to PPTX: {e}")
+
+        n = self.slide_count
+        self._zip.writestr(f"ppt/slides/slide{n}.xml", SLIDE_OPEN + "".join(shapes) + SLIDE_CLOSE)
+        self._zip.writestr(f"ppt/slides/_rels/slide{n}.xml.rels", SLIDE_RELS.format(layout=self._blank_layout, image=image_rel))
+
+    def _read_slides(self, source, presentation_rels):
+        """(slide_xml, [(rid, type, target_or_data, external)]) for each slide of a package, in deck order."""
+        presentation = etree.fromstring(source.read("ppt/presentation.xml"))
+        sld_sz = presentation.find("p:sldSz", NS)
+        if (int(sld_sz.get("cx")), int(sld_sz.get("cy"))) != (self.slide_width, self.slide_height):
+            raise ValueError(f"Slide size {sld_sz.get('cx')}x{sld_sz.get('cy')} does not match the deck")
+        targets = {rel.get("Id"): rel.get("Target") for rel in presentation_rels.findall("rel:Relationship", NS)}
+        slides = []
+        for sld_id in presentation.findall("p:sldIdLst/p:sldId", NS):
+            slide_path = posixpath.normpath(posixpath.join("ppt", targets[sld_id.get(f"{{{NS['r']}}}id")]))
+            slide_dir, slide_name = posixpath.split(slide_path)
+            rels_path = f"{slide_dir}/_rels/{slide_name}.rels"
+            rels = []
+            if rels_path in source.namelist():
+                for rel in etree.fromstring(source.read(rels_path)).findall("rel:Relationship", NS):
+                    rid, rel_type, target = rel.get("Id"), rel.get("Type"), rel.get("Target")
+                    if rel.get("TargetMode") == "External":
+                        rels.append((rid, rel_type, target, True))
+                    elif rel_type == RT_SLIDE_LAYOUT:
+                        rels.append((rid, rel_type, posixpath.basename(target), False))
+                    elif rel_type == RT_IMAGE:
+                        rels.append((rid, rel_type, source.read(posixpath.normpath(posixpath.join(slide_dir, target))), False))
+                    elif rel_type == RT_NOTES_SLIDE:
+                        continue  # notes point back at their own slide; not carried over
+                    else:
+                        raise ValueError(f"Unsupported slide relationship: {rel_type}")
+            slides.append((source.read(slide_path), rels))
+        return slides
+
+    def add_slides_from_pptx(self, pptx_path):
+        """
+        Splices the slides of an existing deck (e.g. a per-slide PPTXGenerator output built on the same
+        template) into this one: slide XML is copied verbatim, images are deduplicated into this deck's
+        media and layouts are re-pointed at this deck's layouts of the same name.
+        Raises ValueError (nothing written) if the deck cannot be merged as-is. Returns the slide count.
+        """
+        with zipfile.ZipFile(pptx_path) as source:
+            presentation_rels = etree.fromstring(source.read("ppt/_rels/presentation.xml.rels"))
+            slides = self._read_slides(source, presentation_rels)
+
+        for slide_xml, rels in slides:
+            self.slide_count += 1
+            rel_xml = []
+            for rid, rel_type, target, external in rels:
+                if external:
+                    rel_xml.append(f'<Relationship Id={quoteattr(rid)} Type={quoteattr(rel_type)} Target={quoteattr(target)} TargetMode="External"/>')
+                    continue
+                if rel_type == RT_SLIDE_LAYOUT:
+                    target = f"../slideLayouts/{target if target in self._layouts else self._blank_layout}"
+                else:
+                    target = f"../media/{self._add_media_data(target, pptx_path)}"
+                rel_xml.append(f'<Relationship Id={quoteattr(rid)} Type={quoteattr(rel_type)} Target={quoteattr(target)}/>')
+            n = self.slide_count
+            self._zip.writestr(f"ppt/slides/slide{n}.xml", slide_xml)
+            self._zip.writestr(f"ppt/slides/_rels/slide{n}.xml.rels",
+                               XML_HEADER + f'<Relationships xmlns="{NS["rel"]}">' + "".join(rel_xml) + "</Relationships>")
+        return len(slides)
+
+    def _finalize_parts(self):
+        ct = self._content_types
+        defaults = {d.get("Extension").lower() for d in ct.findall("ct:Default", NS)}
+        for ext in sorted(self._image_exts - defaults):
+            etree.SubElement(ct, f"{{{NS['ct']}}}Default", Extension=ext, ContentType=IMAGE_TYPES[ext])
+        for n in range(1, self.slide_count + 1):
+            etree.SubElement(ct, f"{{{NS['ct']}}}Override", PartName=f"/ppt/slides/slide{n}.xml", ContentType=CT_SLIDE)
+
+        rels = self._presentation_rels
+        next_rid = max(int(r.get("Id")[3:]) for r in rels.findall("rel:Relationship", NS)) + 1
+        presentation = self._presentation
+        sld_id_lst = presentation.find("p:sldIdLst", NS)
+        if sld_id_lst is None:
+            sld_id_lst = etree.Element(f"{{{NS['p']}}}sldIdLst")
+            presentation.find("p:sldMasterIdLst", NS).addnext(sld_id_lst)
+        for n in range(1, self.slide_count + 1):
+            rid = f"rId{next_rid + n - 1}"
+            etree.SubElement(rels, f"{{{NS['rel']}}}Relationship", Id=rid, Type=RT_SLIDE, Target=f"slides/slide{n}.xml")
+            etree.SubElement(sld_id_lst, f"{{{NS['p']}}}sldId", {"id": str(255 + n), f"{{{NS['r']}}}id": rid})
+        sld_sz = presentation.find("p:sldSz", NS)
+        sld_sz.set("cx", str(self.slide_width))
+        sld_sz.set("cy", str(self.slide_height))
+
+        def serialize(element):
+            return etree.tostring(element, xml_declaration=True, encoding="UTF-8", standalone=True)
+        self._zip.writestr("[Content_Types].xml", serialize(ct))
+        self._zip.writestr("ppt/presentation.xml", serialize(presentation))
+        self._zip.writestr("ppt/_rels/presentation.xml.rels", serialize(rels))
+
+    def save(self, output_path=None):
+        self._finalize_parts()
+        self._zip.close()
+        self._zip = None
+        os.replace(self._tmp_path, output_path or self.output_path)
+        logger.info(f"PPTX saved to {output_path or self.output_path} ({self.slide_count} slides, {len(self._media)} images)")
+
+    def abort(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
@@ -0,0 +1,302 @@
+import asyncio
+import random
+import threading
+import time
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+# --- Structured error classes (task runner can act on these) ---
+
+class GeminiError(Exception):
+    retryable = False
+
+    def __init__(self, message, model_name=None, cause=None):
+        super().__init__(message)
+        self.model_name = model_name
+        self.cause = cause
+
+class TransientGeminiError(GeminiError):
+    """5xx, connection resets and other failures that are worth retrying."""
+    retryable = True
+
+class RateLimitError(TransientGeminiError):
+    """429 / RESOURCE_EXHAUSTED."""
+
+class GeminiTimeoutError(TransientGeminiError):
+    """Per-attempt timeout or DEADLINE_EXCEEDED."""
+
+class ResponseParseError(GeminiError):
+    """The model answered but the payload was not valid layout JSON (often fixed by a retry)."""
+    retryable = True
+
+class ModelNotFoundError(GeminiError, ValueError):
+    """Configured model id does not exist (settings.json needs updating)."""
+
+class InvalidRequestError(GeminiError):
+    """400/401/403: bad request, invalid API key or permission problem."""
+
+class CircuitOpenError(GeminiError):
+    """The per-model circuit breaker is open; fail fast without calling the backend."""
+
+def classify_error(e, model_name=None):
+    """Maps a raw SDK/transport exception onto the GeminiError hierarchy."""
+    if isinstance(e, GeminiError):
+        return e
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+        return GeminiTimeoutError(f"Gemini 응답 시간 초과 ({model_name})", model_name, e)
+
+    error_msg = str(e)
+    code = getattr(e, "code", None)
+    if not isinstance(code, int):
+        code = None
+
+    if code == 429 or "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
+        return RateLimitError(f"Gemini 요청 한도 초과 (429): {error_msg[:200]}", model_name, e)
+    if code == 404 or "404" in error_msg or "Not Found" in error_msg or "Publisher Model" in error_msg:
+        return ModelNotFoundError(f"오류: 설정된 모델 '{model_name}'을 찾을 수 없습니다. settings.json에서 모델명을 최신으로 변경해주세요.", model_name, e)
+    if "DEADLINE_EXCEEDED" in error_msg or "timed out" in error_msg.lower():
+        return GeminiTimeoutError(f"Gemini 응답 시간 초과: {error_msg[:200]}", model_name, e)
+    if code is not None and 400 <= code < 500:
+        return InvalidRequestError(f"Gemini 요청 오류 ({code}): {error_msg[:200]}", model_name, e)
+    # 5xx, UNAVAILABLE, connection errors and anything unknown: assume transient
+    return TransientGeminiError(f"Gemini 일시적 오류: {error_msg[:200]}", model_name, e)
+
+# --- Retry policy / budget / circuit breaker ---
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=20.0, timeout=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    def backoff(self, attempt, error):
+        """Full-jitter exponential backoff. Rate limits start from a larger base."""
+        base = self.base_delay * (2 if isinstance(error, RateLimitError) else 1)
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of traffic so a backend outage
+    does not turn into a retry storm. Every call deposits `ratio` tokens, every retry spends one.
+    """
+    def __init__(self, ratio=0.2, min_tokens=10.0, max_tokens=50.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # allow() result for the single half-open probe; the caller must settle it with
+    # record_success/record_failure, or release_probe if the attempt ends without a verdict
+    PROBE = "probe"
+
+    def __init__(self, model_name, failure_threshold=5, reset_timeout=30.0):
+        self.model_name = model_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through
+                self._probe_in_flight = True
+                return self.PROBE
+            return False
+
+    def release_probe(self):
+        """The probe ended without telling us anything (cancelled): let the next call probe instead."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit closed for {self.model_name}")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit OPEN for {self.model_name} after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+class ResilientCaller:
+    """
+    Shared wrapper for every Gemini call: jittered exponential backoff, a global retry budget
+    and a circuit breaker per model. Raw exceptions are converted to GeminiError subclasses.
+    """
+    def __init__(self, policy=None, budget=None, failure_threshold=5, reset_timeout=30.0):
+        self.policy = policy or RetryPolicy()
+        self.budget = budget or RetryBudget()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "retry_delay_sec": 0.0,
+            "budget_exhausted": 0,
+            "circuit_rejections": 0,
+            "fallbacks": 0,
+            "salvaged_responses": 0,
+            "errors": {},
+        }
+
+    def breaker(self, model_name):
+        with self._lock:
+            if model_name not in self._breakers:
+                self._breakers[model_name] = CircuitBreaker(model_name, self.failure_threshold, self.reset_timeout)
+            return self._breakers[model_name]
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def _count_error(self, error):
+        with self._lock:
+            name = type(error).__name__
+            self.metrics["errors"][name] = self.metrics["errors"].get(name, 0) + 1
+
+    def record_fallback(self, stage):
+        self._count("fallbacks")
+        logger.warning(f"Gemini {stage} fell back to previous data")
+
+    def record_salvage(self):
+        self._count("salvaged_responses")
+
+    def _before_attempt(self, model_name, breaker):
+        """Returns True if this attempt is the breaker's half-open probe."""
+        allowed = breaker.allow()
+        if not allowed:
+            self._count("circuit_rejections")
+            raise CircuitOpenError(f"Gemini 모델 '{model_name}' 호출이 일시 중단되었습니다 (연속 실패로 차단됨). 잠시 후 다시 시도해주세요.", model_name)
+        return allowed == CircuitBreaker.PROBE
+
+    def _on_failure(self, model_name, breaker, error, attempt):
+        """Returns the backoff delay if the call should be retried, otherwise None."""
+        self._count_error(error)
+        # Parse errors mean the backend is healthy; only backend failures trip the breaker
+        if isinstance(error, TransientGeminiError):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if not error.retryable or attempt + 1 >= self.policy.max_attempts:
+            return None
+        if breaker.state == CircuitBreaker.OPEN:
+            # This failure tripped the breaker; fail now instead of sleeping into a rejection
+            return None
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            logger.warning(f"Retry budget exhausted; not retrying {model_name}: {error}")
+            return None
+        delay = self.policy.backoff(attempt, error)
+        self._count("retries")
+        self._count("retry_delay_sec", delay)
+        logger.warning(f"Gemini call failed ({type(error).__name__}), retry {attempt + 1}/{self.policy.max_attempts - 1} in {delay:.1f}s: {error}")
+        return delay
+
+    async def call_async(self, model_name, attempt_fn):
+        """
+        attempt_fn: zero-argument coroutine factory performing one attempt.
+        The per-attempt timeout (policy.timeout) is applied by the caller around the network
+        request itself, so time spent waiting for a concurrency slot does not count.
+        """
+        breaker = self.breaker(model_name)
+        self._count("calls")
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            probe = self._before_attempt(model_name, breaker)
+            try:
+                result = await attempt_fn()
+            except Exception as e:
+                error = classify_error(e, model_name)
+                delay = self._on_failure(model_name, breaker, error, attempt)
+                if delay is None:
+                    self._count("failures")
+                    raise error from e
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (/cancel, losing hedge, batch cancellation) or interrupted: no verdict
+                # on the backend, but a half-open probe slot must not stay taken forever
+                if probe:
+                    breaker.release_probe()
+                raise
+            breaker.record_success()
+            self._count("successes")
+            return result
+
+    def call(self, model_name, attempt_fn):
+        """Blocking variant for the sync Analyzer path."""
+        breaker = self.breaker(model_name)
+        self._count("calls")
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            probe = self._before_attempt(model_name, breaker)
+            try:
+                result = attempt_fn()
+            except Exception as e:
+                error = classify_error(e, model_name)
+                delay = self._on_failure(model_name, breaker, error, attempt)
+                if delay is None:
+                    self._count("failures")
+                    raise error from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                if probe:
+                    breaker.release_probe()
+                raise
+            breaker.record_success()
+            self._count("successes")
+            return result
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.metrics)
+            data["errors"] = dict(self.metrics["errors"])
+            data["retry_delay_sec"] = round(self.metrics["retry_delay_sec"], 2)
+            data["retry_budget_tokens"] = round(self.budget.tokens, 2)
+            data["circuits"] = {name: b.state for name, b in self._breakers.items()}
+        return data
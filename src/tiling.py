@@ -0,0 +1,186 @@
+import io
+import contextlib
+import math
+import threading
+from PIL import Image
+from src.image_upload import PreparedImage
+from src.utils import get_logger
+
+logger = get_logger(__name__)
+
+class LayoutTiler:
+    """
+    Tiled analysis for tall or very large images (e.g. NotebookLM infographics).
+    The image is split into overlapping tiles along its long axis, each tile is detected separately
+    (concurrently, through the normal limiter), tile coordinates are remapped to the full image and
+    duplicates across seams are merged with IoU / containment non-max suppression.
+    """
+    def __init__(self, enabled=False, tile_size=1536, overlap=0.15, min_long_edge=2400, min_aspect=1.6,
+                 max_tiles=8, iou_threshold=0.5):
+        self.enabled = enabled
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.min_long_edge = min_long_edge
+        self.min_aspect = min_aspect
+        self.max_tiles = max_tiles
+        self.iou_threshold = iou_threshold
+        self._lock = threading.Lock()
+        self.images_tiled = 0
+        self.tiles_analyzed = 0
+        self.boxes_before_merge = 0
+        self.boxes_after_merge = 0
+
+    @classmethod
+    def from_settings(cls, conf):
+        conf = conf or {}
+        return cls(
+            enabled=conf.get("enabled", False),
+            tile_size=conf.get("tile_size", 1536),
+            overlap=conf.get("overlap", 0.15),
+            min_long_edge=conf.get("min_long_edge", 2400),
+            min_aspect=conf.get("min_aspect", 1.6),
+            max_tiles=conf.get("max_tiles", 8),
+            iou_threshold=conf.get("iou_threshold", 0.5)
+        )
+
+    def should_tile(self, width, height):
+        if not self.enabled:
+            return False
+        long_edge, short_edge = max(width, height), min(width, height)
+        return long_edge >= self.min_long_edge and long_edge / max(1, short_edge) >= self.min_aspect
+
+    def _spans(self, length, tile):
+        if length <= tile:
+            return [(0, length)]
+        overlap_px = int(tile * self.overlap)
+        count = math.ceil((length - overlap_px) / (tile - overlap_px))
+        step = (length - tile) / (count - 1)
+        return [(int(round(i * step)), int(round(i * step)) + tile) for i in range(count)]
+
+    def plan(self, width, height):
+        """Returns tile rectangles (x0, y0, x1, y1) in pixels, at most max_tiles."""
+        tile = self.tile_size
+        while True:
+            long_spans = self._spans(max(width, height), tile)
+            # The short axis is only split when it is itself much larger than a tile
+            short = min(width, height)
+            short_spans = self._spans(short, tile) if short > 2 * tile else [(0, short)]
+            if len(long_spans) * len(short_spans) <= self.max_tiles:
+                break
+            tile = int(tile * 1.25)
+        if height >= width:
+            return [(x0, y0, x1, y1) for (y0, y1) in long_spans for (x0, x1) in short_spans]
+        return [(x0, y0, x1, y1) for (x0, x1) in long_spans for (y0, y1) in short_spans]
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _open_source(prepared):
+        if prepared.handle is not None:
+            # Decoded pixels of the task's ImageHandle; owned (and released) by the task
+            yield prepared.handle.pil
+            return
+        with Image.open(prepared.source_path if prepared.source_path else io.BytesIO(prepared.data)) as img:
+            img.load()
+            yield img
+
+    def crop_tiles(self, prepared):
+        """
+        Crops tiles from the full-resolution source (not the downscaled analysis input) so small
+        labels keep their pixels. Returns [(rect, PreparedImage)].
+        """
+        tiles = []
+        with self._open_source(prepared) as img:
+            rects = self.plan(*img.size)
+            for i, rect in enumerate(rects):
+                buffer = io.BytesIO()
+                crop = img.crop(rect)
+                crop.save(buffer, format="PNG")
+                name = f"{prepared.source_path}#tile{i}" if prepared.source_path else f"tile{i}"
+                tiles.append((rect, PreparedImage(buffer.getvalue(), "image/png", crop.width, crop.height, source_path=name)))
+        return tiles
+
+    @staticmethod
+    def _remap(item, rect, width, height):
+        """Tile-normalized bbox -> full-image-normalized bbox. Also flags boxes cut by an interior tile edge."""
+        x0, y0, x1, y1 = rect
+        tw, th = x1 - x0, y1 - y0
+        ymin, xmin, ymax, xmax = item["bbox"]
+        margin = 8  # normalized units of the tile
+        truncated = (
+            (ymin <= margin and y0 > 0) or (ymax >= 1000 - margin and y1 < height) or
+            (xmin <= margin and x0 > 0) or (xmax >= 1000 - margin and x1 < width)
+        )
+        remapped = dict(item)
+        remapped["bbox"] = [
+            int(round((y0 + ymin / 1000 * th) / height * 1000)),
+            int(round((x0 + xmin / 1000 * tw) / width * 1000)),
+            int(round((y0 + ymax / 1000 * th) / height * 1000)),
+            int(round((x0 + xmax / 1000 * tw) / width * 1000)),
+        ]
+        return remapped, truncated
+
+    @staticmethod
+    def _area(b):
+        return max(0, b[2] - b[0]) * max(0, b[3] - b[1])
+
+    def _overlaps(self, a, b):
+        ih = min(a[2], b[2]) - max(a[0], b[0])
+        iw = min(a[3], b[3]) - max(a[1], b[1])
+        if ih <= 0 or iw <= 0:
+            return False
+        inter = ih * iw
+        union = self._area(a) + self._area(b) - inter
+        smaller = min(self._area(a), self._area(b))
+        # Containment catches a seam-truncated copy inside the complete box
+        return (union > 0 and inter / union >= self.iou_threshold) or (smaller > 0 and inter / smaller >= 0.8)
+
+    def merge(self, tile_layouts, width, height):
+        """tile_layouts: [(rect, layout)] with tile-normalized boxes. Returns one full-image layout."""
+        candidates = []
+        for rect, layout in tile_layouts:
+            for item in layout:
+                bbox = item.get("bbox") if isinstance(item, dict) else None
+                if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+                    continue
+                remapped, truncated = self._remap(item, rect, width, height)
+                candidates.append((remapped, truncated))
+
+        # Complete boxes first, then larger ones
+        candidates.sort(key=lambda c: (c[1], -self._area(c[0]["bbox"])))
+        kept = []
+        for item, truncated in candidates:
+            duplicate = None
+            for entry in kept:
+                if self._overlaps(entry[0]["bbox"], item["bbox"]):
+                    duplicate = entry
+                    break
+            if duplicate is None:
+                kept.append([item, truncated])
+                continue
+            if duplicate[1] and truncated:
+                # Block taller than the overlap: both copies are cut, so join them
+                a, b = duplicate[0]["bbox"], item["bbox"]
+                duplicate[0]["bbox"] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                if len(str(item.get("text") or "")) > len(str(duplicate[0].get("text") or "")):
+                    duplicate[0]["text"] = item.get("text")
+
+        merged = [item for item, _ in kept]
+        # Reading order: top-to-bottom, then left-to-right
+        merged.sort(key=lambda item: (item["bbox"][0], item["bbox"][1]))
+        with self._lock:
+            self.images_tiled += 1
+            self.tiles_analyzed += len(tile_layouts)
+            self.boxes_before_merge += len(candidates)
+            self.boxes_after_merge += len(merged)
+        logger.info(f"Tiled detection merged {len(candidates)} boxes from {len(tile_layouts)} tiles into {len(merged)}")
+        return merged
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "images_tiled": self.images_tiled,
+                "tiles_analyzed": self.tiles_analyzed,
+                "boxes_before_merge": self.boxes_before_merge,
+                "boxes_after_merge": self.boxes_after_merge,
+            }
@@ -12,6 +12,7 @@ class JobQueue {
     this.activeCount = 0;
     this.isPaused = false;
     this.latestBatchFolder = null;
+    this.latestFontFamily = null;
   }
 
   // Dynamic Getter for Config from AppSettings
@@ -146,6 +147,8 @@ class JobQueue {
     formData.append('batch_folder', job.batchFolder);
     if (AppSettings.exclude_text) formData.append('exclude_text', AppSettings.exclude_text);
     formData.append('font_family', font_family);
+    // Batch PPTX export rebuilds slides without a per-slide deck in the same font
+    if (job.batchFolder === this.latestBatchFolder) this.latestFontFamily = font_family;
     formData.append('max_concurrent', getVal('maxConcurrent'));
     formData.append('refine_layout', refine_layout);
 
@@ -303,7 +306,9 @@ class JobQueue {
     btn.disabled = true;
 
     try {
-      const res = await fetch(`/generate-pptx-batch/${this.latestBatchFolder}`, { method: 'POST' });
+      const formData = new FormData();
+      if (this.latestFontFamily) formData.append('font_family', this.latestFontFamily);
+      const res = await fetch(`/generate-pptx-batch/${this.latestBatchFolder}`, { method: 'POST', body: formData });
       const data = await res.json();
       if (res.ok && data.status === 'success') {
         const link = document.createElement('a');
@@ -0,0 +1,17 @@
+import asyncio
+from src.hedging import Hedger
+
+def test_batch_latencies_tracked_apart_from_single_calls():
+    hedger = Hedger(enabled=True)
+
+    async def scenario():
+        async def ok():
+            return "ok"
+        await hedger.run(Hedger.latency_key("m"), ok)
+        await hedger.run(Hedger.latency_key("m", images=3), ok)
+        await hedger.run(Hedger.latency_key("m", images=4), ok)
+
+    asyncio.run(scenario())
+    latency = hedger.stats()["latency"]
+    assert latency["m"]["samples"] == 1
+    assert latency["m:x4"]["samples"] == 2
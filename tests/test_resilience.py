@@ -0,0 +1,70 @@
+import asyncio
+import time
+import pytest
+from src.resilience import CircuitBreaker, ResilientCaller, CircuitOpenError
+
+def open_then_half_open(caller, model_name):
+    breaker = caller.breaker(model_name)
+    for _ in range(caller.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.opened_at = time.monotonic() - caller.reset_timeout
+    return breaker
+
+def test_cancelled_half_open_probe_releases_slot():
+    caller = ResilientCaller(failure_threshold=2, reset_timeout=30.0)
+    breaker = open_then_half_open(caller, "m")
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        probe = asyncio.create_task(caller.call_async("m", hang))
+        await started.wait()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+        return await caller.call_async("m", ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_interrupted_sync_half_open_probe_releases_slot():
+    caller = ResilientCaller(failure_threshold=2, reset_timeout=30.0)
+    breaker = open_then_half_open(caller, "m")
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        caller.call("m", interrupted)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert caller.call("m", lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_allows_single_probe():
+    caller = ResilientCaller(failure_threshold=2, reset_timeout=30.0)
+    breaker = open_then_half_open(caller, "m")
+    assert breaker.allow() == CircuitBreaker.PROBE
+    with pytest.raises(CircuitOpenError):
+        caller.call("m", lambda: "ok")
+
+def test_cancelled_closed_call_keeps_breaker_closed():
+    caller = ResilientCaller()
+
+    async def scenario():
+        task = asyncio.create_task(caller.call_async("m", lambda: asyncio.sleep(60)))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert caller.breaker("m").state == CircuitBreaker.CLOSED
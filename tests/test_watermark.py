@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+from src.image_processor import ImageProcessor
+
+WATERMARK_BBOX = [1118, 684, 120, 22]
+
+def slide(seed, watermark=True):
+    rng = np.random.default_rng(seed)
+    img = np.full((720, 1280, 3), 230, np.uint8)
+    for _ in range(5):
+        p1 = (int(rng.integers(0, 1000)), int(rng.integers(0, 500)))
+        p2 = (int(rng.integers(100, 1200)), int(rng.integers(100, 600)))
+        cv2.rectangle(img, p1, p2, tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    if watermark:
+        cv2.putText(img, "NotebookLM", (1120, 700), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (60, 60, 60), 2)
+    return img
+
+def known_template(tmp_path):
+    """Template learned once from a flagged slide, then loaded from disk by a fresh processor."""
+    path = str(tmp_path / "watermark" / "notebooklm.png")
+    assert ImageProcessor(watermark_template=path).watermark.save_template(slide(0), WATERMARK_BBOX)
+    processor = ImageProcessor(watermark_template=path)
+    assert processor.watermark.ready
+    return processor
+
+def test_local_mode_matches_without_flagged_items(tmp_path):
+    processor = known_template(tmp_path)
+    match = processor.find_watermark(slide(1), [], from_vision=False)
+    assert match is not None
+    x, y, w, h = match["bbox_px"]
+    assert abs(x - WATERMARK_BBOX[0]) < 10 and abs(y - WATERMARK_BBOX[1]) < 10
+    assert processor.find_watermark(slide(1, watermark=False), [], from_vision=False) is None
+
+def test_local_clean_background_removes_watermark(tmp_path):
+    processor = known_template(tmp_path)
+    img = slide(2)
+    path = str(tmp_path / "slide.png")
+    cv2.imwrite(path, img)
+    clean = processor.clean_background(path, [], from_vision=False)
+    x, y, w, h = WATERMARK_BBOX
+    assert clean[y:y + h, x:x + w].std() < img[y:y + h, x:x + w].std() / 2
+
+def test_flagged_mode_skips_unflagged_vision_output(tmp_path):
+    processor = known_template(tmp_path)
+    assert processor.find_watermark(slide(3), [{"text": "Title", "bbox_px": [10, 10, 200, 40]}]) is None
+
+def test_rejects_patch_outside_corner(tmp_path):
+    processor = ImageProcessor(watermark_template=str(tmp_path / "notebooklm.png"))
+    assert not processor.watermark.save_template(slide(0), [500, 300, 120, 22])
+    assert not processor.watermark.ready